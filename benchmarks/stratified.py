@@ -0,0 +1,227 @@
+"""Benchmark of the stratified evaluation pipeline on synthetic power-law data.
+
+Times the propensity estimation, the split and stratification, and the
+evaluation (fit, ranking evaluation of each protocol, `STResult.organize`)
+of a cheap stand-in model, and writes the timings to a JSON file so that
+runs of different versions can be compared.
+
+Run from the root of the repository, e.g.:
+
+    PYTHONPATH=. python benchmarks/stratified.py --users 5000 --items 2000 \\
+        --interactions 200000 --n-strata 5 --output bench.json --compare previous.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import scipy
+import pandas as pd
+import cornac
+
+from cornac.models import Recommender
+from cornac.utils import get_rng
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from eval_methods.propensity import get_propensity_estimator
+from utils import get_metrics
+
+
+class RandomFactors(Recommender):
+    """Stand-in model scoring items by the dot product of random user and item factors.
+
+    Its fit is negligible and its scores have no ties, the benchmark measures
+    the evaluation pipeline rather than the model.
+    """
+
+    def __init__(self, name='RandomFactors', k=32, seed=None):
+        Recommender.__init__(self, name=name)
+        self.k = k
+        self.seed = seed
+
+    def fit(self, train_set, val_set=None):
+        Recommender.fit(self, train_set, val_set)
+        rng = get_rng(self.seed)
+        self.u_factors = rng.normal(size=(train_set.total_users, self.k))
+        self.i_factors = rng.normal(size=(train_set.num_items, self.k))
+        return self
+
+    def score(self, user_idx, item_idx=None):
+        if item_idx is None:
+            return self.i_factors.dot(self.u_factors[user_idx])
+        return self.i_factors[item_idx].dot(self.u_factors[user_idx])
+
+
+def git_revision():
+    """Commit of the working tree, None if it is not a git repository"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(data, args):
+    """Timings (in seconds) of the phases of one run, and the evaluation profile"""
+    timings = OrderedDict()
+
+    estimator = get_propensity_estimator(args.estimator)
+    start = time.perf_counter()
+    estimator.estimate(np.bincount(data.items, minlength=len(data.item_ids)))
+    timings['propensity'] = time.perf_counter() - start
+
+    # the evaluation method estimates the propensities again before splitting
+    start = time.perf_counter()
+    eval_method = StratifiedEvaluation(data=data,
+                                       n_strata=args.n_strata,
+                                       rating_threshold=args.rating_threshold,
+                                       seed=args.seed,
+                                       propensity_estimator=args.estimator,
+                                       batch_size=args.batch_size,
+                                       n_negatives=args.n_negatives,
+                                       n_threads=args.n_threads,
+                                       profile=True)
+    timings['split'] = time.perf_counter() - start - eval_method.propensity_fit_time
+
+    model = RandomFactors(k=args.k, seed=args.seed)
+    start = time.perf_counter()
+    result, _ = eval_method.evaluate(model, get_metrics(args.metrics),
+                                     user_based=True, show_validation=False)
+    timings['evaluate'] = time.perf_counter() - start
+
+    profile = result.profile
+    model_timings = profile.sections['Model'].times
+    timings['fit'] = model_timings['fit']
+    timings['organize'] = model_timings['organize']
+    for name, stats in profile.sections.items():
+        if 'ranking_eval' in stats.times:
+            timings['ranking_eval:{}'.format(name)] = stats.times['ranking_eval']
+
+    # phases of the ranking evaluation, summed over the protocols
+    phases = OrderedDict()
+    for name, stats in profile.sections.items():
+        if name == 'Model':
+            continue
+        for phase, seconds in stats.times.items():
+            if phase not in ('rating_eval', 'ranking_eval'):
+                phases[phase] = phases.get(phase, 0.0) + seconds
+    for phase, seconds in phases.items():
+        timings['phase:{}'.format(phase)] = seconds
+    return timings, profile
+
+
+def summarize(runs):
+    """Runs, min and median of each phase"""
+    summary = OrderedDict()
+    for phase in runs[0]:
+        values = [run[phase] for run in runs]
+        summary[phase] = OrderedDict([('min', min(values)),
+                                      ('median', float(np.median(values))),
+                                      ('runs', values)])
+    return summary
+
+
+def compare(report, previous):
+    """Table of the median time of each phase in `previous` and `report`"""
+    rows = []
+    for phase, stats in report['timings'].items():
+        old = previous['timings'].get(phase)
+        old_median = None if old is None else old['median']
+        ratio = None if not old_median else stats['median'] / old_median
+        rows.append((phase, old_median, stats['median'], ratio))
+    return pd.DataFrame(rows, columns=['phase', 'previous', 'current', 'ratio']).set_index('phase')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--interactions', type=int, default=50000)
+    parser.add_argument('--item-exponent', type=float, default=1.0,
+                        help='exponent of the power-law item popularity')
+    parser.add_argument('--n-strata', type=int, default=5)
+    parser.add_argument('--rating-threshold', type=float, default=4.0)
+    parser.add_argument('--estimator', default='powerlaw_mle',
+                        help="propensity estimator: 'powerlaw', 'powerlaw_mle' or 'popularity'")
+    parser.add_argument('--metrics', default='large', choices=['small', 'large'],
+                        help='metrics of `utils.get_metrics`')
+    parser.add_argument('--k', type=int, default=32, help='factors of the stand-in model')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--n-negatives', type=int, default=None)
+    parser.add_argument('--n-threads', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=123)
+    parser.add_argument('--output', default=None,
+                        help='JSON file of the results, bench-<timestamp>.json if not set')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of a previous run to compare the timings with')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    data = synthetic.load_feedback(n_users=args.users, n_items=args.items,
+                                   n_interactions=args.interactions,
+                                   item_exponent=args.item_exponent, seed=args.seed)
+    generate_time = time.perf_counter() - start
+
+    runs, profile = [], None
+    for _ in range(args.repeat):
+        timings, profile = run_once(data, args)
+        runs.append(timings)
+
+    report = OrderedDict([
+        ('benchmark', 'stratified'),
+        ('created', datetime.now().isoformat()),
+        ('revision', git_revision()),
+        ('environment', OrderedDict([
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('cpus', os.cpu_count()),
+            ('numpy', np.__version__),
+            ('scipy', scipy.__version__),
+            ('cornac', getattr(cornac, '__version__', None)),
+        ])),
+        ('config', OrderedDict(sorted(vars(args).items()))),
+        ('data', OrderedDict([
+            ('users', len(data.user_ids)),
+            ('items', len(data.item_ids)),
+            ('interactions', len(data)),
+            ('generate_time', generate_time),
+        ])),
+        ('timings', summarize(runs)),
+        ('counters', profile.total().counters),
+        ('profile', profile.to_dict()),
+    ])
+
+    output = args.output
+    if output is None:
+        output = 'bench-{}.json'.format(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(pd.DataFrame([(phase, stats['min'], stats['median'])
+                        for phase, stats in report['timings'].items()],
+                       columns=['phase', 'min', 'median']).set_index('phase'))
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        for name, value in report['config'].items():
+            if name not in ('output', 'compare', 'repeat') and previous['config'].get(name) != value:
+                print('Warning: {} differs from the compared run ({} != {})'.format(
+                    name, value, previous['config'].get(name)))
+        print('Median times of {} (previous) and {} (current):'.format(
+            previous.get('revision'), report['revision']))
+        print(compare(report, previous))
+    print('Results written to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,6 +6,9 @@ and is described in detail in the book 'Statistical Methods for Psychology'
 The Zou method is adopted from http://seriousstats.wordpress.com/2012/02/05/comparing-correlations/
 Credit goes to the authors of above mentioned packages!
 
+All tests accept NumPy arrays of correlations (broadcast against each other), so
+that many comparisons are evaluated in a single call.
+
 Author: Philipp Singer (www.philippsinger.info)
 """
 
@@ -14,9 +17,9 @@ from __future__ import division
 __author__ = 'psinger'
 
 import numpy as np
-from scipy.stats import t, norm
-from math import atanh, pow
-from numpy import tanh
+import pandas as pd
+from scipy.stats import t, norm, rankdata
+from numpy import arctanh as atanh, power as pow, tanh
 
 
 def rz_ci(r, n, conf_level=0.95):
@@ -31,7 +34,7 @@ def rho_rxy_rxz(rxy, rxz, ryz):
     num = (ryz-1/2.*rxy*rxz)*(1-pow(rxy, 2) -
                               pow(rxz, 2)-pow(ryz, 2))+pow(ryz, 3)
     den = (1 - pow(rxy, 2)) * (1 - pow(rxz, 2))
-    return num/float(den)
+    return num/den
 
 
 def dependent_corr(xy, xz, yz, n, twotailed=False, conf_level=0.95, method='steiger'):
@@ -54,7 +57,7 @@ def dependent_corr(xy, xz, yz, n, twotailed=False, conf_level=0.95, method='stei
 
         t2 = d * np.sqrt((n - 1) * (1 + yz) /
                          (((2 * (n - 1)/(n - 3)) * determin + av * av * cube)))
-        p = 1 - t.cdf(abs(t2), n - 3)
+        p = 1 - t.cdf(np.abs(t2), n - 3)
 
         if twotailed:
             p *= 2
@@ -87,16 +90,16 @@ def independent_corr(xy, ab, n, n2=None, twotailed=True, conf_level=0.95, method
     @param method: defines the method uses, 'fisher' or 'zou'
     @return: z and p-val
     """
+    if n2 is None:
+        n2 = n
 
     if method == 'fisher':
         xy_z = 0.5 * np.log((1 + xy)/(1 - xy))
         ab_z = 0.5 * np.log((1 + ab)/(1 - ab))
-        if n2 is None:
-            n2 = n
 
         se_diff_r = np.sqrt(1/(n - 3) + 1/(n2 - 3))
         diff = xy_z - ab_z
-        z = abs(diff / se_diff_r)
+        z = np.abs(diff / se_diff_r)
         p = (1 - norm.cdf(z))
         if twotailed:
             p *= 2
@@ -112,3 +115,55 @@ def independent_corr(xy, ab, n, n2=None, twotailed=True, conf_level=0.95, method
         return lower, upper
     else:
         raise Exception('Wrong method!')
+
+
+def corr_matrix(x, method='kendall'):
+    """
+    Calculates the correlations between all pairs of columns of one or several tables at once
+    @param x: (n x k) array of k rankings of n elements, or (m x n x k) array of m such tables
+    @param method: 'kendall' (tau-b, as scipy.stats.kendalltau), 'spearman' or 'pearson'
+    @return: (k x k) or (m x k x k) array of correlation coefficients
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if method == 'kendall':
+        # O(n log n) per pair of columns, see rankcorr.kendall_components, imported
+        # here so that the tests above only need numpy and scipy
+        from rankcorr import kendall_matrix
+        return kendall_matrix(np.swapaxes(x, -1, -2))[0]
+    elif method in ('spearman', 'pearson'):
+        if method == 'spearman':
+            x = rankdata(x, axis=-2)
+        centered = x - x.mean(axis=-2, keepdims=True)
+        prods = np.matmul(np.swapaxes(centered, -1, -2), centered)
+    else:
+        raise Exception('Wrong method!')
+
+    norms = np.sqrt(np.diagonal(prods, axis1=-2, axis2=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return prods / (norms[..., :, None] * norms[..., None, :])
+
+
+def corr_matrices(table, metrics=None, method='kendall'):
+    """
+    Builds the correlation matrices between the rankings of the models given by each evaluation protocol
+    @param table: DataFrame indexed by (model, protocol), with one column per metric, as returned by
+                  ResultStore.to_frame (several stores can be concatenated, e.g. open and stratified results)
+    @param metrics: metrics for which a matrix is built, all the columns of the table if None
+    @param method: correlation method, see corr_matrix
+    @return: DataFrame indexed by (metric, protocol) with one column per protocol, and the
+             number of models (models missing a result are left out)
+    """
+    metrics = list(table.columns) if metrics is None else list(metrics)
+    models = table.index.get_level_values(0).unique()
+    protocols = list(table.index.get_level_values(-1).unique())
+
+    # (metrics x models x protocols) tensor of results
+    full = table[metrics].reindex(pd.MultiIndex.from_product([models, protocols]))
+    values = full.to_numpy(dtype=np.float64).reshape(
+        len(models), len(protocols), len(metrics)).transpose(2, 0, 1)
+    values = values[:, ~np.isnan(values).any(axis=(0, 2))]
+
+    corr = corr_matrix(values, method=method)
+    index = pd.MultiIndex.from_product([metrics, protocols], names=['metric', 'protocol'])
+    return pd.DataFrame(corr.reshape(-1, len(protocols)), index=index,
+                        columns=pd.Index(protocols, name='protocol')), values.shape[1]
@@ -6,6 +6,8 @@ from cornac.utils import cache
 from cornac.data import Reader
 from cornac.data.reader import read_text
 
+from datasets.feedback_cache import load_cached_feedback
+
 
 Coats = namedtuple("Coats", ["url", "unzip", "path", "sep", "skip"])
 COATS_DATASETS = {
@@ -26,7 +28,7 @@ COATS_DATASETS = {
 }
 
 
-def load_feedback(variant="closed_loop", reader=None):
+def load_feedback(variant="closed_loop", reader=None, columnar=False, cache_dir=None):
     """Load the user-item ratings of one of the Coats datasets
 
     Parameters
@@ -37,10 +39,19 @@ def load_feedback(variant="closed_loop", reader=None):
     reader: `obj:cornac.data.Reader`, optional, default: None
         Reader object used to read the data.
 
+    columnar: bool, optional, default: False
+        If `True`, return a memory-mapped :obj:`datasets.feedback_cache.FeedbackArrays`
+        (int32 user and item codes, float32 ratings and the id maps). The file
+        is parsed once and cached in columnar form, see `load_cached_feedback`.
+
+    cache_dir: str, optional, default: None
+        Directory of the columnar cache, next to the data file if None.
+
     Returns
     -------
     data: array-like
-        Data in the form of a list of tuples depending on the given data format.
+        Data in the form of a list of tuples depending on the given data format,
+        or :obj:`datasets.feedback_cache.FeedbackArrays` if `columnar` is `True`.
     """
 
     coat = COATS_DATASETS.get(variant.upper(), None)
@@ -49,5 +60,11 @@ def load_feedback(variant="closed_loop", reader=None):
             "variant must be one of {}.".format(YAHOO_DATASETS.keys()))
 
     fpath = cache(url=coat.url, unzip=coat.unzip, relative_path=coat.path)
+    if columnar:
+        if reader is not None:
+            raise ValueError("reader is not supported with columnar=True")
+        return load_cached_feedback(fpath, sep=coat.sep, skip_lines=coat.skip,
+                                    cache_dir=cache_dir)
+
     reader = Reader() if reader is None else reader
     return reader.read(fpath, 'UIR', sep=coat.sep, skip_lines=coat.skip)
@@ -0,0 +1,175 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_VERSION = 1
+
+_COLUMNS = ("users", "items", "ratings", "user_ids", "item_ids")
+
+
+class FeedbackArrays:
+    """Columnar user-item-rating feedback.
+
+    Users and items are stored as integer codes into `user_ids` and `item_ids`,
+    assigned in order of first appearance in the data (as `cornac.data.Dataset`
+    does), so the observation `j` is (user_ids[users[j]], item_ids[items[j]], ratings[j]).
+
+    Parameters
+    ----------
+    users: Numpy array of int32, required
+        User code of each observation.
+
+    items: Numpy array of int32, required
+        Item code of each observation.
+
+    ratings: Numpy array, required
+        Rating of each observation (float32 in the columnar cache).
+
+    user_ids: Numpy array of str, required
+        Raw id of each user code.
+
+    item_ids: Numpy array of str, required
+        Raw id of each item code.
+
+    """
+
+    def __init__(self, users, items, ratings, user_ids, item_ids):
+        self.users = users
+        self.items = items
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def to_tuples(self):
+        """Return the feedback as a list of (user_id, item_id, rating) tuples, as `Reader.read` does"""
+        return list(zip(self.user_ids[self.users].tolist(),
+                        self.item_ids[self.items].tolist(),
+                        self.ratings.astype(np.float64).tolist()))
+
+
+def encode_feedback(data):
+    """Encode a list of (user_id, item_id, rating) triplets into :obj:`FeedbackArrays`.
+
+    Ratings are kept in float64, as `cornac.data.Dataset.build` does.
+    """
+    if isinstance(data, FeedbackArrays):
+        return data
+
+    users, user_ids = pd.factorize(np.array([t[0] for t in data], dtype=object))
+    items, item_ids = pd.factorize(np.array([t[1] for t in data], dtype=object))
+    return FeedbackArrays(users=users.astype(np.int32),
+                          items=items.astype(np.int32),
+                          ratings=np.fromiter((float(t[2]) for t in data),
+                                              dtype=np.float64, count=len(data)),
+                          user_ids=np.asarray(user_ids, dtype=object),
+                          item_ids=np.asarray(item_ids, dtype=object))
+
+
+def parse_feedback(fpath, sep="\t", skip_lines=0):
+    """Parse a delimited user-item-rating file into :obj:`FeedbackArrays`"""
+    df = pd.read_csv(fpath, sep=sep, header=None, skiprows=skip_lines, usecols=[0, 1, 2],
+                     dtype={0: str, 1: str, 2: np.float64}, keep_default_na=False)
+    users, user_ids = pd.factorize(df[0].to_numpy())
+    items, item_ids = pd.factorize(df[1].to_numpy())
+    return FeedbackArrays(users=users.astype(np.int32),
+                          items=items.astype(np.int32),
+                          ratings=df[2].to_numpy(dtype=np.float32),
+                          user_ids=np.asarray(user_ids, dtype=str),
+                          item_ids=np.asarray(item_ids, dtype=str))
+
+
+def _source_meta(fpath, sep, skip_lines):
+    stat = os.stat(fpath)
+    return {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sep": sep, "skip_lines": skip_lines}
+
+
+def _remove_cache(cache_dir):
+    """Remove the files written by `load_cached_feedback` in `cache_dir`, and the directory if it is empty"""
+    for name in ("meta.json",) + tuple("{}.npy".format(name) for name in _COLUMNS):
+        path = os.path.join(cache_dir, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    try:
+        os.rmdir(cache_dir)
+    except OSError:
+        pass
+
+
+def load_cached_feedback(fpath, sep="\t", skip_lines=0, cache_dir=None, mmap=True):
+    """Load a user-item-rating file through a columnar cache.
+
+    The file is parsed on the first call and its columns are saved as `.npy`
+    files, later calls memory-map them. The cache is rebuilt when the size or
+    the modification time of the file changes.
+
+    Parameters
+    ----------
+    fpath: str, required
+        Path of the delimited file.
+
+    sep: str, optional, default: '\\t'
+        The delimiter of the file.
+
+    skip_lines: int, optional, default: 0
+        Number of header lines to skip.
+
+    cache_dir: str, optional, default: None
+        Directory of the caches, each file is cached in its own
+        `<cache_dir>/<file name>.cols` subdirectory. If None, `<fpath>.cols` is used.
+
+    mmap: bool, optional, default: True
+        Open the cached columns read-only with `np.load(mmap_mode='r')`
+        instead of reading them in memory.
+
+    Returns
+    -------
+    data: :obj:`FeedbackArrays`
+
+    """
+    if cache_dir is None:
+        cache_dir = "{}.cols".format(fpath)
+    else:
+        # sources sharing a directory are cached apart
+        cache_dir = os.path.join(cache_dir, "{}.cols".format(os.path.basename(fpath)))
+    meta = _source_meta(fpath, sep, skip_lines)
+
+    meta_path = os.path.join(cache_dir, "meta.json")
+    cached_meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            cached_meta = json.load(f)
+
+    if cached_meta != meta:
+        feedback = parse_feedback(fpath, sep=sep, skip_lines=skip_lines)
+
+        # write then rename, concurrent runs never read a partial cache
+        tmp_dir = "{}.{}.tmp".format(cache_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in _COLUMNS:
+            np.save(os.path.join(tmp_dir, "{}.npy".format(name)), getattr(feedback, name))
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        _remove_cache(cache_dir)
+        try:
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            # another run created the cache meanwhile, or the directory holds other files
+            _remove_cache(tmp_dir)
+            return feedback
+
+        if not mmap:
+            return feedback
+
+    mmap_mode = "r" if mmap else None
+    return FeedbackArrays(**{
+        name: np.load(os.path.join(cache_dir, "{}.npy".format(name)), mmap_mode=mmap_mode)
+        for name in _COLUMNS
+    })
@@ -0,0 +1,77 @@
+import numpy as np
+
+from cornac.utils import get_rng
+
+from datasets.feedback_cache import FeedbackArrays
+
+
+def load_feedback(n_users=1000, n_items=1000, n_interactions=50000, item_exponent=1.0,
+                  user_exponent=0.5, rating_scale=5, seed=None):
+    """Generate synthetic user-item ratings with a power-law item popularity.
+
+    The item of each observation is drawn with a probability proportional to
+    rank^-`item_exponent` (Zipf), as in closed-loop feedback where a few items
+    are exposed much more than the others, its user with a probability
+    proportional to rank^-`user_exponent`. Ratings are uniform in 1..`rating_scale`.
+    Duplicate (user, item) pairs are dropped, so the data has at most
+    `n_interactions` observations.
+
+    Parameters
+    ----------
+    n_users: int, optional, default: 1000
+        Number of users.
+
+    n_items: int, optional, default: 1000
+        Number of items.
+
+    n_interactions: int, optional, default: 50000
+        Number of drawn observations.
+
+    item_exponent: float, optional, default: 1.0
+        Exponent of the item popularity, 0 for a uniform popularity.
+
+    user_exponent: float, optional, default: 0.5
+        Exponent of the user activity, 0 for a uniform activity.
+
+    rating_scale: int, optional, default: 5
+        Maximum rating value.
+
+    seed: int, optional, default: None
+        Random seed for reproducibility.
+
+    Returns
+    -------
+    data: :obj:`datasets.feedback_cache.FeedbackArrays`
+        Observations in random order, with ids 'u<index>' and 'i<index>'.
+    """
+    rng = get_rng(seed)
+
+    def power_law(n, exponent):
+        weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+        # ranks are assigned to random ids, popular ids are not the first ones
+        return rng.permutation(weights / weights.sum())
+
+    users = rng.choice(n_users, size=n_interactions, p=power_law(n_users, user_exponent))
+    items = rng.choice(n_items, size=n_interactions, p=power_law(n_items, item_exponent))
+    _, first = np.unique(users.astype(np.int64) * n_items + items, return_index=True)
+    first = rng.permutation(first)
+    users, items = users[first], items[first]
+    ratings = rng.randint(1, rating_scale + 1, size=len(first)).astype(np.float64)
+
+    # codes in order of first appearance, as `datasets.feedback_cache.encode_feedback` assigns them
+    user_codes, user_order = _first_appearance_codes(users)
+    item_codes, item_order = _first_appearance_codes(items)
+    return FeedbackArrays(users=user_codes,
+                          items=item_codes,
+                          ratings=ratings,
+                          user_ids=np.array(['u%d' % u for u in user_order], dtype=object),
+                          item_ids=np.array(['i%d' % i for i in item_order], dtype=object))
+
+
+def _first_appearance_codes(values):
+    """int32 codes of `values` numbered in order of first appearance, and the value of each code"""
+    uniques, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    codes = np.empty(len(uniques), dtype=np.int32)
+    codes[order] = np.arange(len(uniques), dtype=np.int32)
+    return codes[inverse], uniques[order]
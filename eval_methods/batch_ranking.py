@@ -0,0 +1,329 @@
+import time
+import tqdm
+
+import numpy as np
+
+from cornac.metrics import NDCG
+from cornac.metrics import NCRR
+from cornac.metrics import MRR
+from cornac.metrics import Recall
+from cornac.metrics import Precision
+from cornac.metrics.ranking import MeasureAtK
+
+from eval_methods.parallel import map_ordered
+from eval_methods.score_cache import score_items
+
+
+def positive_matrix(csr_mat, rating_threshold):
+    """Binary CSR matrix of the entries rated above `rating_threshold`, with sorted indices"""
+    pos_mat = csr_mat.copy()
+    pos_mat.data = (pos_mat.data >= rating_threshold).astype(np.float64)
+    pos_mat.eliminate_zeros()
+    pos_mat.sort_indices()
+    return pos_mat
+
+
+def row_indices(csr_mat, row):
+    """Column indices of the entries of a row, empty if the row is out of the matrix"""
+    if row >= csr_mat.shape[0]:
+        return csr_mat.indices[:0]
+    return csr_mat.indices[csr_mat.indptr[row]:csr_mat.indptr[row + 1]]
+
+
+def _is_batched(mt):
+    return isinstance(mt, (NDCG, MRR, Recall, Precision))
+
+
+def needs_full_ranking(mt):
+    """Whether a ranking metric reads beyond the top-k items of the ranking (e.g. NDCG@-1, MRR, AUC)"""
+    return not isinstance(mt, (NDCG, NCRR, MeasureAtK)) or mt.k <= 0
+
+
+def top_k_items(scores, k):
+    """Indices of the `k` highest scores of each row, in decreasing order of score.
+
+    Items are selected with a partial sort, only the top-k are sorted, and
+    tied items are ordered as the full ranking of `model.rank` orders them.
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    # the order of tied items is up to the sorting algorithm,
+    # rows with ties in (or at the cut-off of) the top-k are ranked as `model.rank` does
+    tied = (np.diff(top_scores, axis=1) == 0).any(axis=1)
+    tied |= (scores >= top_scores[:, -1:]).sum(axis=1) > k
+    if tied.any():
+        top[tied] = np.argsort(scores[tied], axis=1)[:, ::-1][:, :k]
+    return top
+
+
+def _ranked_gains(pos_block, ranked_items):
+    """Ground-truth value (0 for negatives) of each ranked item of a block of users"""
+    n_rows, n_cols = pos_block.shape
+    row_ids = np.repeat(np.arange(n_rows), np.diff(pos_block.indptr))
+    pos_keys = row_ids * n_cols + pos_block.indices
+    ranked_keys = np.arange(n_rows)[:, None] * n_cols + ranked_items
+
+    loc = np.minimum(np.searchsorted(pos_keys, ranked_keys), len(pos_keys) - 1)
+    return np.where(pos_keys[loc] == ranked_keys, pos_block.data[loc], 0.0)
+
+
+def _ideal_dcg(pos_block, k):
+    """DCG of the ideal ranking of each user of a block, truncated at `k` if k > 0"""
+    n_rows = pos_block.shape[0]
+    row_ids = np.repeat(np.arange(n_rows), np.diff(pos_block.indptr))
+
+    order = np.lexsort((-pos_block.data, row_ids))
+    position = np.arange(len(order)) - pos_block.indptr[row_ids]
+    gains = (2 ** pos_block.data[order] - 1) / np.log2(position + 2)
+    if k > 0:
+        gains[position >= k] = 0.0
+
+    return np.bincount(row_ids, weights=gains, minlength=n_rows)
+
+
+def _batch_metric(mt, gains, pos_block, n_ranked):
+    if isinstance(mt, MRR):
+        hits = gains > 0
+        if not hits.any(axis=1).all():
+            raise ValueError(
+                "No matched between ground-truth items and recommendations"
+            )
+        return 1.0 / (hits.argmax(axis=1) + 1)
+
+    k = n_ranked if mt.k <= 0 else min(mt.k, n_ranked)
+    top_gains = gains[:, :k]
+
+    if isinstance(mt, NDCG):
+        discounts = np.log2(np.arange(k) + 2)
+        dcg = ((2 ** top_gains - 1) / discounts).sum(axis=1)
+        return dcg / _ideal_dcg(pos_block, mt.k)
+
+    tp = top_gains.sum(axis=1)
+    if isinstance(mt, Recall):
+        return tp / np.asarray(pos_block.sum(axis=1)).ravel()
+    return tp / k  # Precision
+
+
+def batch_ranking_eval(
+    model,
+    metrics,
+    train_set,
+    test_set,
+    val_set=None,
+    rating_threshold=1.0,
+    exclude_unknowns=True,
+    verbose=False,
+    props=None,
+    self_normalized=True,
+    score_cache=None,
+    batch_size=256,
+    user_sink=None,
+    n_threads=None,
+    profile=None,
+):
+    """Evaluate model on provided ranking metrics, processing blocks of users at once.
+
+    NDCG, Recall, Precision and MRR are computed for a whole block of users from
+    a 2-D score matrix, other metrics are computed per user from the same scores.
+    Results match `ranking_eval`.
+
+    Parameters
+    ----------
+    model: :obj:`cornac.models.Recommender`, required
+        Recommender model to be evaluated.
+    metrics: :obj:`iterable`, required
+        List of rating metrics :obj:`cornac.metrics.RankingMetric`.
+    train_set: :obj:`cornac.data.Dataset`, required
+        Dataset to be used for model training. This will be used to exclude
+        observations already appeared during training.
+    test_set: :obj:`cornac.data.Dataset`, required
+        Dataset to be used for evaluation.
+    val_set: :obj:`cornac.data.Dataset`, optional, default: None
+        Dataset to be used for model selection. This will be used to exclude
+        observations already appeared during validation.
+    rating_threshold: float, optional, default: 1.0
+        The threshold to convert ratings into positive or negative feedback.
+    exclude_unknowns: bool, optional, default: True
+        Ignore unknown users and items during evaluation.
+    verbose: bool, optional, default: False
+        Output evaluation progress.
+    props: Numpy array, optional, default: None
+        items propensity scores, indexed by the inner item indices
+    self_normalized: bool, optional, default: True
+        if True, self-normalize IPS scores (SNIPS)
+    score_cache: :obj:`eval_methods.score_cache.ScoreCache`, optional, default: None
+        Cache of the model scores shared between evaluations of the same model.
+    batch_size: int, optional, default: 256
+        Number of users scored at once. A block holds `batch_size` x `num_items` scores.
+    user_sink: :obj:`experiment.user_results.UserResultWriter`, optional, default: None
+        If set, the results of each block of users are written to the sink
+        instead of being kept in memory.
+    n_threads: int, optional, default: None
+        If > 1, blocks of users are evaluated by a pool of `n_threads` threads.
+    profile: :obj:`eval_methods.profiling.PhaseStats`, optional, default: None
+        If set, the time of each phase and the counters are added to it, see `ranking_eval`.
+    Returns
+    -------
+    res: (List, List)
+        Tuple of two lists:
+         - average result for each of the metrics
+         - average result per user for each of the metrics (None with a `user_sink`)
+    """
+
+    if len(metrics) == 0:
+        return [], []
+
+    clock = time.perf_counter
+
+    # ground-truth value of every positive, 1 or its inverse propensity
+    t_start = clock()
+    pos_mat = positive_matrix(test_set.csr_matrix, rating_threshold)
+    t_positives_end = clock()
+    if props is not None:
+        item_props = props[:test_set.num_items]
+        has_props = item_props > 0
+        inv_props = np.zeros(test_set.num_items)
+        inv_props[has_props] = 1.0 / item_props[has_props]
+
+        # self-normalization constant of each user
+        total_pi = np.bincount(
+            np.repeat(np.arange(pos_mat.shape[0]), np.diff(pos_mat.indptr)),
+            weights=inv_props[pos_mat.indices], minlength=pos_mat.shape[0])
+        pos_mat.data = np.where(has_props[pos_mat.indices],
+                                inv_props[pos_mat.indices], 1.0)
+    if profile is not None:
+        profile.add_time('positives', t_positives_end - t_start, 0)
+        profile.add_time('ips', clock() - t_positives_end, 0)
+
+    user_indices = np.fromiter(test_set.user_indices, dtype=np.int64)
+    user_indices = user_indices[np.diff(pos_mat.indptr)[user_indices] > 0]
+
+    item_indices = None if exclude_unknowns else np.arange(test_set.num_items)
+    n_ranked = train_set.num_items if exclude_unknowns else test_set.num_items
+
+    full_ranking = any(needs_full_ranking(mt) for mt in metrics)
+    top_k = max(mt.k for mt in metrics if not needs_full_ranking(mt)) \
+        if not full_ranking else n_ranked
+
+    # items to exclude from the negatives, only needed by the per-user metrics
+    per_user_metrics = [i for i, mt in enumerate(metrics) if not _is_batched(mt)]
+    excl_mats = []
+    if len(per_user_metrics) > 0:
+        excl_mats.append(train_set.csr_matrix)
+        if val_set is not None:
+            excl_mats.append(val_set.csr_matrix)
+        excl_mats = [positive_matrix(mat, rating_threshold) for mat in excl_mats]
+
+    def user_scores(user_idx):
+        if score_cache is None:
+            return score_items(model, user_idx, item_indices)
+        return score_cache.scores(model, user_idx, item_indices)
+
+    def evaluate_block(start):
+        """Results of the block of users starting at `start`"""
+        t_start = clock()
+        batch_users = user_indices[start:start + batch_size]
+        scores = np.vstack([user_scores(user_idx) for user_idx in batch_users])
+        if full_ranking:
+            ranked_items = np.argsort(scores, axis=1)[:, ::-1]
+        else:
+            ranked_items = top_k_items(scores, top_k)
+        t_rank_end = clock()
+
+        pos_block = pos_mat[batch_users]
+        gains = _ranked_gains(pos_block, ranked_items)
+        block_results = np.zeros((len(batch_users), len(metrics)))
+        t_positives = clock() - t_rank_end
+        buffer_bytes = scores.nbytes + ranked_items.nbytes
+
+        t_metrics_start = clock()
+        for i, mt in enumerate(metrics):
+            if _is_batched(mt):
+                block_results[:, i] = _batch_metric(mt, gains, pos_block, n_ranked)
+        t_metrics = clock() - t_metrics_start
+
+        if len(per_user_metrics) > 0:
+            # ground truth buffers shared by the users of the block, see `ranking_eval`
+            u_gt_pos = np.zeros(test_set.num_items, dtype=np.float64)
+            u_gt_neg = np.ones(test_set.num_items, dtype=np.int64)
+            buffer_bytes += u_gt_pos.nbytes + u_gt_neg.nbytes
+
+        for row, user_idx in enumerate(batch_users if len(per_user_metrics) > 0 else []):
+            t_user_start = clock()
+            u_pos = slice(pos_block.indptr[row], pos_block.indptr[row + 1])
+            u_pos_items = pos_block.indices[u_pos]
+            u_gt_pos[u_pos_items] = pos_block.data[u_pos]
+
+            excl_items = [u_pos_items] + [row_indices(excl_mat, user_idx)
+                                          for excl_mat in excl_mats]
+            for items in excl_items:
+                u_gt_neg[items] = 0
+            t_positives_end = clock()
+
+            for i in per_user_metrics:
+                block_results[row, i] = metrics[i].compute(
+                    gt_pos=u_gt_pos,
+                    gt_neg=u_gt_neg,
+                    pd_rank=ranked_items[row],
+                    pd_scores=scores[row],
+                )
+            t_metrics_end = clock()
+
+            u_gt_pos[u_pos_items] = 0
+            for items in excl_items:
+                u_gt_neg[items] = 1
+
+            t_positives += (t_positives_end - t_user_start) + (clock() - t_metrics_end)
+            t_metrics += t_metrics_end - t_positives_end
+
+        t_ips_start = clock()
+        if props is not None and self_normalized is True:
+            block_pi = total_pi[batch_users]
+            normalized = block_pi > 0
+            block_results[normalized] /= block_pi[normalized, None]
+
+        if profile is not None:
+            profile.add_time('positives', t_positives, len(batch_users))
+            profile.add_time('rank', t_rank_end - t_start, len(batch_users))
+            profile.add_time('ips', clock() - t_ips_start, len(batch_users))
+            profile.add_time('metrics', t_metrics, len(batch_users))
+            profile.add_count('users', len(batch_users))
+            profile.add_count('items_scored', scores.size)
+            profile.add_count('items_ranked', ranked_items.size)
+            profile.add_count('buffer_bytes', buffer_bytes)
+
+        return block_results
+
+    if user_sink is None:
+        user_results = np.zeros((len(user_indices), len(metrics)))
+    else:
+        totals = np.zeros(len(metrics))
+
+    # blocks are evaluated by a pool of threads if n_threads > 1, and merged in order
+    starts = range(0, len(user_indices), batch_size)
+    for start, block_results in zip(starts, tqdm.tqdm(
+            map_ordered(evaluate_block, starts, n_threads),
+            total=len(starts), disable=not verbose)):
+        if user_sink is None:
+            user_results[start:start + batch_size] = block_results
+        else:
+            totals += block_results.sum(axis=0)
+            user_sink.extend(user_indices[start:start + batch_size], block_results)
+
+    if user_sink is not None:
+        user_sink.close()
+        return list(totals / len(user_indices)), None
+
+    avg_results = list(user_results.mean(axis=0))
+    user_results = [dict(zip(user_indices.tolist(), user_results[:, i].tolist()))
+                    for i, _ in enumerate(metrics)]
+
+    return avg_results, user_results
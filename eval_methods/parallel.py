@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+SHARDS_PER_THREAD = 4
+
+
+def shard_users(user_indices, n_threads):
+    """Split users into contiguous shards, a few per thread to balance the load.
+
+    Parameters
+    ----------
+    user_indices: 1d array, required
+        The users, in the order of evaluation.
+
+    n_threads: int, required
+        Number of worker threads.
+
+    Returns
+    -------
+    shards: list
+        Consecutive slices of `user_indices` (of its type), which concatenated are `user_indices`.
+
+    """
+    n_shards = max(min(len(user_indices), n_threads * SHARDS_PER_THREAD), 1)
+    bounds = np.linspace(0, len(user_indices), n_shards + 1).astype(np.int64)
+    return [user_indices[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def map_ordered(func, items, n_threads=None):
+    """Apply `func` to each item, in a pool of `n_threads` threads if `n_threads` > 1.
+
+    Results are yielded in the order of `items` whatever the order the workers
+    finish in, so merging them gives the same output as a sequential run.
+    Threads share the memory of the process (model, datasets, caches) and hold
+    the GIL in Python code, they only run in parallel in the NumPy kernels which
+    release it, so items should be large enough for these kernels to dominate
+    (e.g. blocks of users scored and sorted at once rather than single users).
+
+    Parameters
+    ----------
+    func: callable, required
+        Function of a single item.
+
+    items: iterable, required
+        The items (e.g. shards of users).
+
+    n_threads: int, optional, default: None
+        Number of worker threads. If None or 1, items are processed in the calling thread.
+
+    Returns
+    -------
+    results: generator
+
+    """
+    if n_threads is None or n_threads <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for result in executor.map(func, items):
+            yield result
@@ -0,0 +1,126 @@
+import json
+import time
+import threading
+
+import pandas as pd
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class PhaseStats:
+    """Accumulated time and number of calls of the phases of an evaluation, and counters.
+
+    Hot loops accumulate into local variables and merge them once per shard
+    of users with `add_time` and `add_count`, which are thread-safe.
+    """
+
+    def __init__(self):
+        self.times = OrderedDict()
+        self.calls = OrderedDict()
+        self.counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_time(self, phase, seconds, calls=1):
+        """Add `seconds` spent in `calls` calls of `phase`"""
+        with self._lock:
+            self.times[phase] = self.times.get(phase, 0.0) + float(seconds)
+            self.calls[phase] = self.calls.get(phase, 0) + int(calls)
+
+    def add_count(self, counter, n=1):
+        """Add `n` to `counter`"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + int(n)
+
+    @contextmanager
+    def timer(self, phase):
+        """Context manager adding the time spent in its block to `phase`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def merge(self, other):
+        """Add the times and counters of `other`"""
+        for phase, seconds in other.times.items():
+            self.add_time(phase, seconds, other.calls[phase])
+        for counter, n in other.counters.items():
+            self.add_count(counter, n)
+
+    def __getstate__(self):
+        # profiles are pickled with their results (checkpoints, worker processes), locks cannot be
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        return OrderedDict([
+            ('times', OrderedDict(self.times)),
+            ('calls', OrderedDict(self.calls)),
+            ('counters', OrderedDict(self.counters)),
+        ])
+
+
+class EvalProfile:
+    """Timers and counters of the evaluation of a model, by section.
+
+    Sections are the fit of the model and each protocol ('Closed', 'IPS',
+    'SNIPS', 'Q1', ..., 'Validation'), see `StratifiedEvaluation.evaluate`.
+
+    Parameters
+    ----------
+    model_name: str, required
+        Name of the evaluated model.
+
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.sections = OrderedDict()
+
+    def section(self, name):
+        """Return the :obj:`PhaseStats` of section `name`, created if needed"""
+        stats = self.sections.get(name)
+        if stats is None:
+            stats = self.sections[name] = PhaseStats()
+        return stats
+
+    def total(self):
+        """Return the :obj:`PhaseStats` of all the sections merged"""
+        total = PhaseStats()
+        for stats in self.sections.values():
+            total.merge(stats)
+        return total
+
+    def to_frame(self):
+        """Return the times and counters as a :obj:`pandas.DataFrame` indexed by (section, name)"""
+        rows, index = [], []
+        for section, stats in self.sections.items():
+            for phase, seconds in stats.times.items():
+                index.append((section, phase))
+                rows.append(('time', seconds, stats.calls[phase]))
+            for counter, n in stats.counters.items():
+                index.append((section, counter))
+                rows.append(('count', n, None))
+        return pd.DataFrame(rows, columns=['kind', 'value', 'calls'],
+                            index=pd.MultiIndex.from_tuples(index, names=['section', 'name']))
+
+    def to_dict(self):
+        return OrderedDict([
+            ('model', self.model_name),
+            ('sections', OrderedDict((name, stats.to_dict())
+                                     for name, stats in self.sections.items())),
+        ])
+
+    def to_json(self, path=None, indent=2):
+        """Return the profile as a JSON string, also written to `path` if given"""
+        output = json.dumps(self.to_dict(), indent=indent)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(output)
+        return output
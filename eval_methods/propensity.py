@@ -0,0 +1,301 @@
+import os
+import time
+import hashlib
+import powerlaw
+
+import numpy as np
+
+
+def propensity_fingerprint(item_ids, item_freqs, **params):
+    """Hash identifying a propensity estimation.
+
+    Parameters
+    ----------
+    item_ids: array-like, required
+        Raw item ids.
+
+    item_freqs: array-like, required
+        Number of observations of each item, in the order of `item_ids`.
+
+    **params: Parameters of the estimator.
+
+    Returns
+    -------
+    res: str
+        Hexadecimal digest of the item-frequency vector and the parameters.
+
+    """
+    sha = hashlib.sha1()
+    sha.update(np.asarray(item_freqs, dtype=np.int64).tobytes())
+    sha.update('\x00'.join(str(iid) for iid in item_ids).encode('utf-8'))
+    sha.update(repr(sorted(params.items())).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class PropensityCache:
+    """On-disk cache of the propensity fit and the resulting item propensities.
+
+    Entries are keyed by `propensity_fingerprint`, any change of the data
+    or of the fit parameters leads to a new entry.
+
+    Parameters
+    ----------
+    cache_dir: str, required
+        Directory where the entries are stored.
+
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, 'props_{}.npz'.format(key))
+
+    def load(self, key):
+        """Return the entry stored under `key` as a dict, or None if there is none"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path, allow_pickle=False) as entry:
+            return {
+                'alpha': None if np.isnan(entry['alpha']) else float(entry['alpha']),
+                'xmin': None if np.isnan(entry['xmin']) else float(entry['xmin']),
+                'props': entry['props'],
+            }
+
+    def save(self, key, alpha, xmin, props):
+        """Store the fit parameters and the propensity of each item under `key`.
+
+        The propensities are in the order of the `item_ids` the key was computed from.
+        """
+        path = self._path(key)
+
+        # write then rename, concurrent runs never read a partial entry
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     alpha=np.nan if alpha is None else alpha,
+                     xmin=np.nan if xmin is None else xmin,
+                     props=np.asarray(props, dtype=np.float64))
+        os.replace(tmp_path, path)
+
+
+def power_propensities(item_freqs, alpha, xmin):
+    """Raise the frequencies above `xmin` to the power `alpha`, others are left unchanged.
+
+    `pow` is evaluated once per distinct frequency (np.power may differ in the last digit).
+    """
+    freqs, freq_idx = np.unique(item_freqs, return_inverse=True)
+    freq_props = np.array([pow(int(v), alpha) if v > xmin else v for v in freqs],
+                          dtype=np.float64)
+    return freq_props[freq_idx]
+
+
+class PropensityEstimator:
+    """Base class of the item propensity estimators.
+
+    Propensities are user-independent and only depend on the number of
+    observations of each item.
+
+    Parameters
+    ----------
+    name: str, required
+        Name of the estimator, part of the propensity cache key.
+
+    Attributes
+    ----------
+    alpha: float
+        Estimated exponent, None if the estimator does not fit one.
+
+    xmin: float
+        Frequency above which the exponent is applied, None if not fitted.
+
+    fit_time: float
+        Duration (in seconds) of the last call to `estimate`.
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.alpha = None
+        self.xmin = None
+        self.fit_time = None
+
+    def params(self):
+        """Parameters identifying the estimation, used to key the propensity cache"""
+        return {'estimator': self.name}
+
+    def estimate(self, item_freqs):
+        """Estimate the propensity of each item.
+
+        Parameters
+        ----------
+        item_freqs: Numpy array, required
+            Number of observations of each item.
+
+        Returns
+        -------
+        props: Numpy array
+            Propensity of each item, in the order of `item_freqs`.
+
+        """
+        start = time.time()
+        props = self._estimate(np.asarray(item_freqs, dtype=np.int64))
+        self.fit_time = time.time() - start
+        return props
+
+    def _estimate(self, item_freqs):
+        raise NotImplementedError()
+
+
+class PowerlawEstimator(PropensityEstimator):
+    """Power-law fit of the item frequencies with the `powerlaw` package.
+
+    The xmin is found by scanning every candidate value, which gets slow as
+    the number of distinct frequencies grows.
+
+    Parameters
+    ----------
+    discrete: bool, optional, default: True
+        Fit a discrete power-law distribution.
+
+    fit_method: str, optional, default: 'Likelihood'
+        Fitting method of `powerlaw.Fit`.
+
+    """
+
+    def __init__(self, discrete=True, fit_method='Likelihood'):
+        super().__init__(name='powerlaw')
+        self.discrete = discrete
+        self.fit_method = fit_method
+
+    def params(self):
+        return {'estimator': self.name, 'discrete': self.discrete,
+                'fit_method': self.fit_method}
+
+    def _estimate(self, item_freqs):
+        results = powerlaw.Fit(item_freqs.astype(np.float64), discrete=self.discrete,
+                               fit_method=self.fit_method)
+        self.alpha = results.power_law.alpha
+        self.xmin = results.power_law.xmin
+        return power_propensities(item_freqs, self.alpha, self.xmin)
+
+
+class PowerlawMLEEstimator(PropensityEstimator):
+    """Closed-form maximum likelihood fit of a discrete power law.
+
+    The exponent is given by the approximation of Clauset et al. (2009),
+    alpha = 1 + n / sum(ln(x / (xmin - 1/2))), for the n frequencies x >= xmin.
+    Unless it is fixed, xmin is the candidate minimising the Kolmogorov-Smirnov
+    distance between the observed and the fitted tails, as `powerlaw.Fit` does.
+
+    Parameters
+    ----------
+    xmin: int, optional, default: None
+        Fixed xmin, no search is performed if set.
+
+    n_candidates: int, optional, default: None
+        Maximum number of xmin candidates, evenly spaced over the sorted
+        distinct frequencies. If None, every distinct frequency is tried.
+        The cost of the search is O(n_candidates x distinct frequencies).
+
+    """
+
+    def __init__(self, xmin=None, n_candidates=None):
+        super().__init__(name='powerlaw_mle')
+        if n_candidates is not None and n_candidates < 1:
+            raise ValueError('n_candidates must be positive: {}'.format(n_candidates))
+        self.fixed_xmin = xmin
+        self.n_candidates = n_candidates
+
+    def params(self):
+        return {'estimator': self.name, 'xmin': self.fixed_xmin,
+                'n_candidates': self.n_candidates}
+
+    def _estimate(self, item_freqs):
+        values, counts = np.unique(item_freqs[item_freqs > 0], return_counts=True)
+
+        # for each distinct value v: number of frequencies >= v and sum of their log
+        tail_n = np.cumsum(counts[::-1])[::-1]
+        tail_log = np.cumsum((counts * np.log(values))[::-1])[::-1]
+
+        if self.fixed_xmin is not None:
+            cand = np.array([np.searchsorted(values, self.fixed_xmin)])
+            if cand[0] == len(values):
+                raise ValueError('xmin is larger than every frequency: {}'.format(
+                    self.fixed_xmin))
+            xmins = np.array([self.fixed_xmin], dtype=np.float64)
+        else:
+            # the largest values leave a single observation in the tail
+            cand = np.flatnonzero(tail_n > 1)
+            if len(cand) == 0:
+                cand = np.array([0])
+            if self.n_candidates is not None and len(cand) > self.n_candidates:
+                cand = cand[np.unique(np.linspace(0, len(cand) - 1,
+                                                  self.n_candidates).astype(np.int64))]
+            xmins = values[cand].astype(np.float64)
+
+        n = tail_n[cand]
+        alphas = 1.0 + n / (tail_log[cand] - n * np.log(xmins - 0.5))
+
+        if len(cand) > 1:
+            # KS distance between the empirical and the fitted tail CCDF,
+            # evaluated at every distinct value of each candidate tail
+            in_tail = values[None, :] >= xmins[:, None]
+            emp_ccdf = tail_n[None, :] / n[:, None]
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                fit_ccdf = np.power((values[None, :] - 0.5) / (xmins[:, None] - 0.5),
+                                    1.0 - alphas[:, None])
+            dist = np.where(in_tail, np.abs(emp_ccdf - fit_ccdf), 0.0).max(axis=1)
+            dist[~np.isfinite(alphas)] = np.inf
+            best = int(np.argmin(dist))
+        else:
+            best = 0
+
+        self.alpha = float(alphas[best])
+        self.xmin = float(xmins[best])
+        return power_propensities(item_freqs, self.alpha, self.xmin)
+
+
+class PopularityEstimator(PropensityEstimator):
+    """Item popularity normalised by the frequency of the most popular item.
+
+    No distribution is fitted, the propensity of an item is (n_i / max_j n_j) ** power.
+
+    Parameters
+    ----------
+    power: float, optional, default: 1.0
+        Exponent applied to the normalised popularity.
+
+    """
+
+    def __init__(self, power=1.0):
+        super().__init__(name='popularity')
+        self.power = power
+
+    def params(self):
+        return {'estimator': self.name, 'power': self.power}
+
+    def _estimate(self, item_freqs):
+        return np.power(item_freqs / item_freqs.max(), self.power)
+
+
+PROPENSITY_ESTIMATORS = {
+    'powerlaw': PowerlawEstimator,
+    'powerlaw_mle': PowerlawMLEEstimator,
+    'popularity': PopularityEstimator,
+}
+
+
+def get_propensity_estimator(estimator):
+    """Return an estimator instance from an instance or the name of a built-in estimator"""
+    if estimator is None:
+        return PowerlawEstimator()
+    if isinstance(estimator, PropensityEstimator):
+        return estimator
+    if estimator not in PROPENSITY_ESTIMATORS:
+        raise ValueError('Unknown propensity estimator: {}, available: {}'.format(
+            estimator, sorted(PROPENSITY_ESTIMATORS)))
+    return PROPENSITY_ESTIMATORS[estimator]()
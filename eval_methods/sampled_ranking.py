@@ -0,0 +1,251 @@
+import time
+import tqdm
+
+import numpy as np
+
+from eval_methods.parallel import shard_users
+from eval_methods.parallel import map_ordered
+from eval_methods.batch_ranking import row_indices
+from eval_methods.batch_ranking import positive_matrix
+from eval_methods.score_cache import score_candidates
+
+
+def sample_negatives(pos_mats, user_indices, num_items, n_negatives, rng):
+    """Draw a fixed sample of negative items for each user.
+
+    Negatives are drawn uniformly without replacement among the items that
+    are not a positive of the user in any of `pos_mats`.
+
+    Parameters
+    ----------
+    pos_mats: list of :obj:`scipy.sparse.csr_matrix`, required
+        Binary matrices of the positives of the users (train, test and validation).
+
+    user_indices: 1d array, required
+        Users for which negatives are drawn, the others get none.
+
+    num_items: int, required
+        Negatives are drawn among the items 0 to `num_items` - 1.
+
+    n_negatives: int, required
+        Number of negatives per user, fewer if the user has fewer negatives.
+
+    rng: :obj:`numpy.random.RandomState`, required
+        Random number generator.
+
+    Returns
+    -------
+    res: (Numpy array, Numpy array)
+        CSR-style `(indptr, items)` where the (sorted) negatives of user `u`
+        are `items[indptr[u]:indptr[u + 1]]`, for all users 0 to max(user_indices).
+
+    """
+    user_indices = np.unique(np.asarray(user_indices, dtype=np.int64))
+    num_users = user_indices[-1] + 1 if len(user_indices) > 0 else 0
+    counts = np.zeros(num_users, dtype=np.int64)
+    samples = []
+
+    for user_idx in user_indices:
+        excl_items = np.unique(np.concatenate(
+            [row_indices(pos_mat, user_idx) for pos_mat in pos_mats]))
+        excl_items = excl_items[excl_items < num_items]
+        n_allowed = num_items - len(excl_items)
+        n_sampled = min(n_negatives, n_allowed)
+
+        if 2 * n_sampled >= n_allowed:
+            # dense user, draw from the explicit list of negatives
+            allowed = np.setdiff1d(np.arange(num_items), excl_items, assume_unique=True)
+            sample = rng.choice(allowed, size=n_sampled, replace=False)
+        else:
+            # rejection sampling, the cost does not depend on the number of items
+            sample = np.empty(0, dtype=np.int64)
+            while len(sample) < n_sampled:
+                draws = rng.randint(num_items, size=2 * (n_sampled - len(sample)))
+                draws = draws[~np.isin(draws, excl_items)]
+                sample = np.concatenate([sample, draws])
+                _, first = np.unique(sample, return_index=True)
+                sample = sample[np.sort(first)]
+            sample = sample[:n_sampled]
+
+        samples.append(np.sort(sample).astype(np.int64))
+        counts[user_idx] = n_sampled
+
+    indptr = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    items = np.concatenate(samples) if len(samples) > 0 else np.empty(0, dtype=np.int64)
+    return indptr, items
+
+
+def sampled_ranking_eval(
+    model,
+    metrics,
+    test_set,
+    negatives,
+    rating_threshold=1.0,
+    verbose=False,
+    props=None,
+    self_normalized=True,
+    score_cache=None,
+    user_sink=None,
+    n_threads=None,
+    profile=None,
+):
+    """Evaluate model on provided ranking metrics, ranking the positives of each
+    user against a fixed sample of negatives instead of the whole catalogue.
+
+    The metrics of a user are computed on the candidates of the user only
+    (its test positives followed by its sampled negatives), so the cost of a
+    user grows with the number of sampled negatives, not with the number of items.
+    All the test positives of a user are ranked together against its negatives,
+    rather than each positive against the negatives on its own as in the
+    leave-one-out protocols, so that the metrics are those of the full ranking
+    restricted to the candidates.
+
+    Parameters
+    ----------
+    model: :obj:`cornac.models.Recommender`, required
+        Recommender model to be evaluated.
+    metrics: :obj:`iterable`, required
+        List of rating metrics :obj:`cornac.metrics.RankingMetric`.
+    test_set: :obj:`cornac.data.Dataset`, required
+        Dataset to be used for evaluation.
+    negatives: (Numpy array, Numpy array), required
+        Sampled negatives of each user, as returned by `sample_negatives`.
+    rating_threshold: float, optional, default: 1.0
+        The threshold to convert ratings into positive or negative feedback.
+    verbose: bool, optional, default: False
+        Output evaluation progress.
+    props: Numpy array, optional, default: None
+        items propensity scores, indexed by the inner item indices
+    self_normalized: bool, optional, default: True
+        if True, self-normalize IPS scores (SNIPS)
+    score_cache: :obj:`eval_methods.score_cache.ScoreCache`, optional, default: None
+        Cache of the model scores shared between evaluations of the same model.
+    user_sink: :obj:`experiment.user_results.UserResultWriter`, optional, default: None
+        If set, the results of each shard of users are written to the sink
+        instead of being kept in memory.
+    n_threads: int, optional, default: None
+        If > 1, shards of users are evaluated by a pool of `n_threads` threads.
+        Unlike `eval_methods.batch_ranking.batch_ranking_eval`, the users are
+        not scored in blocks: each user has its own candidates, scored and
+        ranked on their own, so most of the work is Python code holding the GIL
+        and the threads only overlap the scoring of models releasing it.
+    profile: :obj:`eval_methods.profiling.PhaseStats`, optional, default: None
+        If set, the time of each phase and the counters are added to it, see `ranking_eval`.
+    Returns
+    -------
+    res: (List, List)
+        Tuple of two lists:
+         - average result for each of the metrics
+         - average result per user for each of the metrics (None with a `user_sink`)
+    """
+
+    if len(metrics) == 0:
+        return [], []
+
+    neg_indptr, neg_items = negatives
+    gt_mat = positive_matrix(test_set.csr_matrix, rating_threshold)
+
+    user_indices = np.fromiter(test_set.user_indices, dtype=np.int64)
+    user_indices = user_indices[np.diff(gt_mat.indptr)[user_indices] > 0]
+
+    def evaluate_users(users):
+        """(users x metrics) results of a shard of users"""
+        shard_results = np.zeros((len(users), len(metrics)))
+
+        clock = time.perf_counter
+        t_positives, t_rank, t_ips, t_metrics = 0.0, 0.0, 0.0, 0.0
+        n_candidates, buffer_bytes = 0, 0
+
+        for row, user_idx in enumerate(users):
+            t_start = clock()
+            test_pos_items = row_indices(gt_mat, user_idx)
+            if user_idx < len(neg_indptr) - 1:
+                u_neg_items = neg_items[neg_indptr[user_idx]:neg_indptr[user_idx + 1]]
+            else:
+                u_neg_items = neg_items[:0]
+            n_pos = len(test_pos_items)
+
+            # ground truth of the candidates, positives first
+            candidates = np.concatenate([test_pos_items, u_neg_items])
+            u_gt_pos = np.zeros(len(candidates), dtype=np.float64)
+            u_gt_pos[:n_pos] = 1
+            u_gt_neg = np.ones(len(candidates), dtype=np.int64)
+            u_gt_neg[:n_pos] = 0
+            t_positives_end = clock()
+
+            if score_cache is None:
+                item_scores = score_candidates(model, user_idx, candidates)
+            else:
+                item_scores = score_cache.candidate_scores(model, user_idx, candidates)
+            item_rank = item_scores.argsort()[::-1]
+            t_rank_end = clock()
+
+            total_pi = 0.0
+            if props is not None:
+                u_pos_props = props[test_pos_items]
+                has_props = u_pos_props > 0
+                u_gt_pos[:n_pos][has_props] = 1.0 / u_pos_props[has_props]
+                total_pi = np.sum(1.0 / u_pos_props[has_props])
+            t_ips_end = clock()
+
+            for i, mt in enumerate(metrics):
+                shard_results[row, i] = mt.compute(
+                    gt_pos=u_gt_pos,
+                    gt_neg=u_gt_neg,
+                    pd_rank=item_rank,
+                    pd_scores=item_scores,
+                )
+
+            if props is not None and self_normalized is True:
+                if total_pi > 0:
+                    shard_results[row] /= total_pi
+            t_metrics_end = clock()
+
+            t_positives += t_positives_end - t_start
+            t_rank += t_rank_end - t_positives_end
+            t_ips += t_ips_end - t_rank_end
+            t_metrics += t_metrics_end - t_ips_end
+            n_candidates += len(candidates)
+            buffer_bytes += candidates.nbytes + u_gt_pos.nbytes + u_gt_neg.nbytes
+
+        if profile is not None:
+            profile.add_time('positives', t_positives, len(users))
+            profile.add_time('rank', t_rank, len(users))
+            profile.add_time('ips', t_ips, len(users))
+            profile.add_time('metrics', t_metrics, len(users))
+            profile.add_count('users', len(users))
+            profile.add_count('items_scored', n_candidates)
+            profile.add_count('items_ranked', n_candidates)
+            profile.add_count('buffer_bytes', buffer_bytes)
+
+        return shard_results
+
+    if user_sink is None:
+        user_results = np.zeros((len(user_indices), len(metrics)))
+    else:
+        totals = np.zeros(len(metrics))
+
+    # shards are evaluated by a pool of threads if n_threads > 1 (see `n_threads`
+    # on why the candidates are not scored in blocks), and merged in order
+    shards = shard_users(user_indices, n_threads or 1)
+    start = 0
+    for users, shard_results in zip(shards, tqdm.tqdm(
+            map_ordered(evaluate_users, shards, n_threads),
+            total=len(shards), disable=not verbose)):
+        if user_sink is None:
+            user_results[start:start + len(users)] = shard_results
+        else:
+            totals += shard_results.sum(axis=0)
+            user_sink.extend(users, shard_results)
+        start += len(users)
+
+    if user_sink is not None:
+        user_sink.close()
+        return list(totals / len(user_indices)), None
+
+    avg_results = list(user_results.mean(axis=0))
+    user_results = [dict(zip(user_indices.tolist(), user_results[:, i].tolist()))
+                    for i, _ in enumerate(metrics)]
+
+    return avg_results, user_results
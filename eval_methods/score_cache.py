@@ -0,0 +1,295 @@
+import threading
+
+import numpy as np
+
+from collections import OrderedDict
+
+from cornac.exception import ScoreException
+
+
+def score_items(model, user_idx, item_indices=None):
+    """Item scores as returned by `model.rank`, without sorting them.
+
+    Parameters
+    ----------
+    model: :obj:`cornac.models.Recommender`, required
+        A fitted recommender model.
+
+    user_idx: int, required
+        The index of the user to be scored.
+
+    item_indices: 1d array, optional, default: None
+        Candidate item indices, continuous from 0 to len(item_indices).
+        If None, scores of all known items are returned.
+
+    Returns
+    -------
+    item_scores: Numpy array
+        Scores in the same order as the `item_scores` of `model.rank`.
+
+    """
+    try:
+        known_item_scores = model.score(user_idx)
+    except ScoreException:
+        known_item_scores = (
+            np.ones(model.train_set.total_items) * model.default_score()
+        )
+
+    # unknown items are given the MIN score (see `Recommender.rank`)
+    if len(known_item_scores) == model.train_set.total_items:
+        all_item_scores = known_item_scores
+    else:
+        all_item_scores = np.ones(model.train_set.total_items) * np.min(
+            known_item_scores
+        )
+        all_item_scores[: model.train_set.num_items] = known_item_scores
+
+    if item_indices is None:
+        return all_item_scores[: model.train_set.num_items]
+    return all_item_scores[: len(item_indices)][item_indices]
+
+
+def score_candidates(model, user_idx, item_indices):
+    """Scores of a user for the given items only.
+
+    The known items are scored with a single `model.score(user_idx, items)`
+    call, or a single `model.score(user_idx)` call if the model does not take
+    an array of items. Models rejecting both are scored one item at a time.
+    Scores follow `model.rank`: the default score of the model if the user is
+    unknown, and unknown items are ranked after all the known ones (-inf), so
+    the score of an item does not depend on the other candidates.
+
+    Parameters
+    ----------
+    model: :obj:`cornac.models.Recommender`, required
+        A fitted recommender model.
+
+    user_idx: int, required
+        The index of the user to be scored.
+
+    item_indices: 1d array, required
+        The items to be scored.
+
+    Returns
+    -------
+    item_scores: Numpy array
+        Scores in the order of `item_indices`.
+
+    """
+    item_indices = np.asarray(item_indices)
+    item_scores = np.full(len(item_indices), model.default_score(), dtype=np.float64)
+    if model.train_set.is_unk_user(user_idx):
+        return item_scores
+
+    known = item_indices < model.train_set.num_items
+    item_scores[~known] = -np.inf
+    known_items = item_indices[known]
+    if len(known_items) == 0:
+        return item_scores
+
+    # models taking an array of items (checked by the number of scores returned)
+    try:
+        known_scores = np.ravel(model.score(user_idx, known_items))
+        if len(known_scores) == len(known_items):
+            item_scores[known] = known_scores
+            return item_scores
+    except (ScoreException, ValueError, TypeError, IndexError):
+        pass
+
+    # models scoring all the known items at once
+    try:
+        all_scores = np.ravel(model.score(user_idx))
+        if len(all_scores) >= model.train_set.num_items:
+            item_scores[known] = all_scores[known_items]
+            return item_scores
+    except ScoreException:
+        pass
+
+    for j in np.flatnonzero(known):
+        try:
+            item_scores[j] = np.ravel(model.score(user_idx, item_indices[j]))[0]
+        except ScoreException:
+            pass
+    return item_scores
+
+
+class ScoreCache:
+    """Per-evaluation cache of the ranking produced by a model for each user.
+
+    A single model is ranked for the same users several times during a
+    stratified evaluation (Closed, IPS, SNIPS and every stratum). The cache
+    keeps the output of `model.rank` keyed by user index so that every user
+    is scored only once. It must not be shared across models, it can be
+    shared by threads evaluating different users of the same model.
+
+    Parameters
+    ----------
+    max_bytes: int, optional, default: None
+        Upper bound on the memory used by the cached arrays. Once the budget
+        is exhausted, further users are ranked on demand and not retained.
+        If None, every user is cached.
+
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._candidates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_idx):
+        return user_idx in self._entries
+
+    def rank(self, model, user_idx, item_indices=None):
+        """Return `model.rank(user_idx, item_indices)`, computing it only once per user.
+
+        Parameters
+        ----------
+        model: :obj:`cornac.models.Recommender`, required
+            The fitted model this cache belongs to.
+
+        user_idx: int, required
+            The index of the user to be ranked.
+
+        item_indices: 1d array, optional, default: None
+            Candidate items forwarded to `model.rank`. It has to be the same
+            for every call made on the cache.
+
+        Returns
+        -------
+        Tuple of `item_rank`, and `item_scores`.
+
+        """
+        entry = self._entries.get(user_idx)
+        if entry is None:
+            self._count(hit=False)
+            entry = model.rank(user_idx, item_indices)
+            self._store(user_idx, entry)
+            return entry
+
+        self._count(hit=True)
+        if entry[0] is None:
+            # only the scores were requested so far
+            item_scores = entry[1]
+            entry = (item_scores.argsort()[::-1], item_scores)
+            self._store(user_idx, entry)
+        return entry
+
+    def scores(self, model, user_idx, item_indices=None):
+        """Return the `item_scores` of `model.rank`, without ranking the items.
+
+        Parameters
+        ----------
+        model: :obj:`cornac.models.Recommender`, required
+            The fitted model this cache belongs to.
+
+        user_idx: int, required
+            The index of the user to be scored.
+
+        item_indices: 1d array, optional, default: None
+            Candidate items, see `score_items`.
+
+        Returns
+        -------
+        item_scores: Numpy array
+
+        """
+        entry = self._entries.get(user_idx)
+        if entry is not None:
+            self._count(hit=True)
+            return entry[1]
+
+        self._count(hit=False)
+        item_scores = score_items(model, user_idx, item_indices)
+        self._store(user_idx, (None, item_scores))
+        return item_scores
+
+    def candidate_scores(self, model, user_idx, item_indices):
+        """Return `score_candidates(model, user_idx, item_indices)`, scoring each item once per user.
+
+        Parameters
+        ----------
+        model: :obj:`cornac.models.Recommender`, required
+            The fitted model this cache belongs to.
+
+        user_idx: int, required
+            The index of the user to be scored.
+
+        item_indices: 1d array, required
+            The items to be scored, they may differ between calls.
+
+        Returns
+        -------
+        item_scores: Numpy array
+
+        """
+        entry = self._candidates.get(user_idx)
+        if entry is not None:
+            known_items, known_scores = entry
+            loc = np.minimum(np.searchsorted(known_items, item_indices), len(known_items) - 1)
+            if (known_items[loc] == item_indices).all():
+                self._count(hit=True)
+                return known_scores[loc]
+
+        self._count(hit=False)
+        item_scores = score_candidates(model, user_idx, item_indices)
+
+        # keep the scores sorted by item, merged with the ones already cached
+        items = np.asarray(item_indices)
+        if entry is not None:
+            items = np.concatenate([entry[0], items])
+            item_scores_all = np.concatenate([entry[1], item_scores])
+        else:
+            item_scores_all = item_scores
+        items, first = np.unique(items, return_index=True)
+        new_entry = (items, item_scores_all[first])
+
+        old_bytes = 0 if entry is None else self._entry_bytes(entry)
+        entry_bytes = self._entry_bytes(new_entry)
+        with self._lock:
+            if (self.max_bytes is None or
+                    self.nbytes - old_bytes + entry_bytes <= self.max_bytes):
+                self._candidates[user_idx] = new_entry
+                self.nbytes += entry_bytes - old_bytes
+        return item_scores
+
+    def _count(self, hit):
+        # threads evaluating different users share the counters
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _store(self, user_idx, entry):
+        with self._lock:
+            old_entry = self._entries.get(user_idx)
+            old_bytes = 0 if old_entry is None else self._entry_bytes(old_entry)
+
+            entry_bytes = self._entry_bytes(entry)
+            if (self.max_bytes is not None and
+                    self.nbytes - old_bytes + entry_bytes > self.max_bytes):
+                # evaluation passes over the users sequentially and repeatedly,
+                # evicting old entries would make every pass miss (LRU thrashing)
+                return
+            self._entries[user_idx] = entry
+            self.nbytes += entry_bytes - old_bytes
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return sum(arr.nbytes for arr in entry if arr is not None)
+
+    def clear(self):
+        """Release all cached rankings"""
+        with self._lock:
+            self._entries.clear()
+            self._candidates.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
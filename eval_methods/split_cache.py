@@ -0,0 +1,80 @@
+import os
+import hashlib
+
+import numpy as np
+
+
+CACHE_VERSION = 1
+
+
+def data_fingerprint(feedback):
+    """Hash identifying encoded feedback data.
+
+    Parameters
+    ----------
+    feedback: :obj:`datasets.feedback_cache.FeedbackArrays`, required
+        The encoded data.
+
+    Returns
+    -------
+    res: str
+        Hexadecimal digest of the user and item codes, the ratings and the raw ids.
+
+    """
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(feedback.users, dtype=np.int64).tobytes())
+    sha.update(np.ascontiguousarray(feedback.items, dtype=np.int64).tobytes())
+    sha.update(np.ascontiguousarray(feedback.ratings, dtype=np.float64).tobytes())
+    sha.update('\x00'.join(str(uid) for uid in feedback.user_ids).encode('utf-8'))
+    sha.update(b'\x01')
+    sha.update('\x00'.join(str(iid) for iid in feedback.item_ids).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def split_cache_key(data_key, **params):
+    """Key of the splits built from the data identified by `data_key` with the given parameters"""
+    sha = hashlib.sha1()
+    sha.update(data_key.encode('utf-8'))
+    sha.update(repr(sorted(params.items())).encode('utf-8'))
+    sha.update(str(CACHE_VERSION).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class SplitCache:
+    """On-disk cache of the train/test/val splits and strata of a `StratifiedEvaluation`.
+
+    An entry is a flat dict of arrays (datasets, id maps as inner indices,
+    stratum membership and bins), see `StratifiedEvaluation._split_arrays`.
+
+    Parameters
+    ----------
+    cache_dir: str, required
+        Directory where the entries are stored.
+
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, 'split_{}.npz'.format(key))
+
+    def load(self, key):
+        """Return the arrays stored under `key` as a dict, or None if there is none"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path, allow_pickle=False) as entry:
+            return {name: entry[name] for name in entry.files}
+
+    def save(self, key, arrays):
+        """Store a dict of arrays under `key`"""
+        path = self._path(key)
+
+        # write then rename, concurrent runs never read a partial entry
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
@@ -1,15 +1,13 @@
 import time
-import powerlaw
 import tqdm
+import warnings
 
 import numpy as np
 import pandas as pd
 
-from collections import defaultdict
 from collections import OrderedDict
 
 from cornac.utils import get_rng
-from cornac.utils.common import safe_indexing
 from cornac.data import Dataset
 from cornac.eval_methods.base_method import BaseMethod
 from cornac.eval_methods.ratio_split import RatioSplit
@@ -17,6 +15,28 @@ from cornac.eval_methods.base_method import rating_eval
 from cornac.experiment.result import Result
 
 from experiment.result import STResult
+from datasets.feedback_cache import encode_feedback
+from experiment.user_results import UserResultSink
+from eval_methods.score_cache import ScoreCache
+from eval_methods.profiling import EvalProfile
+from eval_methods.score_cache import score_items
+from eval_methods.batch_ranking import row_indices
+from eval_methods.batch_ranking import top_k_items
+from eval_methods.batch_ranking import needs_full_ranking
+from eval_methods.batch_ranking import positive_matrix
+from eval_methods.batch_ranking import batch_ranking_eval
+from eval_methods.sampled_ranking import sample_negatives
+from eval_methods.sampled_ranking import sampled_ranking_eval
+from eval_methods.propensity import PropensityCache
+from eval_methods.propensity import propensity_fingerprint
+from eval_methods.propensity import get_propensity_estimator
+from eval_methods.split_cache import SplitCache
+from eval_methods.split_cache import split_cache_key
+from eval_methods.split_cache import data_fingerprint
+
+
+# block size of the threaded evaluations of the whole catalogue, see `ranking_eval`
+THREADED_BATCH_SIZE = 256
 
 
 def ranking_eval(
@@ -30,8 +50,19 @@ def ranking_eval(
     verbose=False,
     props=None,
     self_normalized=True,
+    score_cache=None,
+    batch_size=None,
+    user_sink=None,
+    negatives=None,
+    n_threads=None,
+    profile=None,
 ):
     """Evaluate model on provided ranking metrics.
+
+    If every metric only reads the top-k items of the ranking (e.g. NDCG@k,
+    Recall@k, Precision@k with k > 0), only the top max(k) items of each user
+    are ranked with a partial sort, otherwise all items are ranked.
+
     Parameters
     ----------
     model: :obj:`cornac.models.Recommender`, required
@@ -52,78 +83,206 @@ def ranking_eval(
         Ignore unknown users and items during evaluation.
     verbose: bool, optional, default: False
         Output evaluation progress.
-    props: dictionary, optional, default: None
-        items propensity scores
+    props: Numpy array, optional, default: None
+        items propensity scores, indexed by the inner item indices
     self_normalized: bool, optional, default: True
         if True, self-normalize IPS scores (SNIPS)
+    score_cache: :obj:`eval_methods.score_cache.ScoreCache`, optional, default: None
+        Cache of the model rankings shared between evaluations of the same model.
+    batch_size: int, optional, default: None
+        If set, users are evaluated in blocks of `batch_size` users
+        (see `eval_methods.batch_ranking.batch_ranking_eval`).
+    user_sink: :obj:`experiment.user_results.UserResultWriter`, optional, default: None
+        If set, the result of each user is written to the sink as it is
+        computed instead of being kept in memory.
+    negatives: (Numpy array, Numpy array), optional, default: None
+        If set, the positives of each user are ranked against its sampled negatives
+        only (see `eval_methods.sampled_ranking.sampled_ranking_eval`), `batch_size`
+        is not used.
+    n_threads: int, optional, default: None
+        If > 1, the users are evaluated in blocks (of `batch_size` users, or
+        `THREADED_BATCH_SIZE` if it is not set) by a pool of `n_threads` threads,
+        see `eval_methods.batch_ranking.batch_ranking_eval`. With `negatives`,
+        shards of users are evaluated by the threads, see
+        `eval_methods.sampled_ranking.sampled_ranking_eval`.
+    profile: :obj:`eval_methods.profiling.PhaseStats`, optional, default: None
+        If set, the time spent extracting the positives ('positives'), scoring and
+        ranking ('rank'), weighting by propensities ('ips') and computing the
+        metrics ('metrics') is added to it, with the number of users, of items
+        scored and ranked and the bytes of the buffers allocated by the evaluation.
+        With `n_threads` > 1, phase times are summed over the threads.
     Returns
     -------
     res: (List, List)
         Tuple of two lists:
          - average result for each of the metrics
-         - average result per user for each of the metrics
+         - average result per user for each of the metrics (None with a `user_sink`)
     """
 
     if len(metrics) == 0:
         return [], []
 
-    avg_results = []
-    user_results = [{} for _ in enumerate(metrics)]
+    if negatives is not None:
+        return sampled_ranking_eval(
+            model=model,
+            metrics=metrics,
+            test_set=test_set,
+            negatives=negatives,
+            rating_threshold=rating_threshold,
+            verbose=verbose,
+            props=props,
+            self_normalized=self_normalized,
+            score_cache=score_cache,
+            user_sink=user_sink,
+            n_threads=n_threads,
+            profile=profile,
+        )
+
+    if batch_size is None and n_threads is not None and n_threads > 1:
+        # a user evaluated alone holds the GIL between its small NumPy calls, threads
+        # only run in parallel in the block kernels of `batch_ranking_eval`
+        batch_size = THREADED_BATCH_SIZE
 
-    gt_mat = test_set.csr_matrix
-    train_mat = train_set.csr_matrix
-    val_mat = None if val_set is None else val_set.csr_matrix
-
-    def pos_items(csr_row):
-        return [
-            item_idx
-            for (item_idx, rating) in zip(csr_row.indices, csr_row.data)
-            if rating >= rating_threshold
-        ]
-
-    for user_idx in tqdm.tqdm(test_set.user_indices, disable=not verbose, miniters=100):
-        test_pos_items = pos_items(gt_mat.getrow(user_idx))
-        if len(test_pos_items) == 0:
-            continue
-
-        u_gt_pos = np.zeros(test_set.num_items, dtype=np.float)
-        u_gt_pos[test_pos_items] = 1
-
-        val_pos_items = [] if val_mat is None else pos_items(
-            val_mat.getrow(user_idx))
-        train_pos_items = (
-            []
-            if train_set.is_unk_user(user_idx)
-            else pos_items(train_mat.getrow(user_idx))
+    if batch_size is not None:
+        return batch_ranking_eval(
+            model=model,
+            metrics=metrics,
+            train_set=train_set,
+            test_set=test_set,
+            val_set=val_set,
+            rating_threshold=rating_threshold,
+            exclude_unknowns=exclude_unknowns,
+            verbose=verbose,
+            props=props,
+            self_normalized=self_normalized,
+            score_cache=score_cache,
+            batch_size=batch_size,
+            user_sink=user_sink,
+            n_threads=n_threads,
+            profile=profile,
         )
 
-        u_gt_neg = np.ones(test_set.num_items, dtype=np.int)
-        u_gt_neg[test_pos_items + val_pos_items + train_pos_items] = 0
-
-        item_indices = None if exclude_unknowns else np.arange(
-            test_set.num_items)
-        item_rank, item_scores = model.rank(user_idx, item_indices)
-
-        total_pi = 0.0
-        if props is not None:
-            for idx, e in enumerate(u_gt_pos):
-                if e > 0 and props[str(idx)] > 0:
-                    u_gt_pos[idx] /= props[str(idx)]
-                    total_pi += (1 / props[str(idx)])
-
-        for i, mt in enumerate(metrics):
-            mt_score = mt.compute(
-                gt_pos=u_gt_pos,
-                gt_neg=u_gt_neg,
-                pd_rank=item_rank,
-                pd_scores=item_scores,
-            )
+    avg_results = []
+    user_results = [{} for _ in enumerate(metrics)]
 
-            if props is not None and self_normalized is True:
-                if total_pi > 0:
-                    mt_score /= total_pi
+    # running totals, used instead of `user_results` when streaming to a sink
+    totals = [0] * len(metrics)
+    n_users = 0
+
+    # positives of each user are read from slices of the CSR matrices
+    gt_mat = positive_matrix(test_set.csr_matrix, rating_threshold)
+    excl_mats = [positive_matrix(train_set.csr_matrix, rating_threshold)]
+    if val_set is not None:
+        excl_mats.append(positive_matrix(val_set.csr_matrix, rating_threshold))
+
+    item_indices = None if exclude_unknowns else np.arange(test_set.num_items)
+
+    full_ranking = any(needs_full_ranking(mt) for mt in metrics)
+    top_k = None if full_ranking else max(mt.k for mt in metrics)
+
+    def evaluate_users(users):
+        """Yield the user index and the results of each user having test positives"""
+
+        # ground truth buffers shared by all the users, only the entries of a
+        # user are set before computing the metrics and reset afterwards
+        u_gt_pos = np.zeros(test_set.num_items, dtype=np.float64)
+        u_gt_neg = np.ones(test_set.num_items, dtype=np.int64)
+
+        # phase timers and counters accumulated locally, added to `profile` at the end
+        clock = time.perf_counter
+        t_positives, t_rank, t_ips, t_metrics = 0.0, 0.0, 0.0, 0.0
+        n_users, n_scored, n_ranked = 0, 0, 0
+
+        for user_idx in users:
+            t_start = clock()
+            test_pos_items = row_indices(gt_mat, user_idx)
+            if len(test_pos_items) == 0:
+                continue
+
+            u_gt_pos[test_pos_items] = 1
+
+            excl_items = [test_pos_items] + [row_indices(excl_mat, user_idx)
+                                             for excl_mat in excl_mats]
+            for items in excl_items:
+                u_gt_neg[items] = 0
+            t_positives_end = clock()
+
+            if full_ranking:
+                if score_cache is None:
+                    item_rank, item_scores = model.rank(user_idx, item_indices)
+                else:
+                    item_rank, item_scores = score_cache.rank(
+                        model, user_idx, item_indices)
+            else:
+                if score_cache is None:
+                    item_scores = score_items(model, user_idx, item_indices)
+                else:
+                    item_scores = score_cache.scores(model, user_idx, item_indices)
+                item_rank = top_k_items(item_scores[None, :], top_k)[0]
+            t_rank_end = clock()
+
+            total_pi = 0.0
+            if props is not None:
+                u_pos_props = props[test_pos_items]
+                has_props = u_pos_props > 0
+                u_gt_pos[test_pos_items[has_props]] = 1.0 / u_pos_props[has_props]
+                total_pi = np.sum(1.0 / u_pos_props[has_props])
+            t_ips_end = clock()
+
+            u_results = []
+            for i, mt in enumerate(metrics):
+                mt_score = mt.compute(
+                    gt_pos=u_gt_pos,
+                    gt_neg=u_gt_neg,
+                    pd_rank=item_rank,
+                    pd_scores=item_scores,
+                )
 
-            user_results[i][user_idx] = mt_score
+                if props is not None and self_normalized is True:
+                    if total_pi > 0:
+                        mt_score /= total_pi
+
+                u_results.append(mt_score)
+            t_metrics_end = clock()
+
+            u_gt_pos[test_pos_items] = 0
+            for items in excl_items:
+                u_gt_neg[items] = 1
+
+            t_positives += (t_positives_end - t_start) + (clock() - t_metrics_end)
+            t_rank += t_rank_end - t_positives_end
+            t_ips += t_ips_end - t_rank_end
+            t_metrics += t_metrics_end - t_ips_end
+            n_users += 1
+            n_scored += len(item_scores)
+            n_ranked += len(item_rank)
+
+            yield user_idx, u_results
+
+        if profile is not None:
+            profile.add_time('positives', t_positives, n_users)
+            profile.add_time('rank', t_rank, n_users)
+            profile.add_time('ips', t_ips, n_users)
+            profile.add_time('metrics', t_metrics, n_users)
+            profile.add_count('users', n_users)
+            profile.add_count('items_scored', n_scored)
+            profile.add_count('items_ranked', n_ranked)
+            profile.add_count('buffer_bytes', u_gt_pos.nbytes + u_gt_neg.nbytes)
+
+    for user_idx, u_results in evaluate_users(
+            tqdm.tqdm(test_set.user_indices, disable=not verbose, miniters=100)):
+        if user_sink is None:
+            for i, mt_score in enumerate(u_results):
+                user_results[i][user_idx] = mt_score
+        else:
+            for i, mt_score in enumerate(u_results):
+                totals[i] += mt_score
+            user_sink.append(user_idx, u_results)
+            n_users += 1
+
+    if user_sink is not None:
+        user_sink.close()
+        return [total / n_users for total in totals], None
 
     # avg results of ranking metrics
     for i, mt in enumerate(metrics):
@@ -139,7 +298,10 @@ class StratifiedEvaluation(BaseMethod):
     Parameters
     ----------
     data: array-like, required
-        Raw preference data in the triplet format [(user_id, item_id, rating_value)].
+        Raw preference data in the triplet format [(user_id, item_id, rating_value)],
+        or :obj:`datasets.feedback_cache.FeedbackArrays` as returned by the
+        dataset loaders with `columnar=True`. The data is encoded once, the
+        splits and the strata are built from the encoded arrays.
 
     test_size: float, optional, default: 0.2
         The proportion of the test set, 
@@ -158,6 +320,60 @@ class StratifiedEvaluation(BaseMethod):
     exclude_unknowns: bool, optional, default: True
         If `True`, unknown users and items will be ignored during model evaluation.
 
+    cache_scores: bool, optional, default: True
+        If `True`, each test user is ranked once per model and the ranking is
+        shared by the Closed, IPS, SNIPS and stratified evaluations.
+
+    score_cache_bytes: int, optional, default: None
+        Memory budget (in bytes) of the ranking cache. If None, the rankings
+        of all test users are kept until the model has been evaluated.
+
+    batch_size: int, optional, default: None
+        If set, ranking metrics are computed for blocks of `batch_size` users
+        at once from a 2-D score matrix instead of user by user.
+
+    cache_dir: str, optional, default: None
+        Directory used to cache the propensity estimates across runs. The cache
+        is keyed by the item frequencies, so it is invalidated when the data changes.
+        If a `seed` is given, the built splits and strata are cached as well,
+        keyed by a hash of the data and the split parameters.
+
+    propensity_estimator: str or :obj:`eval_methods.propensity.PropensityEstimator`, optional, default: None
+        Estimator of the item propensities, an instance or one of 'powerlaw',
+        'powerlaw_mle' and 'popularity'. If None, the power-law fit of the
+        `powerlaw` package is used. The duration of the estimation is
+        available as `propensity_fit_time`.
+
+    user_results_dir: str, optional, default: None
+        If set, per-user results are streamed to chunked column files under
+        this directory (see :obj:`experiment.user_results.UserResultSink`) and
+        the `metric_user_results` of each result is a lazy view of them.
+        Only the averages are kept in memory.
+
+    n_negatives: int, optional, default: None
+        If set, the positives of each user are ranked against a sample of
+        `n_negatives` items the user has no positive feedback for (in any of
+        the splits) instead of the whole catalogue. The sample is drawn once
+        after the split, with the random generator of the `seed`, shared by
+        all models and evaluations, stored with the cached splits and
+        available as `negatives`. All the positives of a user are ranked
+        together against its negatives (not one positive at a time), see
+        `eval_methods.sampled_ranking.sampled_ranking_eval`.
+
+    n_threads: int, optional, default: None
+        If > 1, the test users of each evaluation are ranked in blocks (of
+        `batch_size` users, or `THREADED_BATCH_SIZE`) evaluated by a pool of
+        `n_threads` threads sharing the model and the ranking cache. Results
+        are those of a sequential evaluation, up to floating point rounding.
+
+    profile: bool, optional, default: False
+        The fit time of each model and the time of each protocol are always
+        recorded in the `profile` (:obj:`eval_methods.profiling.EvalProfile`)
+        of its :obj:`experiment.result.STResult`. If `True`, the time spent in
+        each phase of the ranking evaluation (positives, rank, ips, metrics)
+        and the number of users, items and allocated bytes are recorded as
+        well, by protocol (estimator or stratum).
+
     verbose: bool, optional, default: False
         Output running log.
     """
@@ -171,6 +387,15 @@ class StratifiedEvaluation(BaseMethod):
         rating_threshold=1.0,
         seed=None,
         exclude_unknowns=True,
+        cache_scores=True,
+        score_cache_bytes=None,
+        batch_size=None,
+        cache_dir=None,
+        propensity_estimator=None,
+        user_results_dir=None,
+        n_negatives=None,
+        n_threads=None,
+        profile=False,
         verbose=False,
         **kwargs
     ):
@@ -185,30 +410,68 @@ class StratifiedEvaluation(BaseMethod):
         )
 
         self.n_strata = n_strata
-
-        # estimate propensities
-        self.props = self._estimate_propensities()
+        self.cache_scores = cache_scores
+        self.score_cache_bytes = score_cache_bytes
+        self.batch_size = batch_size
+        self.cache_dir = cache_dir
+        self.propensity_estimator = get_propensity_estimator(propensity_estimator)
+        self.user_sink = None if user_results_dir is None else UserResultSink(user_results_dir)
+        self.n_negatives = n_negatives
+        self.n_threads = n_threads
+        self.profile = profile
+        self.negatives = None
+
+        # user and item codes of each observation, see `_build_dataset`
+        self._feedback = encode_feedback(data)
+
+        # estimate propensities (aligned with the raw ids of self.item_index),
+        # they are aligned with the inner item indices (self.props) once the data is split
+        self.item_props = self._estimate_propensities()
+        self.props = None
 
         # split the data into train/valid/test sets
         self.train_size, self.val_size, self.test_size = RatioSplit.validate_size(
-            val_size, test_size, len(self._data))
+            val_size, test_size, len(self._feedback))
         self._split()
 
-    def _eval(self, model, test_set, val_set, user_based, props=None, self_normalized=True):
+    def _eval(self, model, test_set, val_set, user_based, props=None, self_normalized=True,
+              score_cache=None, protocol=None, profile=None):
+
+        stats = None if profile is None else profile.section(protocol)
+        if score_cache is not None:
+            cache_hits, cache_misses = score_cache.hits, score_cache.misses
 
         metric_avg_results = OrderedDict()
         metric_user_results = OrderedDict()
 
+        # stream the per-user results of the protocol to disk
+        rating_sink, ranking_sink = None, None
+        if self.user_sink is not None:
+            if len(self.rating_metrics) > 0:
+                rating_sink = self.user_sink.writer(
+                    model.name, protocol, 'rating', [mt.name for mt in self.rating_metrics])
+            if len(self.ranking_metrics) > 0:
+                ranking_sink = self.user_sink.writer(
+                    model.name, protocol, 'ranking', [mt.name for mt in self.ranking_metrics])
+
+        start = time.perf_counter()
         avg_results, user_results = rating_eval(
             model=model,
             metrics=self.rating_metrics,
             test_set=test_set,
             user_based=user_based,
         )
+        if stats is not None:
+            stats.add_time('rating_eval', time.perf_counter() - start)
+        if rating_sink is not None:
+            rating_sink.extend_dicts(user_results)
+            rating_sink.close()
         for i, mt in enumerate(self.rating_metrics):
             metric_avg_results[mt.name] = avg_results[i]
-            metric_user_results[mt.name] = user_results[i]
+            if rating_sink is None:
+                metric_user_results[mt.name] = user_results[i]
 
+        start = time.perf_counter()
         avg_results, user_results = ranking_eval(
             model=model,
             metrics=self.ranking_metrics,
@@ -219,72 +482,213 @@ class StratifiedEvaluation(BaseMethod):
             exclude_unknowns=self.exclude_unknowns,
             verbose=self.verbose,
             props=props,
-            self_normalized=self_normalized
+            self_normalized=self_normalized,
+            score_cache=score_cache,
+            batch_size=self.batch_size,
+            user_sink=ranking_sink,
+            negatives=self.negatives,
+            n_threads=self.n_threads,
+            profile=stats if self.profile else None,
         )
+        if stats is not None:
+            stats.add_time('ranking_eval', time.perf_counter() - start)
+            if score_cache is not None:
+                stats.add_count('cache_hits', score_cache.hits - cache_hits)
+                stats.add_count('cache_misses', score_cache.misses - cache_misses)
         for i, mt in enumerate(self.ranking_metrics):
             metric_avg_results[mt.name] = avg_results[i]
-            metric_user_results[mt.name] = user_results[i]
+            if ranking_sink is None:
+                metric_user_results[mt.name] = user_results[i]
+
+        if self.user_sink is not None:
+            metric_user_results = self.user_sink.results(model.name, protocol)
 
         return Result(model.name, metric_avg_results, metric_user_results)
 
     def _split(self):
-        data_idx = self.rng.permutation(len(self._data))
+
+        # reuse the splits built from the same data and parameters,
+        # they are only reproducible with a seed
+        cache = None
+        if self.cache_dir is not None and self.seed is not None:
+            cache = SplitCache(self.cache_dir)
+            cache_key = split_cache_key(
+                data_fingerprint(self._feedback), seed=self.seed,
+                train_size=self.train_size, val_size=self.val_size, test_size=self.test_size,
+                n_strata=self.n_strata, exclude_unknowns=self.exclude_unknowns,
+                propensities=sorted(self.propensity_estimator.params().items()),
+                n_negatives=self.n_negatives, rating_threshold=self.rating_threshold)
+            cached = cache.load(cache_key)
+            if cached is not None:
+                self._load_split_arrays(cached)
+                return
+
+        data_idx = self.rng.permutation(len(self._feedback))
         train_idx = data_idx[:self.train_size]
         test_idx = data_idx[-self.test_size:]
         val_idx = data_idx[self.train_size:-self.test_size]
 
-        train_data = safe_indexing(self._data, train_idx)
-        test_data = safe_indexing(self._data, test_idx)
-        val_data = safe_indexing(self._data, val_idx) if len(
-            val_idx) > 0 else None
+        self._build_stratified_datasets(train_idx=train_idx,
+                                        test_idx=test_idx,
+                                        val_idx=val_idx if len(val_idx) > 0 else None)
+        if self.n_negatives is not None:
+            self._sample_negatives()
+
+        if cache is not None:
+            cache.save(cache_key, self._split_arrays())
+
+    def _split_datasets(self):
+        datasets = OrderedDict([('train', self.train_set), ('test', self.test_set)])
+        if self.val_set is not None:
+            datasets['val'] = self.val_set
+        datasets.update(self.stratified_sets)
+        return datasets
+
+    def _split_arrays(self):
+        """Flat dict of arrays holding the built splits and strata"""
+        arrays = {
+            'user_codes': self._user_codes,
+            'item_codes': self._item_codes,
+            'test_strata': self.test_strata,
+            'strata_bins': self.strata_bins,
+            'datasets': np.array(list(self._split_datasets()), dtype=str),
+        }
+        for name, dataset in self._split_datasets().items():
+            (u_indices, i_indices, r_values) = dataset.uir_tuple
+            arrays[name + '__u'] = u_indices
+            arrays[name + '__i'] = i_indices
+            arrays[name + '__r'] = r_values
+            arrays[name + '__uids'] = np.fromiter(dataset.uid_map.values(), dtype=np.int64,
+                                                  count=len(dataset.uid_map))
+            arrays[name + '__iids'] = np.fromiter(dataset.iid_map.values(), dtype=np.int64,
+                                                  count=len(dataset.iid_map))
+            arrays[name + '__size'] = np.array([dataset.num_users, dataset.num_items])
+        if self.negatives is not None:
+            arrays['negatives__indptr'], arrays['negatives__items'] = self.negatives
+        return arrays
+
+    def _load_split_arrays(self, arrays):
+        """Restore the splits and strata saved by `_split_arrays`"""
+        self._user_codes = arrays['user_codes']
+        self._item_codes = arrays['item_codes']
+        user_ids = self._feedback.user_ids[self._user_codes].tolist()
+        item_ids = self._feedback.item_ids[self._item_codes].tolist()
+
+        self.global_uid_map.clear()
+        self.global_uid_map.update(zip(user_ids, range(len(user_ids))))
+        self.global_iid_map.clear()
+        self.global_iid_map.update(zip(item_ids, range(len(item_ids))))
+
+        datasets = OrderedDict()
+        for name in arrays['datasets'].tolist():
+            uids, iids = arrays[name + '__uids'], arrays[name + '__iids']
+            num_users, num_items = arrays[name + '__size'].tolist()
+            datasets[name] = Dataset(
+                num_users=num_users,
+                num_items=num_items,
+                uid_map=OrderedDict(zip([user_ids[idx] for idx in uids], uids.tolist())),
+                iid_map=OrderedDict(zip([item_ids[idx] for idx in iids], iids.tolist())),
+                uir_tuple=(arrays[name + '__u'], arrays[name + '__i'], arrays[name + '__r']),
+                seed=self.seed,
+            )
+
+        self.train_set = datasets.pop('train')
+        self.test_set = datasets.pop('test')
+        self.val_set = datasets.pop('val', None)
+        self.stratified_sets = datasets
+
+        self.props = self.item_props[self._item_codes]
+        self.test_strata = arrays['test_strata']
+        self.strata_bins = arrays['strata_bins']
+        if 'negatives__indptr' in arrays:
+            self.negatives = (arrays['negatives__indptr'], arrays['negatives__items'])
+
+        if self.verbose:
+            print("---")
+            print("Splits loaded from cache: {}".format(", ".join(arrays['datasets'].tolist())))
+            print("Total users = {}".format(self.total_users))
+            print("Total items = {}".format(self.total_items))
+
+        self.train_set.total_users = self.total_users
+        self.train_set.total_items = self.total_items
+
+        self._build_modalities()
+
+    def _sample_negatives(self):
+        """Draw the negatives of every test and validation user"""
+        datasets = [self.train_set, self.test_set]
+        if self.val_set is not None:
+            datasets.append(self.val_set)
+        pos_mats = [positive_matrix(dataset.csr_matrix, self.rating_threshold)
+                    for dataset in datasets]
 
-        self._build_stratified_datasets(train_data=train_data,
-                                        test_data=test_data,
-                                        val_data=val_data)
+        user_indices = [np.fromiter(dataset.user_indices, dtype=np.int64)
+                        for dataset in datasets[1:]]
+        num_items = self.train_set.num_items if self.exclude_unknowns else self.total_items
+        self.negatives = sample_negatives(pos_mats, np.concatenate(user_indices),
+                                          num_items, self.n_negatives, self.rng)
+
+        if self.verbose:
+            print("---")
+            print("Sampled negatives = {} ({} per user)".format(
+                len(self.negatives[1]), self.n_negatives))
 
     def _estimate_propensities(self):
 
-        # find the item's frequencies
-        item_freq = defaultdict(int)
-        for u, i, r in self._data:
-            item_freq[i] += 1
+        # find the item's frequencies (items in order of first occurrence)
+        item_ids = self._feedback.item_ids
+        item_freq = np.bincount(self._feedback.items, minlength=len(item_ids))
+        self.item_index = pd.Index(item_ids)
 
-        # fit the exponential param
-        data = np.array([e for e in item_freq.values()], dtype=np.float)
-        results = powerlaw.Fit(data, discrete=True,
-                               fit_method='Likelihood')
-        alpha = results.power_law.alpha
-        fmin = results.power_law.xmin
+        estimator = self.propensity_estimator
+        start = time.time()
+
+        # reuse a previous fit on the same item frequencies
+        cache = None
+        if self.cache_dir is not None:
+            cache = PropensityCache(self.cache_dir)
+            cache_key = propensity_fingerprint(item_ids, item_freq, **estimator.params())
+            cached = cache.load(cache_key)
+            if cached is not None:
+                self.alpha, self.xmin = cached['alpha'], cached['xmin']
+                self.propensity_fit_time = time.time() - start
+                if self.verbose:
+                    print('Propensities loaded from cache ({}) in {:.3f}s'.format(
+                        estimator.name, self.propensity_fit_time))
+                return cached['props']
+
+        # fit the estimator on the item frequencies
+        props = estimator.estimate(item_freq)
+        self.alpha, self.xmin = estimator.alpha, estimator.xmin
+        self.propensity_fit_time = estimator.fit_time
 
         if self.verbose:
-            print('Powerlaw exponential estimates: %f, min=%d' % (alpha, fmin))
+            print('Propensities estimated ({}) in {:.3f}s'.format(
+                estimator.name, self.propensity_fit_time))
+            if self.alpha is not None:
+                print('Powerlaw exponential estimates: %f, min=%d' % (self.alpha, self.xmin))
 
-        # replace raw frequencies with the estimated propensities
-        for k, v in item_freq.items():
-            if v > fmin:
-                item_freq[k] = pow(v, alpha)
+        if cache is not None:
+            cache.save(cache_key, self.alpha, self.xmin, props)
 
-        return item_freq  # user-independent propensity estimations
+        return props  # user-independent propensity estimations
 
-    def _build_stratified_datasets(self, train_data, test_data, val_data):
+    def _build_stratified_datasets(self, train_idx, test_idx, val_idx):
 
-        if train_data is None or len(train_data) == 0:
+        if train_idx is None or len(train_idx) == 0:
             raise ValueError("train_data is required but None or empty!")
-        if test_data is None or len(test_data) == 0:
+        if test_idx is None or len(test_idx) == 0:
             raise ValueError("test_data is required but None or empty!")
 
         self.global_uid_map.clear()
         self.global_iid_map.clear()
 
+        # inner index of each user and item code, -1 until it is mapped
+        self._user_inner = np.full(len(self._feedback.user_ids), -1, dtype=np.int64)
+        self._item_inner = np.full(len(self._feedback.item_ids), -1, dtype=np.int64)
+
         # build training set
-        self.train_set = Dataset.build(
-            data=train_data,
-            fmt=self.fmt,
-            global_uid_map=self.global_uid_map,
-            global_iid_map=self.global_iid_map,
-            seed=self.seed,
-            exclude_unknowns=False,
-        )
+        self.train_set = self._build_dataset(train_idx, exclude_unknowns=False)
         if self.verbose:
             print("---")
             print("Training data:")
@@ -296,14 +700,7 @@ class StratifiedEvaluation(BaseMethod):
             print("Global mean = {:.1f}".format(self.train_set.global_mean))
 
         # build test set
-        self.test_set = Dataset.build(
-            data=test_data,
-            fmt=self.fmt,
-            global_uid_map=self.global_uid_map,
-            global_iid_map=self.global_iid_map,
-            seed=self.seed,
-            exclude_unknowns=self.exclude_unknowns,
-        )
+        self.test_set = self._build_dataset(test_idx, exclude_unknowns=self.exclude_unknowns)
         if self.verbose:
             print("---")
             print("Test data (Q0):")
@@ -324,37 +721,40 @@ class StratifiedEvaluation(BaseMethod):
                 )
             )
 
+        if val_idx is not None and len(val_idx) > 0:
+            self.val_set = self._build_dataset(val_idx, exclude_unknowns=self.exclude_unknowns)
+            if self.verbose:
+                print("---")
+                print("Validation data:")
+                print("Number of users = {}".format(len(self.val_set.uid_map)))
+                print("Number of items = {}".format(len(self.val_set.iid_map)))
+                print("Number of ratings = {}".format(self.val_set.num_ratings))
+
+        # user and item codes of each inner index
+        self._user_codes = self._inverse_index(self._user_inner)
+        self._item_codes = self._inverse_index(self._item_inner)
+
+        # propensity of each item, indexed by its inner index
+        self.props = self.item_props[self._item_codes]
+
         # build stratified datasets
-        self.stratified_sets = {}
+        self.stratified_sets = OrderedDict()
 
-        # match the corresponding propensity score for each feedback
-        test_props = np.array([self.props[i]
-                               for u, i, r in test_data], dtype=np.float64)
+        # the bins are estimated on the propensities of all test feedback
+        test_props = self.item_props[self._feedback.items[test_idx]]
+        _, self.strata_bins = pd.cut(x=test_props, bins=self.n_strata, retbins=True)
 
-        # stratify
-        strata, bins = pd.cut(x=test_props,
-                              bins=self.n_strata,
-                              labels=['Q%d' %
-                                      i for i in range(1, self.n_strata+1)],
-                              retbins=True)
+        # assign each test observation to its stratum in a single pass
+        (_, test_i_indices, _) = self.test_set.uir_tuple
+        self.test_strata = np.digitize(self.props[test_i_indices],
+                                       self.strata_bins[1:-1], right=True)
 
-        for stratum in sorted(np.unique(strata)):
+        for q in np.unique(self.test_strata):
+            stratum = 'Q%d' % (q + 1)
 
             # sample the corresponding sub-population
-            qtest_data = []
-            for (u, i, r), q in zip(test_data, strata):
-                if q == stratum:
-                    qtest_data.append((u, i, r))
-
-            # build a dataset
-            qtest_set = Dataset.build(
-                data=qtest_data,
-                fmt=self.fmt,
-                global_uid_map=self.global_uid_map,
-                global_iid_map=self.global_iid_map,
-                seed=self.seed,
-                exclude_unknowns=self.exclude_unknowns,
-            )
+            qtest_set = self._build_subset(
+                self.test_set, self.test_strata == q)
             if self.verbose:
                 print("---")
                 print("Test data ({}):".format(stratum))
@@ -374,28 +774,12 @@ class StratifiedEvaluation(BaseMethod):
                 )
                 print(
                     "Number of unknown items = {}".format(
-                        self.test_set.num_items - self.train_set.num_items
+                        qtest_set.num_items - self.train_set.num_items
                     )
                 )
 
             self.stratified_sets[stratum] = qtest_set
 
-        if val_data is not None and len(val_data) > 0:
-            self.val_set = Dataset.build(
-                data=val_data,
-                fmt=self.fmt,
-                global_uid_map=self.global_uid_map,
-                global_iid_map=self.global_iid_map,
-                seed=self.seed,
-                exclude_unknowns=self.exclude_unknowns,
-            )
-            if self.verbose:
-                print("---")
-                print("Validation data:")
-                print("Number of users = {}".format(len(self.val_set.uid_map)))
-                print("Number of items = {}".format(len(self.val_set.iid_map)))
-                print("Number of ratings = {}".format(self.val_set.num_ratings))
-
         if self.verbose:
             print("---")
             print("Total users = {}".format(self.total_users))
@@ -408,9 +792,83 @@ class StratifiedEvaluation(BaseMethod):
 
         return self
 
+    @staticmethod
+    def _first_occurrences(indices):
+        """Distinct values of `indices` in order of first occurrence"""
+        _, first = np.unique(indices, return_index=True)
+        return indices[np.sort(first)]
+
+    @staticmethod
+    def _inverse_index(inner):
+        codes = np.empty(np.count_nonzero(inner >= 0), dtype=np.int64)
+        codes[inner[inner >= 0]] = np.flatnonzero(inner >= 0)
+        return codes
+
+    def _map_codes(self, codes, inner, raw_ids, global_map):
+        """Map `codes` to inner indices, indexing the new ones, and return the id map of the dataset"""
+        ordered = self._first_occurrences(codes)
+        new = ordered[inner[ordered] < 0]
+        inner[new] = np.arange(len(global_map), len(global_map) + len(new))
+        global_map.update(zip(raw_ids[new].tolist(), inner[new].tolist()))
+        return OrderedDict(zip(raw_ids[ordered].tolist(), inner[ordered].tolist()))
+
+    def _build_dataset(self, idx, exclude_unknowns):
+        """Dataset made of the observations `idx` of the data, as `Dataset.build` does"""
+        users = self._feedback.users[idx].astype(np.int64)
+        items = self._feedback.items[idx].astype(np.int64)
+        ratings = self._feedback.ratings[idx].astype(np.float64)
+
+        if exclude_unknowns:
+            known = (self._user_inner[users] >= 0) & (self._item_inner[items] >= 0)
+            users, items, ratings = users[known], items[known], ratings[known]
+
+        # avoid duplicate observations, the first one is kept
+        _, first = np.unique(users * len(self._feedback.item_ids) + items, return_index=True)
+        if len(first) < len(users):
+            warnings.warn("%d duplicated observations are removed!" % (len(users) - len(first)))
+        if len(first) == 0:
+            raise ValueError("data is empty after being filtered!")
+        first.sort()
+        users, items, ratings = users[first], items[first], ratings[first]
+
+        uid_map = self._map_codes(users, self._user_inner,
+                                  self._feedback.user_ids, self.global_uid_map)
+        iid_map = self._map_codes(items, self._item_inner,
+                                  self._feedback.item_ids, self.global_iid_map)
+
+        return Dataset(
+            num_users=len(self.global_uid_map),
+            num_items=len(self.global_iid_map),
+            uid_map=uid_map,
+            iid_map=iid_map,
+            uir_tuple=(self._user_inner[users], self._item_inner[items], ratings),
+            seed=self.seed,
+        )
+
+    def _build_subset(self, dataset, mask):
+        """Dataset made of the observations of `dataset` selected by a boolean `mask`"""
+        (u_indices, i_indices, r_values) = dataset.uir_tuple
+        u_indices, i_indices, r_values = u_indices[mask], i_indices[mask], r_values[mask]
+
+        def ordered_map(indices, codes, raw_ids):
+            # same ordering as `Dataset.build` (first occurrence)
+            indices = self._first_occurrences(indices)
+            return OrderedDict(zip(raw_ids[codes[indices]].tolist(), indices.tolist()))
+
+        return Dataset(
+            num_users=dataset.num_users,
+            num_items=dataset.num_items,
+            uid_map=ordered_map(u_indices, self._user_codes, self._feedback.user_ids),
+            iid_map=ordered_map(i_indices, self._item_codes, self._feedback.item_ids),
+            uir_tuple=(u_indices, i_indices, r_values),
+            seed=self.seed,
+        )
+
     def evaluate(self, model, metrics, user_based, show_validation):
 
         result = STResult(model.name)
+        result.profile = profile = EvalProfile(model.name)
+        timings = profile.section('Model')
 
         if self.train_set is None:
             raise ValueError("train_set is required but None!")
@@ -426,9 +884,8 @@ class StratifiedEvaluation(BaseMethod):
         if self.verbose:
             print("\n[{}] Training started!".format(model.name))
 
-        start = time.time()
-        model.fit(self.train_set, self.val_set)
-        train_time = time.time() - start
+        with timings.timer('fit'):
+            model.fit(self.train_set, self.val_set)
 
         ##############
         # EVALUATION #
@@ -437,15 +894,23 @@ class StratifiedEvaluation(BaseMethod):
         if self.verbose:
             print("\n[{}] Evaluation started!".format(model.name))
 
+        # rank each user once and share it across all the evaluations below
+        score_cache = ScoreCache(
+            self.score_cache_bytes) if self.cache_scores else None
+        test_start = time.perf_counter()
+
         # evaluate on the sampled test set (closed-loop)
         test_result = self._eval(
             model=model,
             test_set=self.test_set,
             val_set=self.val_set,
             user_based=user_based,
+            score_cache=score_cache,
+            protocol='Closed',
+            profile=profile,
         )
         test_result.metric_avg_results["SIZE"] = self.test_set.num_ratings
-        result.append(test_result)
+        result.add('Closed', test_result)
 
         if self.verbose:
             print("\n[{}] IPS Evaluation started!".format(model.name))
@@ -457,10 +922,13 @@ class StratifiedEvaluation(BaseMethod):
             val_set=self.val_set,
             user_based=user_based,
             props=self.props,
-            self_normalized=False
+            self_normalized=False,
+            score_cache=score_cache,
+            protocol='IPS',
+            profile=profile,
         )
         ips_result.metric_avg_results["SIZE"] = self.test_set.num_ratings
-        result.append(ips_result)
+        result.add('IPS', ips_result)
 
         if self.verbose:
             print("\n[{}] SNIPS Evaluation started!".format(model.name))
@@ -472,17 +940,18 @@ class StratifiedEvaluation(BaseMethod):
             val_set=self.val_set,
             user_based=user_based,
             props=self.props,
-            self_normalized=True
+            self_normalized=True,
+            score_cache=score_cache,
+            protocol='SNIPS',
+            profile=profile,
         )
         snips_result.metric_avg_results["SIZE"] = self.test_set.num_ratings
-        result.append(snips_result)
+        result.add('SNIPS', snips_result)
 
         if self.verbose:
             print("\n[{}] Stratified Evaluation started!".format(model.name))
 
         # evaluate on different strata
-        start = time.time()
-
         for stratum, qtest_set in self.stratified_sets.items():
 
             qtest_result = self._eval(
@@ -490,21 +959,30 @@ class StratifiedEvaluation(BaseMethod):
                 test_set=qtest_set,
                 val_set=self.val_set,
                 user_based=user_based,
+                score_cache=score_cache,
+                protocol=stratum,
+                profile=profile,
             )
 
-            test_time = time.time() - start
             qtest_result.metric_avg_results["SIZE"] = qtest_set.num_ratings
 
-            result.append(qtest_result)
+            result.add(stratum, qtest_result)
+
+        timings.add_time('test', time.perf_counter() - test_start)
 
-        result.organize()
+        with timings.timer('organize'):
+            result.organize()
 
         val_result = None
         if show_validation and self.val_set is not None:
-            start = time.time()
-            val_result = self._eval(
-                model=model, test_set=self.val_set, val_set=None, user_based=user_based
-            )
-            val_time = time.time() - start
+            with timings.timer('validation'):
+                val_result = self._eval(
+                    model=model, test_set=self.val_set, val_set=None, user_based=user_based,
+                    score_cache=score_cache, protocol='Validation', profile=profile
+                )
+
+        if score_cache is not None:
+            timings.add_count('cache_bytes', score_cache.nbytes)
+            score_cache.clear()
 
         return result, val_result
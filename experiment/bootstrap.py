@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+
+from cornac.utils import get_rng
+
+
+def _user_column(user_results, metric):
+    """User indices and scores of `metric` in per-user results (dict or lazy view)"""
+    if hasattr(user_results, 'column'):
+        return user_results.column(metric, mmap=False)
+    scores = user_results[metric]
+    users = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+    return users, np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+
+
+def user_matrix(user_results, metrics):
+    """Align the per-user results of several models into a single matrix.
+
+    Parameters
+    ----------
+    user_results: list, required
+        Per-user results of each model, a mapping of each metric to a
+        {user_idx: score} dict (`metric_user_results` of a result).
+
+    metrics: list of str, required
+        The metrics to be aligned.
+
+    Returns
+    -------
+    res: (Numpy array, Numpy array, Numpy array)
+        The sorted union of the users, and two (users x (models x metrics))
+        arrays of the scores and of the presence (1 or 0) of a score, with
+        the column of a model `m` and metric `j` at `m * len(metrics) + j`.
+
+    """
+    columns = [[_user_column(res, metric) if res is not None and metric in res else None
+                for metric in metrics] for res in user_results]
+    users = np.unique(np.concatenate(
+        [np.empty(0, dtype=np.int64)] +
+        [col[0] for model_cols in columns for col in model_cols if col is not None]))
+
+    n_cols = len(user_results) * len(metrics)
+    values = np.zeros((len(users), n_cols))
+    mask = np.zeros((len(users), n_cols))
+    locs = {}  # metrics of a model usually share the same users
+    for m, model_cols in enumerate(columns):
+        for j, col in enumerate(model_cols):
+            if col is None:
+                continue
+            key = col[0].tobytes()
+            loc = locs.get(key)
+            if loc is None:
+                loc = locs[key] = np.searchsorted(users, col[0])
+            values[loc, m * len(metrics) + j] = col[1]
+            mask[loc, m * len(metrics) + j] = 1.0
+    return users, values, mask
+
+
+def resample_indices(n_users, n_resamples, rng):
+    """Pre-drawn (resamples x users) matrix of user positions, drawn with replacement"""
+    dtype = np.int32 if n_users < np.iinfo(np.int32).max else np.int64
+    return rng.randint(n_users, size=(n_resamples, n_users)).astype(dtype)
+
+
+def bootstrap_means(values, mask, indices, block_size=256):
+    """Mean of every column of `values` on each bootstrap resample of the users.
+
+    The resamples are turned into (resamples x users) count matrices, so the
+    means of all columns are two matrix products per block of resamples.
+
+    Parameters
+    ----------
+    values: Numpy array, required
+        (users x columns) array of per-user scores.
+
+    mask: Numpy array, required
+        (users x columns) array, 1 where a user has a score in the column.
+
+    indices: Numpy array, required
+        (resamples x users) matrix of resampled user positions, see `resample_indices`.
+
+    block_size: int, optional, default: 256
+        Number of resamples converted to counts at once.
+
+    Returns
+    -------
+    means: Numpy array
+        (resamples x columns) array, NaN where a resample has no score.
+
+    """
+    n_resamples, n_users = indices.shape
+    masked_values = values * mask
+
+    # columns usually share a few user sets, the counts are computed once per set
+    set_ids = OrderedDict()
+    set_of_column = np.array([set_ids.setdefault(col.tobytes(), len(set_ids))
+                              for col in np.packbits(mask > 0, axis=0).T], dtype=np.int64)
+    user_sets = mask[:, np.unique(set_of_column, return_index=True)[1]]
+
+    means = np.empty((n_resamples, values.shape[1]))
+    for start in range(0, n_resamples, block_size):
+        block = indices[start:start + block_size]
+        offsets = np.arange(len(block))[:, None] * n_users
+        counts = np.bincount((block + offsets).ravel(),
+                             minlength=len(block) * n_users).reshape(len(block), n_users)
+        counts = counts.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[start:start + len(block)] = \
+                counts.dot(masked_values) / counts.dot(user_sets)[:, set_of_column]
+    return means
+
+
+def bootstrap_ci(results, metrics=None, n_resamples=1000, confidence=0.95, seed=None):
+    """Bootstrap confidence intervals of the results of several models.
+
+    The users of each protocol (Closed, IPS, SNIPS, Q1, ...) are resampled
+    with replacement, all models and metrics are computed at once from a
+    single pre-drawn resample matrix per set of users, so the models are
+    compared on the same resamples. The Unbiased estimate is resampled within
+    each stratum: its replicates are the size-weighted sums of the replicates
+    of the strata.
+
+    Parameters
+    ----------
+    results: list of :obj:`experiment.result.STResult`, required
+        Organized results of each model, with their per-user results.
+
+    metrics: list of str, optional, default: None
+        Metrics to be resampled. If None, all the metrics having per-user results.
+
+    n_resamples: int, optional, default: 1000
+        Number of bootstrap resamples.
+
+    confidence: float, optional, default: 0.95
+        Confidence level of the percentile intervals.
+
+    seed: int, optional, default: None
+        Random seed of the resamples.
+
+    Returns
+    -------
+    res: :obj:`pandas.DataFrame`
+        Indexed by (model, protocol, metric), with the estimate on all users
+        (`mean`), the standard deviation of the replicates (`std`) and the
+        bounds of the interval (`lower`, `upper`).
+
+    """
+    rng = get_rng(seed)
+    model_names = [result.model_name for result in results]
+
+    # per-user results of each protocol, in the order of the first model
+    protocols = OrderedDict()
+    sizes = OrderedDict()
+    for m, result in enumerate(results):
+        for protocol, res in zip(result.protocol_names(), result):
+            if res.metric_user_results is None:
+                continue
+            protocols.setdefault(protocol, [None] * len(results))[m] = res.metric_user_results
+            sizes[protocol] = res.metric_avg_results.get('SIZE')
+
+    if metrics is None:
+        metrics = []
+        for user_results in protocols.values():
+            for res in user_results:
+                metrics.extend(mt for mt in (res or []) if mt not in metrics)
+
+    # one resample matrix per set of users (Closed, IPS and SNIPS share it)
+    resamples = {}
+    estimates, replicates = OrderedDict(), OrderedDict()
+    for protocol, user_results in protocols.items():
+        users, values, mask = user_matrix(user_results, metrics)
+        key = users.tobytes()
+        if key not in resamples:
+            resamples[key] = resample_indices(len(users), n_resamples, rng)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimates[protocol] = (values * mask).sum(axis=0) / mask.sum(axis=0)
+        replicates[protocol] = bootstrap_means(values, mask, resamples[key])
+
+    # stratified resampling of the unbiased estimate
+    strata = [p for p in protocols if p.startswith('Q')]
+    if len(strata) > 0 and sizes.get('Closed'):
+        weights = [sizes[q] / sizes['Closed'] for q in strata]
+        estimates['Unbiased'] = sum(w * estimates[q] for w, q in zip(weights, strata))
+        replicates['Unbiased'] = sum(w * replicates[q] for w, q in zip(weights, strata))
+
+    alpha = (1.0 - confidence) / 2.0
+    rows, index = [], []
+    for protocol, reps in replicates.items():
+        percentile = np.nanpercentile if np.isnan(reps).any() else np.percentile
+        lower, upper = percentile(reps, [100 * alpha, 100 * (1 - alpha)], axis=0)
+        stats = np.column_stack([estimates[protocol], np.nanstd(reps, axis=0), lower, upper])
+        for m, model_name in enumerate(model_names):
+            for j, metric in enumerate(metrics):
+                index.append((model_name, protocol, metric))
+                rows.append(stats[m * len(metrics) + j])
+
+    return pd.DataFrame(rows, columns=['mean', 'std', 'lower', 'upper'],
+                        index=pd.MultiIndex.from_tuples(
+                            index, names=['model', 'protocol', 'metric']))
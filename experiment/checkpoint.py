@@ -0,0 +1,158 @@
+import os
+import pickle
+import hashlib
+
+import numpy as np
+
+from experiment.model_spec import ModelSpec
+
+
+def _update(sha, value):
+    """Feed a hyperparameter value to `sha`, arrays by content and containers recursively"""
+    if isinstance(value, np.ndarray):
+        sha.update(str(value.dtype).encode('utf-8'))
+        sha.update(str(value.shape).encode('utf-8'))
+        sha.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        sha.update(b'{')
+        for k in sorted(value, key=str):
+            sha.update(repr(k).encode('utf-8'))
+            _update(sha, value[k])
+        sha.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        sha.update(b'[')
+        for v in value:
+            _update(sha, v)
+        sha.update(b']')
+    else:
+        sha.update(repr(value).encode('utf-8'))
+
+
+def model_fingerprint(model):
+    """Hash identifying a model by its class, name and constructor parameters.
+
+    It has to be computed before the model is fitted, some models store
+    their learned parameters in constructor arguments (e.g. `init_params`).
+
+    Parameters
+    ----------
+    model: :obj:`cornac.models.Recommender`, required
+
+    Returns
+    -------
+    res: str
+        Hexadecimal digest.
+
+    """
+    sha = hashlib.sha1()
+    cls = model.__class__
+    sha.update('{}.{}'.format(cls.__module__, cls.__name__).encode('utf-8'))
+    sha.update(model.name.encode('utf-8'))
+    for name in model._get_init_params():
+        sha.update(name.encode('utf-8'))
+        _update(sha, getattr(model, name, None))
+    return sha.hexdigest()
+
+
+def spec_fingerprint(spec):
+    """Hash identifying a model spec by its class path, name and parameters.
+
+    The model is not built, only the parameters given to the spec are hashed,
+    its other constructor parameters are the defaults of the model class.
+
+    Parameters
+    ----------
+    spec: :obj:`experiment.model_spec.ModelSpec`, required
+
+    Returns
+    -------
+    res: str
+        Hexadecimal digest.
+
+    """
+    sha = hashlib.sha1()
+    sha.update(spec.model_class.encode('utf-8'))
+    sha.update(spec.name.encode('utf-8'))
+    _update(sha, spec.params)
+    return sha.hexdigest()
+
+
+def split_fingerprint(eval_method):
+    """Hash identifying the data splits (and strata) of an evaluation method.
+
+    Parameters
+    ----------
+    eval_method: :obj:`cornac.eval_methods.BaseMethod`, required
+        An evaluation method whose datasets are built.
+
+    Returns
+    -------
+    res: str
+        Hexadecimal digest.
+
+    """
+    sha = hashlib.sha1()
+    for dataset in (eval_method.train_set, eval_method.test_set, eval_method.val_set):
+        if dataset is None:
+            sha.update(b'None')
+            continue
+        _update(sha, list(dataset.uir_tuple))
+        sha.update('\x00'.join(str(uid) for uid in dataset.uid_map).encode('utf-8'))
+        sha.update('\x00'.join(str(iid) for iid in dataset.iid_map).encode('utf-8'))
+
+    _update(sha, [eval_method.rating_threshold, eval_method.exclude_unknowns])
+    for attr in ('props', 'test_strata', 'negatives'):
+        _update(sha, getattr(eval_method, attr, None))
+    return sha.hexdigest()
+
+
+class CheckpointStore:
+    """On-disk store of the results of each model of an experiment.
+
+    A checkpoint is keyed by the model (name and hyperparameters), the data
+    split and the evaluation settings, see `CheckpointStore.key`.
+
+    Parameters
+    ----------
+    checkpoint_dir: str, required
+        Directory where the checkpoints are stored.
+
+    """
+
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model, split_key, **params):
+        """Return the checkpoint key of `model` (unfitted, or a spec) on the split identified by `split_key`"""
+        sha = hashlib.sha1()
+        if isinstance(model, ModelSpec):
+            sha.update(spec_fingerprint(model).encode('utf-8'))
+        else:
+            sha.update(model_fingerprint(model).encode('utf-8'))
+        sha.update(split_key.encode('utf-8'))
+        sha.update(repr(sorted(params.items())).encode('utf-8'))
+        return sha.hexdigest()
+
+    def _path(self, model_name, key):
+        return os.path.join(self.checkpoint_dir, '{}_{}.pkl'.format(
+            model_name.replace(os.sep, '_'), key))
+
+    def load(self, model_name, key):
+        """Return the results stored under `key`, or None if the model is not complete"""
+        path = self._path(model_name, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, model_name, key, results):
+        """Store the results of a model under `key`"""
+        path = self._path(model_name, key)
+
+        # write then rename, an interrupted run never leaves a partial checkpoint
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(results, f)
+        os.replace(tmp_path, path)
@@ -1,12 +1,103 @@
+import os
+import sys
+import multiprocessing
+from datetime import datetime
+
 from cornac.experiment.experiment import Experiment
 from cornac.eval_methods.cross_validation import CrossValidation
 from cornac.experiment.result import ExperimentResult
 from cornac.experiment.result import CVExperimentResult
 
 from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.checkpoint import CheckpointStore
+from experiment.checkpoint import split_fingerprint
+from experiment.model_spec import ModelSpec
+
+
+# experiment inherited by the forked workers, see `STExperiment._run_parallel`
+_WORKER_EXPERIMENT = None
+
+
+def _evaluate_model(model_idx):
+    return _WORKER_EXPERIMENT._evaluate(_WORKER_EXPERIMENT._model(model_idx),
+                                        _WORKER_EXPERIMENT._checkpoint_keys[model_idx])
 
 
 class STExperiment(Experiment):
+    """Experiment Class for the Stratified Evaluation method
+
+    Parameters
+    ----------
+    models: list, required
+        Models (:obj:`cornac.models.Recommender`) and/or model specs
+        (:obj:`experiment.model_spec.ModelSpec`). A spec is instantiated
+        just before the model is fitted and released once it is evaluated,
+        only its results are kept, see `utils.get_model_specs`.
+
+    n_jobs: int, optional, default: 1
+        Number of processes used to train and evaluate the models. Workers are
+        forked from the current process, so the datasets already built by the
+        evaluation method are shared copy-on-write instead of being pickled
+        for each model. Results are collected in the order of `models`.
+
+    checkpoint_dir: str, optional, default: None
+        If set, the results of each model are saved to this directory as soon
+        as the model is evaluated, keyed by the model name and hyperparameters,
+        the data split and the metrics. Models with a checkpoint are not
+        evaluated again, so an interrupted run can be restarted and new
+        models can be added at the cost of evaluating them only.
+
+    See :obj:`cornac.experiment.Experiment` for the other parameters.
+    """
+
+    def __init__(
+        self,
+        eval_method,
+        models,
+        metrics,
+        user_based=True,
+        show_validation=True,
+        verbose=False,
+        save_dir=None,
+        n_jobs=1,
+        checkpoint_dir=None,
+    ):
+        super().__init__(
+            eval_method=eval_method,
+            models=models,
+            metrics=metrics,
+            user_based=user_based,
+            show_validation=show_validation,
+            verbose=verbose,
+            save_dir=save_dir,
+        )
+        self.n_jobs = n_jobs
+        self.checkpoints = None if checkpoint_dir is None else CheckpointStore(checkpoint_dir)
+        self._checkpoint_keys = [None] * len(self.models)
+
+    @staticmethod
+    def _validate_models(input_models):
+        if not hasattr(input_models, "__len__"):
+            raise ValueError(
+                "models have to be an array but {}".format(type(input_models))
+            )
+
+        # `cornac.models` is slow to import and not needed by the specs, a model
+        # instance can only be a `Recommender` if its module is already loaded
+        recommender_module = sys.modules.get('cornac.models.recommender')
+        model_types = (ModelSpec,) if recommender_module is None else \
+            (ModelSpec, recommender_module.Recommender)
+
+        valid_models = []
+        for model in input_models:
+            if isinstance(model, model_types):
+                valid_models.append(model)
+        return valid_models
+
+    def _model(self, model_idx, **params):
+        """Return the model at `model_idx`, a new instance if it is given by a spec"""
+        model = self.models[model_idx]
+        return model.build(**params) if isinstance(model, ModelSpec) else model
 
     def _create_result(self):
 
@@ -16,3 +107,100 @@ class STExperiment(Experiment):
             self.result = ExperimentResult()
             if self.show_validation and self.eval_method.val_set is not None:
                 self.val_result = ExperimentResult()
+
+    def _evaluate(self, model, checkpoint_key=None):
+        test_result, val_result = self.eval_method.evaluate(
+            model=model,
+            metrics=self.metrics,
+            user_based=self.user_based,
+            show_validation=self.show_validation,
+        )
+
+        if not isinstance(self.result, CVExperimentResult):
+            model.save(self.save_dir)
+
+        if checkpoint_key is not None:
+            self.checkpoints.save(model.name, checkpoint_key, (test_result, val_result))
+
+        return test_result, val_result
+
+    def _model_keys(self, split_key, **params):
+        """Return the checkpoint key of each model, specs are keyed without building their model"""
+        return [self.checkpoints.key(model, split_key, **params) for model in self.models]
+
+    def _load_checkpoints(self):
+        """Return the results of the models with a checkpoint, by model index"""
+        if self.checkpoints is None:
+            return {}
+
+        # models have to be keyed before they are fitted
+        split_key = split_fingerprint(self.eval_method)
+        metric_names = sorted(mt.name for mt in self.metrics)
+        self._checkpoint_keys = self._model_keys(split_key, metrics=metric_names,
+                                                 user_based=self.user_based,
+                                                 show_validation=self.show_validation)
+
+        completed = {}
+        for model_idx, (model, key) in enumerate(zip(self.models, self._checkpoint_keys)):
+            results = self.checkpoints.load(model.name, key)
+            if results is not None:
+                completed[model_idx] = results
+                if self.verbose:
+                    print("\n[{}] Loaded from checkpoint".format(model.name))
+        return completed
+
+    def _run_parallel(self, model_indices):
+        global _WORKER_EXPERIMENT
+
+        _WORKER_EXPERIMENT = self
+        try:
+            # a fresh worker per model releases the memory held by its backend
+            with multiprocessing.get_context('fork').Pool(
+                    processes=self.n_jobs, maxtasksperchild=1) as pool:
+                for results in pool.imap(_evaluate_model, model_indices):
+                    yield results
+        finally:
+            _WORKER_EXPERIMENT = None
+
+    def _run_models(self):
+        """Yield the results of each model in order, evaluating the ones without a checkpoint"""
+        completed = self._load_checkpoints()
+        pending = [idx for idx in range(len(self.models)) if idx not in completed]
+
+        if self.n_jobs > 1:
+            evaluated = self._run_parallel(pending)
+        else:
+            # a model built from a spec is released as soon as it is evaluated
+            evaluated = (self._evaluate(self._model(idx), self._checkpoint_keys[idx])
+                         for idx in pending)
+
+        for model_idx in range(len(self.models)):
+            if model_idx in completed:
+                yield completed.pop(model_idx)
+            else:
+                yield next(evaluated)
+
+    def run(self):
+        """Run the experiment, evaluating the models in parallel if `n_jobs` > 1"""
+        self._create_result()
+
+        outputs = self._run_models()
+
+        for test_result, val_result in outputs:
+            self.result.append(test_result)
+            if self.val_result is not None:
+                self.val_result.append(val_result)
+
+        output = ""
+        if self.val_result is not None:
+            output += "\nVALIDATION:\n...\n{}".format(self.val_result)
+        output += "\nTEST:\n...\n{}".format(self.result)
+
+        print(output)
+
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        save_dir = "." if self.save_dir is None else self.save_dir
+        output_file = os.path.join(
+            save_dir, "CornacExp-{}.log".format(timestamp))
+        with open(output_file, "w") as f:
+            f.write(output)
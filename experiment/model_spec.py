@@ -0,0 +1,45 @@
+import importlib
+
+
+class ModelSpec:
+    """Lightweight description of a model, instantiated only when it is about to be fitted.
+
+    A spec holds the class path and the constructor parameters of a model, so
+    an experiment over many models keeps a single model (and its backend
+    state) alive at a time, see :obj:`experiment.experiment.STExperiment`.
+
+    Parameters
+    ----------
+    model_class: str, required
+        Dotted path of the model class, e.g. 'cornac.models.MF'. The module is
+        only imported by `build`.
+
+    name: str, required
+        Name of the model.
+
+    family: str, optional, default: None
+        Family of the model, used to filter specs. If None, the class name.
+
+    dim: int, optional, default: None
+        Number of latent factors of the model, None for models without factors.
+
+    params: keyword arguments
+        Other parameters of the model constructor.
+
+    """
+
+    def __init__(self, model_class, name, family=None, dim=None, **params):
+        self.model_class = model_class
+        self.name = name
+        self.family = model_class.rsplit('.', 1)[-1] if family is None else family
+        self.dim = dim
+        self.params = params
+
+    def build(self, **params):
+        """Return a new, unfitted instance of the model, `params` override the parameters of the spec"""
+        module_name, class_name = self.model_class.rsplit('.', 1)
+        model_cls = getattr(importlib.import_module(module_name), class_name)
+        return model_cls(name=self.name, **dict(self.params, **params))
+
+    def __repr__(self):
+        return 'ModelSpec({}, name={!r})'.format(self.model_class, self.name)
@@ -2,37 +2,67 @@ import numpy as np
 from collections import OrderedDict
 from cornac.experiment.result import _table_format, Result
 
+from experiment.bootstrap import bootstrap_ci
+
 
 NUM_FMT = '{:.4f}'
 
+# protocols evaluated on the whole test set, before the strata
+DEFAULT_PROTOCOLS = ['Closed', 'IPS', 'SNIPS']
+
 
 class STResult(list):
     """
     Stratified Result Class for a single model
+
+    The protocol of each result (Closed, IPS, SNIPS, the label of each
+    stratum, e.g. Q1, Q2, Q4 if Q3 has no test feedback, then Unbiased) is in
+    `protocols`, see `add`. The timers and counters of its evaluation are in
+    `profile` (:obj:`eval_methods.profiling.EvalProfile`), `profile.to_json()`
+    exports them.
     """
 
     def __init__(self, model_name):
         super().__init__()
         self.model_name = model_name
+        self.protocols = None
+        self.profile = None
 
     def __str__(self):
         return '[{}]\n{}'.format(self.model_name, self.table)
 
+    def add(self, protocol, result):
+        """Append the `result` of `protocol` (Closed, IPS, SNIPS or the label of a stratum)"""
+        if self.protocols is None:
+            self.protocols = []
+        self.protocols.append(protocol)
+        self.append(result)
+
+    def protocol_names(self):
+        """Return the protocol of each result.
+
+        Results appended without their protocol (e.g. pickled by a version
+        without `protocols`) are named by position: Closed, IPS, SNIPS, Q1,
+        Q2, ..., and Unbiased for the last one if the result was organized.
+        """
+        # unpickling does not call `__init__`, older results have no `protocols`
+        protocols = getattr(self, 'protocols', None)
+        if protocols is not None and len(protocols) == len(self):
+            return list(protocols)
+
+        organized = hasattr(self, 'table')
+        n_strata = len(self) - len(DEFAULT_PROTOCOLS) - int(organized)
+        names = DEFAULT_PROTOCOLS + ['Q%d' % q for q in range(1, n_strata + 1)]
+        return names + ['Unbiased'] if organized else names
+
     def organize(self):
 
         headers = list(self[0].metric_avg_results.keys())
+        index = self.protocol_names()
 
-        data, index, sizes = [], [], []
-        for f, r in enumerate(self):
+        data, sizes = [], []
+        for r in self:
             data.append([r.metric_avg_results[m] for m in headers])
-            if f == 0:
-                index.append('Closed')
-            elif f == 1:
-                index.append('IPS')
-            elif f == 2:
-                index.append('SNIPS')
-            else:
-                index.append('Q%d' % (f - 2))
             sizes.append(r.metric_avg_results['SIZE'])
 
         # add mean and std rows (total accumulative)
@@ -53,6 +83,7 @@ class STResult(list):
         data = np.vstack([data, unbiased])
         data = [[NUM_FMT.format(v) for v in row] for row in data]
         index.extend(['Unbiased'])
+        self.protocols = list(index)
 
         # add unbiased to the list
         self.append(Result(model_name=self[0].model_name,
@@ -62,3 +93,8 @@ class STResult(list):
 
         self.table = _table_format(
             data, headers, index, h_bars=[1, 2, 4, len(data)])
+
+    def confidence_intervals(self, metrics=None, n_resamples=1000, confidence=0.95, seed=None):
+        """Bootstrap confidence intervals of each protocol, see `experiment.bootstrap.bootstrap_ci`"""
+        return bootstrap_ci([self], metrics=metrics, n_resamples=n_resamples,
+                            confidence=confidence, seed=seed)
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from experiment.result import STResult
+from experiment.user_results import UserResults
+
+
+INDEX_FILE = 'index.json'
+
+
+class ResultStore:
+    """Columnar store of the average results of an experiment.
+
+    Results are indexed by (model, protocol, metric), where the protocol is
+    the evaluation a result comes from (Closed, IPS, SNIPS, Q1, ..., Unbiased
+    for a stratified experiment). Each metric is saved as a (models x protocols)
+    `.npy` file, so a metric is loaded without reading the others, and the
+    names are kept in an index to look values up in O(1).
+
+    Parameters
+    ----------
+    path: str, required
+        Directory of a store written by `ResultStore.save`.
+
+    mmap: bool, optional, default: True
+        Memory-map the metric files instead of reading them in memory.
+
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.models = index['models']
+        self.protocols = index['protocols']
+        self.metrics = index['metrics']
+        self._user_results = index['user_results']
+
+        self._model_idx = {m: idx for idx, m in enumerate(self.models)}
+        self._protocol_idx = {p: idx for idx, p in enumerate(self.protocols)}
+        self._metric_idx = {m: idx for idx, m in enumerate(self.metrics)}
+        self._values = {}
+
+    @staticmethod
+    def _metric_file(path, metric_idx):
+        return os.path.join(path, 'metric_{:03d}.npy'.format(metric_idx))
+
+    @classmethod
+    def save(cls, path, results, protocol='Open'):
+        """Write the results of an experiment to a new store at `path`.
+
+        Parameters
+        ----------
+        path: str, required
+            Directory of the store, replaced if it exists.
+
+        results: list, required
+            Results of an experiment: :obj:`experiment.result.STResult` (one
+            per model) of a stratified experiment, or :obj:`cornac.experiment.result.Result`.
+
+        protocol: str, optional, default: 'Open'
+            Protocol name of the results which are not an `STResult`.
+
+        Returns
+        -------
+        store: :obj:`ResultStore`
+
+        """
+        rows = []
+        for result in results:
+            if isinstance(result, STResult):
+                rows.extend((result.model_name, p, r)
+                            for p, r in zip(result.protocol_names(), result))
+            else:
+                rows.append((result.model_name, protocol, result))
+
+        models, protocols, metrics = {}, {}, {}
+        for model_name, p, r in rows:
+            models.setdefault(model_name, len(models))
+            protocols.setdefault(p, len(protocols))
+            for metric in r.metric_avg_results:
+                metrics.setdefault(metric, len(metrics))
+
+        values = np.full((len(metrics), len(models), len(protocols)), np.nan)
+        user_results = {}
+        for model_name, p, r in rows:
+            m_idx, p_idx = models[model_name], protocols[p]
+            for metric, value in r.metric_avg_results.items():
+                values[metrics[metric], m_idx, p_idx] = value
+            if isinstance(r.metric_user_results, UserResults):
+                user_results['{}\x00{}'.format(model_name, p)] = r.metric_user_results.path
+
+        # write then rename, readers never see a partial store
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        os.makedirs(tmp_path, exist_ok=True)
+        for metric_idx, metric_values in enumerate(values):
+            np.save(cls._metric_file(tmp_path, metric_idx), metric_values)
+        with open(os.path.join(tmp_path, INDEX_FILE), 'w') as f:
+            json.dump({'models': list(models), 'protocols': list(protocols),
+                       'metrics': list(metrics), 'user_results': user_results}, f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+        return cls(path)
+
+    @classmethod
+    def from_pickle(cls, pickle_path, path=None, protocol='Open'):
+        """Convert the pickled results of an experiment (e.g. the published
+        `exp_open_[dataset].pkl` and `exp_stra_[dataset].pkl`) to a store.
+
+        Parameters
+        ----------
+        pickle_path: str, required
+            File of the pickled list of results, see `save`.
+
+        path: str, optional, default: None
+            Directory of the store. If None, `pickle_path` without its extension.
+
+        protocol: str, optional, default: 'Open'
+            Protocol name of the results which are not an `STResult`.
+
+        Returns
+        -------
+        store: :obj:`ResultStore`
+
+        """
+        if path is None:
+            path = os.path.splitext(pickle_path)[0]
+        with open(pickle_path, 'rb') as f:
+            results = pickle.load(f)
+        return cls.save(path, results, protocol=protocol)
+
+    def metric_values(self, metric):
+        """Return the (models x protocols) array of `metric`, loading it on first access"""
+        values = self._values.get(metric)
+        if values is None:
+            values = np.load(self._metric_file(self.path, self._metric_idx[metric]),
+                             mmap_mode='r' if self.mmap else None)
+            self._values[metric] = values
+        return values
+
+    def get(self, model_name, protocol, metric):
+        """Return the average result of `metric` for a model and protocol (NaN if not evaluated)"""
+        return float(self.metric_values(metric)[self._model_idx[model_name],
+                                                self._protocol_idx[protocol]])
+
+    def metric_frame(self, metric):
+        """Return the results of `metric` as a DataFrame of models x protocols"""
+        return pd.DataFrame(np.asarray(self.metric_values(metric)),
+                            index=pd.Index(self.models, name='model'),
+                            columns=pd.Index(self.protocols, name='protocol'))
+
+    def model_frame(self, model_name):
+        """Return the results of a model as a DataFrame of protocols x metrics"""
+        m_idx = self._model_idx[model_name]
+        return pd.DataFrame({metric: np.asarray(self.metric_values(metric)[m_idx])
+                             for metric in self.metrics},
+                            index=pd.Index(self.protocols, name='protocol'))
+
+    def to_frame(self, metrics=None):
+        """Return the results as a DataFrame indexed by (model, protocol), one column per metric"""
+        metrics = self.metrics if metrics is None else metrics
+        index = pd.MultiIndex.from_product([self.models, self.protocols],
+                                           names=['model', 'protocol'])
+        return pd.DataFrame({metric: np.asarray(self.metric_values(metric)).ravel()
+                             for metric in metrics}, index=index)
+
+    def user_results(self, model_name, protocol):
+        """Return the per-user :obj:`experiment.user_results.UserResults`, None if they were not stored"""
+        path = self._user_results.get('{}\x00{}'.format(model_name, protocol))
+        return None if path is None else UserResults(path)
+
+
+if __name__ == '__main__':
+    # from the root of the repository: python -m experiment.result_store data/exp_open_coats.pkl
+    for pickle_path in sys.argv[1:]:
+        print('{} -> {}'.format(pickle_path, ResultStore.from_pickle(pickle_path).path))
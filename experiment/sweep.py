@@ -0,0 +1,215 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cornac.utils import get_rng
+
+from experiment.experiment import STExperiment
+from experiment.model_spec import ModelSpec
+
+
+# constructor parameter of the number of latent factors
+DIM_PARAMS = ('k', 'num_factors')
+
+# `init_params` key of the fitted attributes of the models which can be warm-started
+WARM_START_PARAMS = {
+    'MF': {'U': 'u_factors', 'V': 'i_factors', 'Bu': 'u_biases', 'Bi': 'i_biases'},
+    'SVD': {'U': 'u_factors', 'V': 'i_factors', 'Bu': 'u_biases', 'Bi': 'i_biases'},
+    'PMF': {'U': 'U', 'V': 'V'},
+    'WMF': {'U': 'U', 'V': 'V'},
+    'BPR': {'U': 'u_factors', 'V': 'i_factors', 'Bi': 'i_biases'},
+    'WBPR': {'U': 'u_factors', 'V': 'i_factors', 'Bi': 'i_biases'},
+    'MMMF': {'U': 'u_factors', 'V': 'i_factors', 'Bi': 'i_biases'},
+}
+
+
+def resize_factors(factors, dim, rng, std=0.01):
+    """Return a copy of (n x k) `factors` with `dim` columns.
+
+    The first min(k, `dim`) columns are kept, the new columns are drawn from
+    N(0, `std`), they must not be zero or their gradient would stay zero.
+    """
+    factors = np.asarray(factors)
+    resized = rng.normal(0.0, std, size=(factors.shape[0], dim)).astype(factors.dtype)
+    n_kept = min(factors.shape[1], dim)
+    resized[:, :n_kept] = factors[:, :n_kept]
+    return resized
+
+
+class SweepExperiment(STExperiment):
+    """Experiment over the same models at several numbers of latent factors.
+
+    The models are grouped into chains: the specs of the same class and
+    parameters but the number of factors, ordered by number of factors. The
+    evaluation method is built once (same split, strata and propensities for
+    all the models) and each step of a chain is initialised from the factors
+    of the previous step. The models which do not support `init_params`
+    (see `WARM_START_PARAMS`) and models given as instances are trained from
+    scratch. The time of each step is kept in `timings`.
+
+    The number of iterations of the models (e.g. `max_iter`) is unchanged: a
+    warm start changes the fitted model, but only saves time for models which
+    stop early once they converge (e.g. `early_stop=True` of MF), the others
+    run all their iterations from the initial factors.
+
+    A warm-started model depends on the whole chain before it: its checkpoint
+    key includes the key of the previous step, and if a step has to be
+    evaluated the steps before it are fitted again (without being evaluated)
+    to recover its initial factors.
+
+    Parameters
+    ----------
+    models: list, required
+        Model specs (:obj:`experiment.model_spec.ModelSpec`) with a `dim`,
+        e.g. `utils.get_model_specs(variant='large', dims=range(10, 110, 10))`.
+
+    warm_start: bool, optional, default: True
+        If False, all the models are trained from scratch, the sweep only
+        reports the time of each step.
+
+    warm_start_params: dict, optional, default: None
+        `init_params` key of the fitted attribute of the factors of each
+        model class. If None, `WARM_START_PARAMS`.
+
+    See :obj:`experiment.experiment.STExperiment` for the other parameters,
+    the models of a sweep are evaluated in the current process (`n_jobs` = 1).
+
+    Attributes
+    ----------
+    timings: :obj:`pandas.DataFrame`
+        One row per step with the model name, number of factors, whether
+        it was warm-started, evaluated (or loaded from a checkpoint, or
+        only fitted for the next step) and the time it took in seconds.
+
+    """
+
+    def __init__(
+        self,
+        eval_method,
+        models,
+        metrics,
+        user_based=True,
+        show_validation=True,
+        verbose=False,
+        save_dir=None,
+        checkpoint_dir=None,
+        warm_start=True,
+        warm_start_params=None,
+    ):
+        super().__init__(
+            eval_method=eval_method,
+            models=models,
+            metrics=metrics,
+            user_based=user_based,
+            show_validation=show_validation,
+            verbose=verbose,
+            save_dir=save_dir,
+            n_jobs=1,
+            checkpoint_dir=checkpoint_dir,
+        )
+        self.warm_start = warm_start
+        self.warm_start_params = WARM_START_PARAMS if warm_start_params is None else warm_start_params
+        self.timings = None
+
+    def _chains(self):
+        """Model indices grouped by chain (ordered by number of factors), in order of their first model"""
+        chains = OrderedDict()
+        for model_idx, spec in enumerate(self.models):
+            if not self._warm_startable(model_idx):
+                chains[('model', model_idx)] = [model_idx]
+                continue
+            params = tuple(sorted((name, repr(value)) for name, value in spec.params.items()
+                                  if name not in DIM_PARAMS))
+            chains.setdefault((spec.model_class, params), []).append(model_idx)
+        return [chain if len(chain) == 1 else sorted(chain, key=lambda idx: self.models[idx].dim)
+                for chain in chains.values()]
+
+    def _warm_startable(self, model_idx):
+        spec = self.models[model_idx]
+        return (self.warm_start and isinstance(spec, ModelSpec) and spec.dim is not None and
+                spec.model_class.rsplit('.', 1)[-1] in self.warm_start_params)
+
+    def _model_keys(self, split_key, **params):
+        """Return the checkpoint key of each model, chained to the key of the previous step"""
+        keys = super()._model_keys(split_key, **params)
+        for chain in self._chains():
+            for prev_idx, model_idx in zip(chain[:-1], chain[1:]):
+                keys[model_idx] = self.checkpoints.key(
+                    self.models[model_idx], split_key, warm_start=keys[prev_idx], **params)
+        return keys
+
+    def _init_params(self, model, dim):
+        """`init_params` of the next step of a chain, from the factors of the fitted `model`"""
+        attrs = self.warm_start_params[model.__class__.__name__]
+        rng = get_rng(getattr(model, 'seed', None))
+
+        init_params = {}
+        for key, attr in attrs.items():
+            value = getattr(model, attr, None)
+            if value is None:
+                continue
+            value = np.asarray(value)
+            init_params[key] = resize_factors(value, dim, rng) if value.ndim == 2 else value.copy()
+        return init_params
+
+    def _run_chain(self, chain, completed, results):
+        """Evaluate the steps of a chain which do not have a checkpoint, and fit the steps before them"""
+        pending = [pos for pos, model_idx in enumerate(chain) if model_idx not in completed]
+        if len(pending) == 0:
+            return []
+
+        timings = []
+        init_params = None
+        for pos, model_idx in enumerate(chain[:pending[-1] + 1]):
+            warm_started = init_params is not None
+            evaluated = model_idx not in completed
+
+            start = time.time()
+            if warm_started:
+                model = self._model(model_idx, init_params=init_params)
+            else:
+                model = self._model(model_idx)
+
+            if evaluated:
+                results[model_idx] = self._evaluate(model, self._checkpoint_keys[model_idx])
+            else:
+                # only fitted to initialise the next step
+                model.fit(self.eval_method.train_set, self.eval_method.val_set)
+
+            init_params = None
+            if pos + 1 < len(chain) and self._warm_startable(chain[pos + 1]):
+                init_params = self._init_params(model, self.models[chain[pos + 1]].dim)
+            del model
+
+            step_time = time.time() - start
+            timings.append((model_idx, warm_started, 'evaluated' if evaluated else 'fitted', step_time))
+            if self.verbose:
+                print("\n[{}] Step done in {:.2f}s ({})".format(
+                    self.models[model_idx].name, step_time, 'warm start' if warm_started else 'cold start'))
+
+        return timings
+
+    def _run_models(self):
+        """Yield the results of each model in order, running the chains one after the other"""
+        completed = self._load_checkpoints()
+
+        results = {}
+        timings = []
+        for chain in self._chains():
+            timings.extend(self._run_chain(chain, completed, results))
+
+        steps = {model_idx: (warm_started, status, step_time)
+                 for model_idx, warm_started, status, step_time in timings}
+        rows = []
+        for model_idx, model in enumerate(self.models):
+            warm_started, status, step_time = steps.get(model_idx, (False, 'checkpoint', 0.0))
+            rows.append((model.name, getattr(model, 'dim', None), warm_started, status, step_time))
+        self.timings = pd.DataFrame(rows, columns=['model', 'dim', 'warm_start', 'status', 'time'])
+
+        for model_idx in range(len(self.models)):
+            if model_idx in completed:
+                yield completed.pop(model_idx)
+            else:
+                yield results.pop(model_idx)
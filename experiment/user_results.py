@@ -0,0 +1,215 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+META_FILE = 'meta.json'
+
+
+class UserResultWriter:
+    """Stream the per-user scores of a group of metrics to chunked column files.
+
+    Scores are buffered and written every `chunk_size` users as two `.npy`
+    files: the user indices and a Fortran-ordered (users x metrics) array,
+    so that each metric is a contiguous column. The metadata file is written
+    on `close`, a directory without it is an incomplete run.
+
+    Parameters
+    ----------
+    path: str, required
+        Directory of the group, replaced if it exists.
+
+    columns: list of str, required
+        Names of the metrics, in the order of the values appended.
+
+    chunk_size: int, optional, default: 65536
+        Number of users per chunk.
+
+    """
+
+    def __init__(self, path, columns, chunk_size=65536):
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.n_users = 0
+        self.n_chunks = 0
+        self._users = []
+        self._values = []
+        self._buffered = 0
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+    def append(self, user_idx, values):
+        """Add the scores of a single user, in the order of `columns`"""
+        self._users.append(np.asarray([user_idx], dtype=np.int64))
+        self._values.append(np.asarray(values, dtype=np.float64).reshape(1, -1))
+        self._buffered += 1
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def extend(self, user_indices, values):
+        """Add the scores of a block of users, `values` is a (users x metrics) array"""
+        self._users.append(np.asarray(user_indices, dtype=np.int64))
+        self._values.append(np.asarray(values, dtype=np.float64).reshape(-1, len(self.columns)))
+        self._buffered += len(user_indices)
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def extend_dicts(self, user_results):
+        """Add per-user results given as one {user_idx: score} dict per metric"""
+        if len(user_results) == 0:
+            return
+        user_indices = list(user_results[0].keys())
+        values = np.array([[res[user_idx] for res in user_results] for user_idx in user_indices],
+                          dtype=np.float64)
+        self.extend(user_indices, values)
+
+    def flush(self):
+        """Write the buffered users as a new chunk"""
+        if self._buffered == 0:
+            return
+        users = np.concatenate(self._users)
+        values = np.asfortranarray(np.vstack(self._values))
+        np.save(os.path.join(self.path, 'users_{:05d}.npy'.format(self.n_chunks)), users)
+        np.save(os.path.join(self.path, 'scores_{:05d}.npy'.format(self.n_chunks)), values)
+        self.n_chunks += 1
+        self.n_users += len(users)
+        self._users, self._values, self._buffered = [], [], 0
+
+    def close(self):
+        """Flush the remaining users and write the metadata"""
+        self.flush()
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump({'columns': self.columns, 'n_chunks': self.n_chunks,
+                       'n_users': self.n_users}, f)
+
+
+class UserResults(Mapping):
+    """Lazy, read-only view of the per-user results of one evaluation.
+
+    It maps each metric name to a {user_idx: score} dict, as the
+    `metric_user_results` of :obj:`cornac.experiment.result.Result`, but the
+    scores are only read (memory-mapped) from disk when a metric is accessed.
+    Pickling a view only stores its path.
+
+    Parameters
+    ----------
+    path: str, required
+        Directory holding one sub-directory per group of metrics,
+        as written by :obj:`UserResultWriter`.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._groups = None
+
+    def __getstate__(self):
+        return {'path': self.path, '_groups': None}
+
+    @property
+    def groups(self):
+        """OrderedDict of the metadata of each group of metrics"""
+        if self._groups is None:
+            self._groups = OrderedDict()
+            for group in sorted(os.listdir(self.path)):
+                meta_path = os.path.join(self.path, group, META_FILE)
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        self._groups[group] = json.load(f)
+        return self._groups
+
+    def _locate(self, metric):
+        for group, meta in self.groups.items():
+            if metric in meta['columns']:
+                return group, meta
+        raise KeyError(metric)
+
+    def __iter__(self):
+        for meta in self.groups.values():
+            for metric in meta['columns']:
+                yield metric
+
+    def __len__(self):
+        return sum(len(meta['columns']) for meta in self.groups.values())
+
+    def __contains__(self, metric):
+        return any(metric in meta['columns'] for meta in self.groups.values())
+
+    def column(self, metric, mmap=True):
+        """Return the user indices and the scores of `metric` as two arrays"""
+        group, meta = self._locate(metric)
+        col = meta['columns'].index(metric)
+        mmap_mode = 'r' if mmap else None
+
+        users, scores = [], []
+        for chunk in range(meta['n_chunks']):
+            chunk_path = os.path.join(self.path, group, '{}_{:05d}.npy')
+            users.append(np.load(chunk_path.format('users', chunk), mmap_mode=mmap_mode))
+            scores.append(np.load(chunk_path.format('scores', chunk), mmap_mode=mmap_mode)[:, col])
+
+        if len(users) == 1:
+            return users[0], scores[0]
+        if len(users) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(users), np.concatenate(scores)
+
+    def __getitem__(self, metric):
+        users, scores = self.column(metric)
+        return OrderedDict(zip(users.tolist(), scores.tolist()))
+
+    def to_frame(self):
+        """Return the results as a DataFrame indexed by user, with one column per metric"""
+        frames = []
+        for meta in self.groups.values():
+            columns = OrderedDict()
+            users = None
+            for metric in meta['columns']:
+                users, columns[metric] = self.column(metric, mmap=False)
+            frames.append(pd.DataFrame(columns, index=pd.Index(users, name='user_idx')))
+        if len(frames) == 0:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+class UserResultSink:
+    """On-disk store of the per-user results of a set of evaluations.
+
+    Results are stored under `<root_dir>/<model_name>/<protocol>/<group>`,
+    where the protocol is the evaluation (Closed, IPS, SNIPS, Q1, ...) and
+    the group separates rating from ranking metrics.
+
+    Parameters
+    ----------
+    root_dir: str, required
+        Root directory of the store. It is made absolute, so that the
+        pickled result views can be opened from another working directory.
+
+    chunk_size: int, optional, default: 65536
+        Number of users per chunk, see :obj:`UserResultWriter`.
+
+    """
+
+    def __init__(self, root_dir, chunk_size=65536):
+        self.root_dir = os.path.abspath(root_dir)
+        self.chunk_size = chunk_size
+
+    def _path(self, model_name, protocol):
+        return os.path.join(self.root_dir, model_name.replace(os.sep, '_'), protocol)
+
+    def writer(self, model_name, protocol, group, columns):
+        """Return a :obj:`UserResultWriter` for a group of metrics of an evaluation"""
+        return UserResultWriter(os.path.join(self._path(model_name, protocol), group),
+                                columns, chunk_size=self.chunk_size)
+
+    def results(self, model_name, protocol):
+        """Return the :obj:`UserResults` view of an evaluation"""
+        return UserResults(self._path(model_name, protocol))
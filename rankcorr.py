@@ -0,0 +1,245 @@
+import numpy as np
+
+from collections import OrderedDict
+
+from scipy.stats import rankdata
+
+from experiment.result import STResult
+
+
+def score_tensor(results, metrics=None, open_protocol='Open'):
+    """Gather the results of several models into a (models x protocols x metrics) tensor.
+
+    Parameters
+    ----------
+    results: list, required
+        Results of the models: :obj:`experiment.result.STResult` of a stratified
+        experiment and/or :obj:`cornac.experiment.result.Result` (e.g. open-loop
+        results), matched by model name.
+
+    metrics: list of str, optional, default: None
+        Metrics of the tensor. If None, all the metrics of the results except SIZE.
+
+    open_protocol: str, optional, default: 'Open'
+        Protocol name of the results which are not an `STResult`.
+
+    Returns
+    -------
+    res: (Numpy array, list, list, list)
+        The tensor (NaN where a model has no result) and the names of
+        the models, protocols and metrics along its axes.
+
+    """
+    rows = []
+    for result in results:
+        if isinstance(result, STResult):
+            rows.extend((result.model_name, p, r.metric_avg_results)
+                        for p, r in zip(result.protocol_names(), result))
+        else:
+            rows.append((result.model_name, open_protocol, result.metric_avg_results))
+
+    models, protocols = OrderedDict(), OrderedDict()
+    found_metrics = OrderedDict()
+    for model_name, p, avg_results in rows:
+        models.setdefault(model_name, len(models))
+        protocols.setdefault(p, len(protocols))
+        for metric in avg_results:
+            if metric != 'SIZE':
+                found_metrics.setdefault(metric, len(found_metrics))
+    metrics = list(found_metrics) if metrics is None else list(metrics)
+
+    tensor = np.full((len(models), len(protocols), len(metrics)), np.nan)
+    for model_name, p, avg_results in rows:
+        for k, metric in enumerate(metrics):
+            if metric in avg_results:
+                tensor[models[model_name], protocols[p], k] = avg_results[metric]
+
+    return tensor, list(models), list(protocols), metrics
+
+
+def store_tensor(stores, metrics=None):
+    """Gather the results of :obj:`experiment.result_store.ResultStore` into a score tensor.
+
+    Parameters
+    ----------
+    stores: list of :obj:`experiment.result_store.ResultStore`, required
+        Stores of the same models (e.g. the open-loop and the stratified results).
+
+    metrics: list of str, optional, default: None
+        Metrics of the tensor. If None, the metrics of the first store.
+
+    Returns
+    -------
+    res: (Numpy array, list, list, list)
+        See `score_tensor`.
+
+    """
+    metrics = list(stores[0].metrics) if metrics is None else list(metrics)
+    models = list(OrderedDict.fromkeys(m for store in stores for m in store.models))
+    protocols = [p for store in stores for p in store.protocols]
+
+    tensor = np.full((len(models), len(protocols), len(metrics)), np.nan)
+    start = 0
+    for store in stores:
+        model_idx = [models.index(m) for m in store.models]
+        for k, metric in enumerate(metrics):
+            if metric in store.metrics:
+                tensor[model_idx, start:start + len(store.protocols), k] = \
+                    store.metric_values(metric)
+        start += len(store.protocols)
+
+    return tensor, models, protocols, metrics
+
+
+def _tied_pairs(sorted_x, *sorted_others):
+    """Number of pairs tied in all the given row-sorted arrays (batched over the leading axes)"""
+    n = sorted_x.shape[-1]
+    equal = sorted_x[..., 1:] == sorted_x[..., :-1]
+    for other in sorted_others:
+        equal &= other[..., 1:] == other[..., :-1]
+
+    # an element tied with the previous one is paired with all the previous elements of its run
+    idx = np.broadcast_to(np.arange(1, n), equal.shape)
+    run_start = np.maximum.accumulate(np.where(equal, 0, idx), axis=-1)
+    return np.where(equal, idx - run_start, 0).sum(axis=-1)
+
+
+def _count_inversions(y):
+    """Number of pairs i < j with y[..., i] > y[..., j], by a bottom-up merge sort of each row.
+
+    Each level merges the sorted runs of the previous one with a stable sort
+    (a linear merge of two runs), and counts for every element of a right run
+    the elements of its left run greater than it, so a row of n elements takes
+    O(n log n) operations. The first levels are replaced by a comparison of
+    all the pairs of blocks of 16 elements.
+    """
+    batch_shape, n = y.shape[:-1], y.shape[-1]
+    y = y.reshape(-1, n)
+    n_padded = 1 << max(int(np.ceil(np.log2(max(n, 1)))), 0)
+
+    # inversions only depend on the order, small integer ranks are radix sorted
+    dtype = np.int16 if n < np.iinfo(np.int16).max else np.int64
+    ranks = rankdata(y, method='dense', axis=-1).astype(dtype) if n > 0 else y.astype(dtype)
+
+    # pad with values greater than all the others, they add no inversion
+    values = np.full((len(y), n_padded), np.iinfo(dtype).max, dtype=dtype)
+    values[:, :n] = ranks
+
+    # inversions within small blocks are counted by comparing all their pairs
+    width = min(16, n_padded)
+    blocks = values.reshape(len(y), -1, width)
+    i, j = np.triu_indices(width, k=1)
+    inversions = (blocks[..., i] > blocks[..., j]).sum(axis=(1, 2), dtype=np.int64)
+    values = np.sort(blocks, axis=-1, kind='stable').reshape(len(y), n_padded)
+
+    while width < n_padded:
+        blocks = values.reshape(len(y), -1, 2 * width)
+        order = np.argsort(blocks, axis=-1, kind='stable')
+
+        # left elements merged before each right one (ties keep the left elements first)
+        from_left = order < width
+        n_left_le = np.cumsum(from_left, axis=-1, dtype=np.int32)
+        inversions += np.where(from_left, 0, width - n_left_le).sum(axis=(1, 2))
+
+        values = np.take_along_axis(blocks, order, axis=-1).reshape(len(y), n_padded)
+        width *= 2
+
+    return inversions.reshape(batch_shape)
+
+
+def kendall_components(x, y):
+    """Pair counts of the Kendall tau-b between rows of `x` and `y`, in O(n log n) per row.
+
+    Parameters
+    ----------
+    x, y: Numpy array, required
+        Arrays of the same shape (..., n), the tau of each pair of rows is computed.
+
+    Returns
+    -------
+    res: (Numpy array, Numpy array, Numpy array, Numpy array, Numpy array)
+        Number of pairs, pairs tied in `x`, tied in `y`, tied in both, and discordant pairs.
+
+    """
+    n = x.shape[-1]
+    n_pairs = n * (n - 1) // 2
+
+    # sort by x then y (Knight's algorithm): discordant pairs are the inversions of y
+    order = np.lexsort((y, x), axis=-1)
+    x_sorted = np.take_along_axis(x, order, axis=-1)
+    y_by_x = np.take_along_axis(y, order, axis=-1)
+
+    x_ties = _tied_pairs(x_sorted)
+    xy_ties = _tied_pairs(x_sorted, y_by_x)
+    y_ties = _tied_pairs(np.sort(y, axis=-1))
+    discordant = _count_inversions(y_by_x)
+    return n_pairs, x_ties, y_ties, xy_ties, discordant
+
+
+def kendall_matrix(rankings):
+    """Kendall tau-b between every pair of rows of `rankings`, see `kendall_components`.
+
+    Parameters
+    ----------
+    rankings: Numpy array, required
+        (..., k, n) array of k rankings of n elements.
+
+    Returns
+    -------
+    res: (Numpy array, Numpy array)
+        (..., k, k) arrays of the tau-b (NaN for a constant ranking) and of the
+        fraction of pairs of elements ordered the same way, or tied, by both rankings.
+
+    """
+    rankings = np.asarray(rankings, dtype=np.float64)
+    k = rankings.shape[-2]
+    a, b = np.triu_indices(k)
+    n_pairs, x_ties, y_ties, xy_ties, discordant = kendall_components(
+        rankings[..., a, :], rankings[..., b, :])
+
+    concordant = n_pairs - x_ties - y_ties + xy_ties - discordant
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tau = (concordant - discordant) / np.sqrt((n_pairs - x_ties) * (n_pairs - y_ties))
+        agreement = (concordant + xy_ties) / n_pairs
+
+    kendall = np.empty(rankings.shape[:-2] + (k, k))
+    kendall[..., a, b] = kendall[..., b, a] = tau
+    agree = np.empty(rankings.shape[:-2] + (k, k))
+    agree[..., a, b] = agree[..., b, a] = agreement
+    return kendall, agree
+
+
+def rank_correlations(tensor):
+    """Rank correlations between the model rankings of every pair of protocols, for every metric.
+
+    Parameters
+    ----------
+    tensor: Numpy array, required
+        (models x protocols x metrics) scores, see `score_tensor`. Models with a
+        missing (NaN) score are left out.
+
+    Returns
+    -------
+    res: dict
+        (metrics x protocols x protocols) arrays of the Kendall tau-b ('kendall'), the
+        Spearman rho ('spearman') and the fraction of pairs of models ordered the same
+        way, or tied, by both protocols ('agreement'), and the number of models ('n_models').
+
+    """
+    tensor = np.asarray(tensor, dtype=np.float64)
+    tensor = tensor[~np.isnan(tensor).any(axis=(1, 2))]
+    n_models = tensor.shape[0]
+
+    # (metrics x protocols x models) rankings
+    scores = tensor.transpose(2, 1, 0)
+    kendall, agree = kendall_matrix(scores)
+
+    # Spearman rho is the Pearson correlation of the ranks
+    ranks = rankdata(scores, axis=-1)
+    ranks -= ranks.mean(axis=-1, keepdims=True)
+    prods = np.matmul(ranks, ranks.transpose(0, 2, 1))
+    norms = np.sqrt(np.diagonal(prods, axis1=-2, axis2=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spearman = prods / (norms[..., :, None] * norms[..., None, :])
+
+    return {'kendall': kendall, 'spearman': spearman, 'agreement': agree, 'n_models': n_models}
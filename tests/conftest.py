@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the packages of the repository are imported from its root, as the train scripts do,
+# the helpers of the tests from this directory
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(TESTS_DIR), TESTS_DIR]
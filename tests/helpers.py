@@ -0,0 +1,29 @@
+from cornac.models import Recommender
+from cornac.utils import get_rng
+
+
+class RandomFactors(Recommender):
+    """Deterministic model scoring items by the dot product of random factors"""
+
+    def __init__(self, name='RandomFactors', k=8, seed=None, init_params=None):
+        Recommender.__init__(self, name=name)
+        self.k = k
+        self.seed = seed
+        self.init_params = {} if init_params is None else init_params
+
+    def fit(self, train_set, val_set=None):
+        Recommender.fit(self, train_set, val_set)
+        rng = get_rng(self.seed)
+        self.u_factors = rng.normal(size=(train_set.total_users, self.k))
+        self.i_factors = rng.normal(size=(train_set.num_items, self.k))
+        # warm start: the given factors are kept, as an iterative model would start from them
+        if 'U' in self.init_params:
+            self.u_factors = self.init_params['U']
+        if 'V' in self.init_params:
+            self.i_factors = self.init_params['V']
+        return self
+
+    def score(self, user_idx, item_idx=None):
+        if item_idx is None:
+            return self.i_factors.dot(self.u_factors[user_idx])
+        return self.i_factors[item_idx].dot(self.u_factors[user_idx])
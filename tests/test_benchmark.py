@@ -0,0 +1,48 @@
+import os
+import json
+import importlib.util
+
+import pytest
+
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'benchmarks', 'stratified.py')
+
+
+@pytest.fixture(scope='module')
+def benchmark():
+    spec = importlib.util.spec_from_file_location('benchmark_stratified', BENCHMARK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(benchmark, output, *args):
+    benchmark.main(['--users', '100', '--items', '50', '--interactions', '1500',
+                    '--n-strata', '2', '--estimator', 'popularity', '--metrics', 'small',
+                    '--k', '4', '--repeat', '1', '--output', output] + list(args))
+    with open(output) as f:
+        return json.load(f)
+
+
+def test_benchmark_report(benchmark, tmpdir):
+    report = run(benchmark, str(tmpdir.join('bench.json')))
+
+    assert list(report) == ['benchmark', 'created', 'revision', 'environment', 'config',
+                            'data', 'timings', 'counters', 'profile']
+    assert report['benchmark'] == 'stratified'
+    assert report['config']['users'] == 100 and report['config']['repeat'] == 1
+    assert report['data']['users'] <= 100 and report['data']['interactions'] > 0
+    for phase in ('propensity', 'split', 'evaluate', 'fit', 'organize', 'ranking_eval:Closed'):
+        assert sorted(report['timings'][phase]) == ['median', 'min', 'runs'], phase
+        assert len(report['timings'][phase]['runs']) == 1
+    assert report['counters']['users'] > 0
+    assert report['profile']['model'] == 'RandomFactors'
+
+
+def test_benchmark_compare(benchmark, tmpdir, capsys):
+    previous = str(tmpdir.join('previous.json'))
+    run(benchmark, previous)
+    run(benchmark, str(tmpdir.join('current.json')), '--compare', previous)
+
+    assert 'Median times of' in capsys.readouterr().out
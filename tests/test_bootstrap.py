@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from cornac.experiment.result import Result
+from cornac.utils import get_rng
+
+from experiment.bootstrap import bootstrap_ci, bootstrap_means, resample_indices
+from experiment.result import STResult
+
+
+def naive_means(values, mask, indices):
+    """Mean of each column on each resample, one resample and column at a time"""
+    means = np.full((len(indices), values.shape[1]), np.nan)
+    for r, resample in enumerate(indices):
+        for col in range(values.shape[1]):
+            present = mask[resample, col] > 0
+            if present.any():
+                means[r, col] = values[resample, col][present].mean()
+    return means
+
+
+def test_bootstrap_means_match_a_resampling_loop():
+    rng = np.random.RandomState(0)
+    values = rng.uniform(size=(30, 6))
+    mask = (rng.uniform(size=(30, 6)) > 0.3).astype(np.float64)
+    mask[:, 0] = 1.0
+    indices = resample_indices(30, 50, rng)
+
+    np.testing.assert_allclose(bootstrap_means(values, mask, indices, block_size=16),
+                               naive_means(values, mask, indices), rtol=1e-12)
+
+
+def st_result(model_name, user_scores, sizes):
+    """Organized result of per-user NDCG scores {protocol: {user: score}}"""
+    result = STResult(model_name)
+    for protocol, scores in user_scores.items():
+        result.add(protocol, Result(model_name=model_name,
+                                    metric_avg_results=OrderedDict(
+                                        [('NDCG', np.mean(list(scores.values()))),
+                                         ('SIZE', sizes[protocol])]),
+                                    metric_user_results={'NDCG': scores}))
+    result.organize()
+    return result
+
+
+def test_bootstrap_ci_matches_a_resampling_loop():
+    rng = np.random.RandomState(1)
+    all_users = np.arange(40)
+    strata_users = {'Q1': all_users[:25], 'Q2': all_users[15:]}
+    sizes = {'Closed': 100, 'IPS': 100, 'SNIPS': 100, 'Q1': 60, 'Q2': 40}
+
+    results = []
+    for m in range(2):
+        user_scores = OrderedDict()
+        for protocol in ('Closed', 'IPS', 'SNIPS', 'Q1', 'Q2'):
+            users = strata_users.get(protocol, all_users)
+            user_scores[protocol] = dict(zip(users.tolist(), rng.uniform(size=len(users)).tolist()))
+        results.append(st_result('M%d' % m, user_scores, sizes))
+
+    n_resamples, confidence = 200, 0.9
+    ci = bootstrap_ci(results, n_resamples=n_resamples, confidence=confidence, seed=42)
+
+    # the same draws: one resample matrix per set of users, in order of first protocol
+    seed_rng = get_rng(42)
+    draws = OrderedDict()
+    for protocol in ('Closed', 'Q1', 'Q2'):
+        n_users = len(strata_users.get(protocol, all_users))
+        draws[protocol] = seed_rng.randint(n_users, size=(n_resamples, n_users))
+
+    replicates = {}
+    for result in results:
+        for protocol, res in zip(result.protocols, result):
+            if res.metric_user_results is None:
+                continue
+            scores = res.metric_user_results['NDCG']
+            users = sorted(scores)
+            indices = draws[protocol if protocol.startswith('Q') else 'Closed']
+            reps = np.array([np.mean([scores[users[i]] for i in resample]) for resample in indices])
+            replicates[result.model_name, protocol] = reps
+        replicates[result.model_name, 'Unbiased'] = sum(
+            sizes[q] / sizes['Closed'] * replicates[result.model_name, q] for q in ('Q1', 'Q2'))
+
+    for (model_name, protocol), reps in replicates.items():
+        row = ci.loc[(model_name, protocol, 'NDCG')]
+        lower, upper = np.percentile(reps, [5, 95])
+        np.testing.assert_allclose([row['std'], row['lower'], row['upper']],
+                                   [reps.std(), lower, upper], rtol=1e-10)
+
+    # estimates on all the users, Unbiased as in `STResult.organize`
+    for result in results:
+        for protocol, res in zip(result.protocols, result):
+            np.testing.assert_allclose(ci.loc[(result.model_name, protocol, 'NDCG'), 'mean'],
+                                       res.metric_avg_results['NDCG'], rtol=1e-12)
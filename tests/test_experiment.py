@@ -0,0 +1,67 @@
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.checkpoint import CheckpointStore
+from experiment.experiment import STExperiment
+from experiment.model_spec import ModelSpec
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+def test_models_are_validated_without_importing_them():
+    model = RandomFactors()
+    spec = ModelSpec('helpers.RandomFactors', 'Spec')
+
+    assert STExperiment._validate_models([model, spec, 'MF', None]) == [model, spec]
+
+
+def run_experiment(tmpdir, models):
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=3000, seed=2)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=2,
+                                       propensity_estimator='popularity')
+    experiment = STExperiment(eval_method, models, get_metrics('small'), show_validation=False,
+                              save_dir=str(tmpdir), checkpoint_dir=str(tmpdir.join('checkpoints')))
+    experiment.run()
+    return experiment
+
+
+def test_checkpoints_are_loaded_instead_of_evaluating_again(tmpdir, monkeypatch):
+    specs = [ModelSpec('helpers.RandomFactors', 'RF%d' % seed, seed=seed) for seed in (1, 2)]
+    first = run_experiment(tmpdir, specs)
+
+    def evaluate(self, model, checkpoint_key=None):
+        raise AssertionError('{} was evaluated again'.format(model.name))
+
+    monkeypatch.setattr(STExperiment, '_evaluate', evaluate)
+    second = run_experiment(tmpdir, specs)
+
+    assert len(second.result) == len(specs)
+    for loaded, result in zip(second.result, first.result):
+        assert loaded.model_name == result.model_name
+        assert loaded.protocols == result.protocols
+        assert [r.metric_avg_results for r in loaded] == [r.metric_avg_results for r in result]
+
+
+def test_checkpoint_store_round_trip(tmpdir):
+    store = CheckpointStore(str(tmpdir))
+    key = store.key(RandomFactors(seed=1), 'split', metrics=['NDCG@10'])
+
+    assert key != store.key(RandomFactors(seed=2), 'split', metrics=['NDCG@10'])
+    assert store.load('RF/1', key) is None
+    store.save('RF/1', key, ({'NDCG@10': 0.5}, None))
+    assert store.load('RF/1', key) == ({'NDCG@10': 0.5}, None)
+
+
+def test_specs_are_keyed_without_building_their_model(tmpdir, monkeypatch):
+    specs = [ModelSpec('helpers.RandomFactors', 'RF%d' % seed, seed=seed) for seed in (1, 2)]
+    run_experiment(tmpdir, specs)
+
+    def build(self, **params):
+        raise AssertionError('{} was built'.format(self.name))
+
+    monkeypatch.setattr(ModelSpec, 'build', build)
+    second = run_experiment(tmpdir, specs)
+    assert [result.model_name for result in second.result] == ['RF1', 'RF2']
+
+    other = ModelSpec('helpers.RandomFactors', 'RF1', seed=3)
+    assert CheckpointStore.key(other, 'split') != CheckpointStore.key(specs[0], 'split')
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+from datasets import feedback_cache
+from datasets.feedback_cache import load_cached_feedback
+
+
+def write_feedback(path, rows):
+    with open(path, 'w') as f:
+        for user, item, rating in rows:
+            f.write('{}\t{}\t{}\n'.format(user, item, rating))
+
+
+def test_sources_sharing_a_cache_dir(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.mkdir('cache'))
+    other_file = os.path.join(cache_dir, 'notes.txt')
+    with open(other_file, 'w') as f:
+        f.write('not a cache file')
+
+    train_path, test_path = str(tmpdir.join('train.csv')), str(tmpdir.join('test.csv'))
+    write_feedback(train_path, [('u1', 'i1', 5), ('u2', 'i1', 3), ('u2', 'i2', 1)])
+    write_feedback(test_path, [('u3', 'i3', 4)])
+
+    parsed = []
+    parse_feedback = feedback_cache.parse_feedback
+    monkeypatch.setattr(feedback_cache, 'parse_feedback',
+                        lambda fpath, **kwargs: parsed.append(fpath) or parse_feedback(fpath, **kwargs))
+
+    for _ in range(2):
+        train = load_cached_feedback(train_path, cache_dir=cache_dir)
+        test = load_cached_feedback(test_path, cache_dir=cache_dir)
+
+    # each source is parsed once and keeps its own cache
+    assert parsed == [train_path, test_path]
+    assert list(train.user_ids) == ['u1', 'u2'] and list(test.user_ids) == ['u3']
+    np.testing.assert_array_equal(train.ratings, [5, 3, 1])
+    assert os.path.exists(other_file)
+
+
+def test_stale_cache_only_removes_its_files(tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    write_feedback(path, [('u1', 'i1', 5)])
+    load_cached_feedback(path)
+
+    cache_dir = path + '.cols'
+    other_file = os.path.join(cache_dir, 'notes.txt')
+    with open(other_file, 'w') as f:
+        f.write('not a cache file')
+
+    write_feedback(path, [('u1', 'i1', 5), ('u2', 'i2', 2)])
+    os.utime(path, ns=(0, 0))
+    data = load_cached_feedback(path)
+
+    assert len(data) == 2
+    assert os.path.exists(other_file)
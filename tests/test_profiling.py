@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+
+from datasets import synthetic
+from eval_methods.batch_ranking import positive_matrix
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+DATA = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=4000, seed=13)
+
+
+def evaluate(**kwargs):
+    eval_method = StratifiedEvaluation(data=DATA, n_strata=2, rating_threshold=3.0, seed=13,
+                                       val_size=0.1, propensity_estimator='popularity',
+                                       profile=True, **kwargs)
+    result, _ = eval_method.evaluate(RandomFactors(seed=13), get_metrics('small'),
+                                     user_based=True, show_validation=True)
+    return eval_method, result.profile
+
+
+def users_with_positives(dataset, rating_threshold):
+    pos_mat = positive_matrix(dataset.csr_matrix, rating_threshold)
+    return int(np.sum(np.diff(pos_mat.indptr) > 0))
+
+
+@pytest.mark.parametrize('batch_size', [None, 64])
+def test_section_counters_match_the_evaluated_users(batch_size):
+    eval_method, profile = evaluate(batch_size=batch_size)
+
+    num_items = eval_method.train_set.num_items
+    datasets = [('Closed', eval_method.test_set), ('IPS', eval_method.test_set),
+                ('Validation', eval_method.val_set)]
+    datasets += list(eval_method.stratified_sets.items())
+    for section, dataset in datasets:
+        counters = profile.sections[section].counters
+        n_users = users_with_positives(dataset, eval_method.rating_threshold)
+        assert counters['users'] == n_users, section
+        assert counters['items_scored'] == n_users * num_items, section
+        assert profile.sections[section].calls['metrics'] >= 1
+
+    assert profile.total().counters['users'] == sum(
+        stats.counters.get('users', 0) for stats in profile.sections.values())
+
+
+def test_profile_json_round_trip(tmpdir):
+    _, profile = evaluate()
+    path = str(tmpdir.join('profile.json'))
+
+    output = profile.to_json(path)
+    with open(path) as f:
+        loaded = json.load(f)
+
+    assert loaded == json.loads(output) == profile.to_dict()
+    assert loaded['model'] == 'RandomFactors'
+    assert list(loaded['sections']) == list(profile.sections)
+    assert sorted(loaded['sections']['Closed']) == ['calls', 'counters', 'times']
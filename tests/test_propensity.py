@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from datasets import synthetic
+from eval_methods.propensity import PopularityEstimator
+from eval_methods.propensity import PowerlawEstimator
+from eval_methods.propensity import PowerlawMLEEstimator
+from eval_methods.propensity import get_propensity_estimator
+from eval_methods.propensity import power_propensities
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+
+
+def sample_frequencies(alpha, xmin, n_tail=50000, n_body=20000, seed=0):
+    """Item frequencies with a discrete power-law tail above `xmin`, and a body below it"""
+    rng = np.random.RandomState(seed)
+    # P(x >= v) = ((v - 1/2) / (xmin - 1/2)) ** (1 - alpha), the tail the estimator fits
+    u = rng.uniform(size=n_tail)
+    tail = np.floor((xmin - 0.5) * (1 - u) ** (-1.0 / (alpha - 1)) + 0.5).astype(np.int64)
+    return rng.permutation(np.concatenate([np.full(n_body, xmin - 1), tail]))
+
+
+def test_mle_recovers_alpha_and_xmin():
+    item_freqs = sample_frequencies(alpha=2.5, xmin=10)
+
+    estimator = PowerlawMLEEstimator()
+    props = estimator.estimate(item_freqs)
+
+    assert estimator.alpha == pytest.approx(2.5, abs=0.03)
+    # above the true xmin the tail is a power law as well, the search may stop a little later
+    assert 10 <= estimator.xmin <= 15
+    assert estimator.fit_time >= 0
+    np.testing.assert_array_equal(props, power_propensities(item_freqs, estimator.alpha, estimator.xmin))
+
+    fixed = PowerlawMLEEstimator(xmin=10)
+    fixed.estimate(item_freqs)
+    assert fixed.xmin == 10
+    assert fixed.alpha == pytest.approx(2.5, abs=0.03)
+
+    coarse = PowerlawMLEEstimator(n_candidates=30)
+    coarse.estimate(item_freqs)
+    assert coarse.alpha == pytest.approx(2.5, abs=0.05)
+
+
+def test_power_propensities_match_the_original_formula():
+    item_freqs = np.random.RandomState(1).zipf(2.0, size=500)
+    alpha, xmin = 2.3, 4.0
+
+    # as the propensities were computed item by item before the estimators
+    expected = [pow(v, alpha) if v > xmin else v for v in item_freqs.tolist()]
+    np.testing.assert_array_equal(power_propensities(item_freqs, alpha, xmin), expected)
+
+
+def test_popularity_estimator():
+    props = PopularityEstimator(power=0.5).estimate(np.array([4, 1, 16, 0]))
+    np.testing.assert_allclose(props, [0.5, 0.25, 1.0, 0.0])
+
+
+def test_estimators_are_resolved_by_name():
+    assert isinstance(get_propensity_estimator(None), PowerlawEstimator)
+    assert isinstance(get_propensity_estimator('powerlaw_mle'), PowerlawMLEEstimator)
+    estimator = PopularityEstimator(power=2.0)
+    assert get_propensity_estimator(estimator) is estimator
+
+    with pytest.raises(ValueError, match='Unknown propensity estimator'):
+        get_propensity_estimator('zipf')
+    with pytest.raises(ValueError):
+        PowerlawMLEEstimator(n_candidates=0)
+    with pytest.raises(ValueError):
+        PowerlawMLEEstimator(xmin=10 ** 6).estimate(np.array([1, 2, 3]))
+
+
+def build(cache_dir, estimator):
+    data = synthetic.load_feedback(n_users=200, n_items=300, n_interactions=8000, seed=6)
+    return StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=6,
+                                cache_dir=cache_dir, propensity_estimator=estimator)
+
+
+def test_propensities_are_cached_by_estimator_parameters(tmpdir, monkeypatch):
+    built = build(str(tmpdir), PowerlawMLEEstimator(n_candidates=20))
+    assert built.alpha is not None
+
+    fits = []
+    estimate = PowerlawMLEEstimator._estimate
+    monkeypatch.setattr(PowerlawMLEEstimator, '_estimate',
+                        lambda self, item_freqs: fits.append(self) or estimate(self, item_freqs))
+
+    loaded = build(str(tmpdir), PowerlawMLEEstimator(n_candidates=20))
+    assert fits == []
+    assert (loaded.alpha, loaded.xmin) == (built.alpha, built.xmin)
+    np.testing.assert_array_equal(loaded.item_props, built.item_props)
+    np.testing.assert_array_equal(loaded.props, built.props)
+
+    build(str(tmpdir), PowerlawMLEEstimator(n_candidates=10))
+    assert len(fits) == 1
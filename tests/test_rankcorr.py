@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from scipy.stats import kendalltau
+
+from corrstats import corr_matrices, corr_matrix
+from rankcorr import rank_correlations
+
+
+def test_kendall_matches_scipy_with_ties():
+    rng = np.random.RandomState(0)
+    # (tables x models x protocols) with ties within and across the rankings
+    x = rng.randint(0, 6, size=(3, 40, 5)).astype(np.float64)
+
+    corr = corr_matrix(x)
+    for table, table_corr in zip(x, corr):
+        for a in range(x.shape[2]):
+            for b in range(x.shape[2]):
+                expected = kendalltau(table[:, a], table[:, b])[0]
+                np.testing.assert_allclose(table_corr[a, b], expected, rtol=1e-12)
+
+    tensor = x.transpose(1, 2, 0)
+    np.testing.assert_allclose(rank_correlations(tensor)['kendall'], corr, rtol=1e-12)
+
+
+def test_corr_matrices_leaves_out_models_without_results():
+    rng = np.random.RandomState(1)
+    index = pd.MultiIndex.from_product([['M%d' % m for m in range(8)], ['Closed', 'Q1', 'Q2']])
+    table = pd.DataFrame(rng.normal(size=(len(index), 2)), index=index, columns=['NDCG', 'MRR'])
+    table.loc[('M3', 'Q2'), 'MRR'] = np.nan
+
+    matrices, n_models = corr_matrices(table)
+
+    assert n_models == 7
+    kept = table.drop('M3', level=0)
+    expected = kendalltau(kept.xs('Closed', level=1)['NDCG'], kept.xs('Q1', level=1)['NDCG'])[0]
+    np.testing.assert_allclose(matrices.loc[('NDCG', 'Closed'), 'Q1'], expected, rtol=1e-12)
+
+
+def test_corrstats_does_not_import_the_experiment_package():
+    code = 'import sys, corrstats; sys.exit(int("rankcorr" in sys.modules or "cornac" in sys.modules))'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, '-c', code], cwd=root)
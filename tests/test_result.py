@@ -0,0 +1,65 @@
+import pickle
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.bootstrap import bootstrap_ci
+from experiment.result import STResult
+from experiment.result_store import ResultStore
+from rankcorr import score_tensor
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+def test_stresult_pickle_round_trip():
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=3000, seed=1)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=1,
+                                       propensity_estimator='popularity', profile=True)
+    result, _ = eval_method.evaluate(RandomFactors(seed=1), get_metrics('small'),
+                                     user_based=True, show_validation=False)
+
+    loaded = pickle.loads(pickle.dumps(result))
+
+    assert loaded.model_name == result.model_name
+    assert loaded.protocols == result.protocols
+    assert [r.metric_avg_results for r in loaded] == [r.metric_avg_results for r in result]
+    assert loaded.profile.to_dict() == result.profile.to_dict()
+
+    # the profile is usable after loading
+    loaded.profile.section('Closed').add_count('users', 1)
+
+
+def test_skipped_strata_keep_their_labels(tmpdir):
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=3000, seed=1)
+    eval_method = StratifiedEvaluation(data=data, n_strata=3, rating_threshold=3.0, seed=1,
+                                       propensity_estimator='popularity')
+    # as a stratum without test feedback
+    del eval_method.stratified_sets['Q2']
+    result, _ = eval_method.evaluate(RandomFactors(seed=1), get_metrics('small'),
+                                     user_based=True, show_validation=False)
+
+    protocols = ['Closed', 'IPS', 'SNIPS', 'Q1', 'Q3', 'Unbiased']
+    assert result.protocols == protocols
+    assert 'Q3' in result.profile.sections and 'Q2' not in result.profile.sections
+    assert ResultStore.save(str(tmpdir.join('store')), [result]).protocols == protocols
+    assert score_tensor([result])[2] == protocols
+    assert list(bootstrap_ci([result], n_resamples=10, seed=1).index.unique('protocol')) == protocols
+
+
+def test_results_pickled_without_protocols_are_named_by_position(tmpdir):
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=3000, seed=1)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=1,
+                                       propensity_estimator='popularity')
+    result, _ = eval_method.evaluate(RandomFactors(seed=1), get_metrics('small'),
+                                     user_based=True, show_validation=False)
+
+    # an organized result as pickled before `protocols` and `profile` were added
+    legacy = STResult.__new__(STResult)
+    legacy.extend(result)
+    legacy.__dict__.update(model_name=result.model_name, table=result.table)
+    loaded = pickle.loads(pickle.dumps(legacy))
+
+    protocols = ['Closed', 'IPS', 'SNIPS', 'Q1', 'Q2', 'Unbiased']
+    assert 'protocols' not in loaded.__dict__
+    assert loaded.protocol_names() == protocols
+    assert ResultStore.save(str(tmpdir.join('store')), [loaded]).protocols == protocols
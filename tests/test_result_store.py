@@ -0,0 +1,53 @@
+import os
+import pickle
+import subprocess
+import sys
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.result import STResult
+from experiment.result_store import ResultStore
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+def legacy_results():
+    """Stratified results of two models, as pickled before `protocols` was added"""
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=3000, seed=4)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=4,
+                                       propensity_estimator='popularity')
+    results = []
+    for seed in (1, 2):
+        result, _ = eval_method.evaluate(RandomFactors(name='RF%d' % seed, seed=seed),
+                                         get_metrics('small'), user_based=True, show_validation=False)
+        legacy = STResult.__new__(STResult)
+        legacy.extend(result)
+        legacy.__dict__.update(model_name=result.model_name, table=result.table)
+        results.append(legacy)
+    return results
+
+
+def test_published_pickles_are_converted(tmpdir):
+    results = legacy_results()
+    pickle_path = str(tmpdir.join('exp_stra_synthetic.pkl'))
+    with open(pickle_path, 'wb') as f:
+        pickle.dump(results, f)
+
+    store = ResultStore.from_pickle(pickle_path)
+
+    assert store.path == str(tmpdir.join('exp_stra_synthetic'))
+    assert store.models == ['RF1', 'RF2']
+    assert store.protocols == ['Closed', 'IPS', 'SNIPS', 'Q1', 'Q2', 'Unbiased']
+    for result in results:
+        for protocol, res in zip(store.protocols, result):
+            for metric, value in res.metric_avg_results.items():
+                assert store.get(result.model_name, protocol, metric) == value
+
+    # open-loop results are plain cornac results
+    open_path = str(tmpdir.join('exp_open_synthetic.pkl'))
+    with open(open_path, 'wb') as f:
+        pickle.dump([result[0] for result in results], f)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, '-m', 'experiment.result_store', open_path], cwd=root)
+    assert ResultStore(str(tmpdir.join('exp_open_synthetic'))).protocols == ['Open']
@@ -0,0 +1,61 @@
+import numpy as np
+import scipy.sparse as sp
+
+from datasets import synthetic
+from eval_methods.batch_ranking import positive_matrix
+from eval_methods.sampled_ranking import sample_negatives
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+
+
+DATA = synthetic.load_feedback(n_users=150, n_items=80, n_interactions=3000, seed=11)
+
+
+def build(seed=11):
+    return StratifiedEvaluation(data=DATA, n_strata=2, rating_threshold=4.0, seed=seed,
+                                val_size=0.1, propensity_estimator='popularity', n_negatives=20)
+
+
+def user_items(indptr, items, user_idx):
+    return items[indptr[user_idx]:indptr[user_idx + 1]]
+
+
+def test_negatives_are_never_positives():
+    eval_method = build()
+    indptr, items = eval_method.negatives
+
+    for dataset in (eval_method.train_set, eval_method.test_set, eval_method.val_set):
+        pos_mat = positive_matrix(dataset.csr_matrix, eval_method.rating_threshold)
+        for user_idx in range(min(pos_mat.shape[0], len(indptr) - 1)):
+            positives = user_items(pos_mat.indptr, pos_mat.indices, user_idx)
+            assert len(np.intersect1d(positives, user_items(indptr, items, user_idx))) == 0
+
+    # test and validation users get their negatives, without duplicates
+    for dataset in (eval_method.test_set, eval_method.val_set):
+        for user_idx in dataset.user_indices:
+            negatives = user_items(indptr, items, user_idx)
+            assert 0 < len(negatives) <= 20
+            assert len(np.unique(negatives)) == len(negatives)
+
+
+def test_negatives_are_the_same_for_a_seed():
+    first, second = build().negatives, build().negatives
+    for array, expected in zip(first, second):
+        np.testing.assert_array_equal(array, expected)
+
+    other = build(seed=12).negatives
+    assert not np.array_equal(first[1], other[1])
+
+
+def test_sample_negatives_of_dense_and_sparse_users():
+    # user 0 has all the items but 1 and 4 as positives, user 2 only has item 5
+    rows = [0] * 8 + [2]
+    cols = [0, 2, 3, 5, 6, 7, 8, 9, 5]
+    pos_mat = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(3, 10))
+    indptr, items = sample_negatives([pos_mat], [0, 2], 10, 4, np.random.RandomState(0))
+
+    assert len(indptr) == 4
+    np.testing.assert_array_equal(user_items(indptr, items, 0), [1, 4])
+    assert len(user_items(indptr, items, 1)) == 0
+    negatives = user_items(indptr, items, 2)
+    assert len(negatives) == 4 and 5 not in negatives
+    np.testing.assert_array_equal(negatives, np.sort(negatives))
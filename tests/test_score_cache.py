@@ -0,0 +1,52 @@
+import numpy as np
+
+from datasets import synthetic
+from eval_methods.score_cache import score_candidates
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+
+from helpers import RandomFactors
+
+
+class CountingFactors(RandomFactors):
+    """`RandomFactors` counting its `score` calls, optionally rejecting arrays of items"""
+
+    def __init__(self, scalar_items=False, **kwargs):
+        RandomFactors.__init__(self, **kwargs)
+        self.scalar_items = scalar_items
+        self.calls = 0
+
+    def score(self, user_idx, item_idx=None):
+        self.calls += 1
+        if item_idx is not None and self.scalar_items:
+            # as the cornac models checking `train_set.is_unk_item(item_idx)`
+            if item_idx >= self.train_set.num_items:
+                raise ValueError('unknown item')
+        return RandomFactors.score(self, user_idx, item_idx)
+
+
+def fitted(**kwargs):
+    data = synthetic.load_feedback(n_users=100, n_items=60, n_interactions=2000, seed=5)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=4.0, seed=5,
+                                       propensity_estimator='popularity')
+    return CountingFactors(seed=5, **kwargs).fit(eval_method.train_set)
+
+
+def test_candidates_are_scored_with_one_call():
+    model = fitted()
+    num_items = model.train_set.num_items
+    candidates = np.array([3, num_items + 2, 0, 7, 3])
+
+    scores = score_candidates(model, 0, candidates)
+
+    assert model.calls == 1
+    np.testing.assert_allclose(scores[[0, 2, 3, 4]], model.score(0)[[3, 0, 7, 3]])
+    assert scores[1] == -np.inf
+
+
+def test_models_rejecting_arrays_of_items_get_the_same_scores():
+    batched, scalar = fitted(), fitted(scalar_items=True)
+    candidates = np.arange(scalar.train_set.num_items)[::3]
+
+    for user_idx in range(10):
+        np.testing.assert_allclose(score_candidates(scalar, user_idx, candidates),
+                                   score_candidates(batched, user_idx, candidates))
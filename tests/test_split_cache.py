@@ -0,0 +1,37 @@
+import numpy as np
+
+from datasets import synthetic
+from eval_methods.batch_ranking import positive_matrix
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+
+
+def build(cache_dir, **kwargs):
+    data = synthetic.load_feedback(n_users=150, n_items=80, n_interactions=3000, seed=3)
+    params = dict(n_strata=3, rating_threshold=4.0, seed=3, propensity_estimator='popularity',
+                  cache_dir=cache_dir, n_negatives=20)
+    params.update(kwargs)
+    return StratifiedEvaluation(data=data, **params)
+
+
+def test_split_cache_round_trip(tmpdir):
+    built = build(str(tmpdir))
+    loaded = build(str(tmpdir))
+
+    built_arrays, loaded_arrays = built._split_arrays(), loaded._split_arrays()
+    assert sorted(built_arrays) == sorted(loaded_arrays)
+    for name, array in built_arrays.items():
+        np.testing.assert_array_equal(array, loaded_arrays[name], err_msg=name)
+    assert list(built.stratified_sets) == list(loaded.stratified_sets)
+
+
+def test_negatives_are_not_reused_across_rating_thresholds(tmpdir):
+    build(str(tmpdir), rating_threshold=4.0)
+    eval_method = build(str(tmpdir), rating_threshold=1.0)
+
+    indptr, items = eval_method.negatives
+    for dataset in (eval_method.train_set, eval_method.test_set):
+        pos_mat = positive_matrix(dataset.csr_matrix, 1.0)
+        for user_idx in range(min(pos_mat.shape[0], len(indptr) - 1)):
+            positives = pos_mat.indices[pos_mat.indptr[user_idx]:pos_mat.indptr[user_idx + 1]]
+            negatives = items[indptr[user_idx]:indptr[user_idx + 1]]
+            assert len(np.intersect1d(positives, negatives)) == 0
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from cornac.metrics import NDCG, Recall
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+DATA = synthetic.load_feedback(n_users=300, n_items=150, n_interactions=6000, seed=7)
+
+# metrics of the full ranking, and of the top items only (partial sort)
+METRICS = {
+    'full': lambda: get_metrics('large'),
+    'top_k': lambda: [NDCG(k=[5, 10]), Recall(k=[10, 20])],
+}
+
+
+def evaluate(metrics='full', **kwargs):
+    """Average results of each protocol, and of the validation"""
+    eval_method = StratifiedEvaluation(data=DATA, n_strata=3, rating_threshold=3.0, seed=7,
+                                       val_size=0.1, propensity_estimator='popularity', **kwargs)
+    results, val_result = eval_method.evaluate(RandomFactors(seed=7), METRICS[metrics](),
+                                               user_based=True, show_validation=True)
+    return [result.metric_avg_results for result in results] + [val_result.metric_avg_results]
+
+
+def assert_same_results(results, expected):
+    assert len(results) == len(expected)
+    for avg_results, expected_avg in zip(results, expected):
+        assert list(avg_results) == list(expected_avg)
+        np.testing.assert_allclose(list(avg_results.values()), list(expected_avg.values()),
+                                   rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.parametrize('metrics', sorted(METRICS))
+def test_threaded_evaluation_matches_per_user(metrics):
+    assert_same_results(evaluate(metrics, n_threads=3), evaluate(metrics))
+
+
+@pytest.mark.parametrize('metrics', sorted(METRICS))
+def test_batched_evaluation_matches_per_user(metrics):
+    assert_same_results(evaluate(metrics, batch_size=64), evaluate(metrics))
+
+
+@pytest.mark.parametrize('metrics', sorted(METRICS))
+def test_score_cache_does_not_change_results(metrics):
+    assert evaluate(metrics, cache_scores=False) == evaluate(metrics)
+    assert evaluate(metrics, cache_scores=False, batch_size=64) == evaluate(metrics, batch_size=64)
+
+
+@pytest.mark.parametrize('metrics', sorted(METRICS))
+def test_sampled_evaluation_is_the_same_cached_uncached_and_threaded(metrics):
+    expected = evaluate(metrics, n_negatives=30)
+
+    assert evaluate(metrics, n_negatives=30, cache_scores=False) == expected
+    assert evaluate(metrics, n_negatives=30, n_threads=3) == expected
+    # the candidates are ranked, not the whole catalogue
+    assert expected != evaluate(metrics)
@@ -0,0 +1,87 @@
+import numpy as np
+
+from cornac.utils import get_rng
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.model_spec import ModelSpec
+from experiment.sweep import SweepExperiment, resize_factors
+from utils import get_metrics
+
+from helpers import RandomFactors
+
+
+WARM_START_PARAMS = {'RandomFactors': {'U': 'u_factors', 'V': 'i_factors'}}
+
+
+def spec(dim, seed=1, name='RF'):
+    return ModelSpec('helpers.RandomFactors', '%s%d' % (name, dim), dim=dim, k=dim, seed=seed)
+
+
+def sweep(tmpdir, models, **kwargs):
+    data = synthetic.load_feedback(n_users=150, n_items=80, n_interactions=3000, seed=9)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=9,
+                                       propensity_estimator='popularity')
+    return SweepExperiment(eval_method, models, get_metrics('small'), show_validation=False,
+                           save_dir=str(tmpdir), warm_start_params=WARM_START_PARAMS, **kwargs)
+
+
+def test_resize_factors_pads_and_truncates():
+    factors = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    padded = resize_factors(factors, 6, get_rng(0))
+    assert padded.shape == (3, 6) and padded.dtype == np.float32
+    np.testing.assert_array_equal(padded[:, :4], factors)
+    assert (padded[:, 4:] != 0).all() and np.abs(padded[:, 4:]).max() < 0.1
+
+    np.testing.assert_array_equal(resize_factors(factors, 2, get_rng(0)), factors[:, :2])
+
+
+def test_chains_group_specs_by_parameters_ordered_by_dim(tmpdir):
+    models = [spec(16), spec(4), spec(8, seed=2), spec(8), RandomFactors(name='instance'),
+              ModelSpec('helpers.RandomFactors', 'no_dim', seed=1)]
+    experiment = sweep(tmpdir, models)
+
+    assert experiment._chains() == [[1, 3, 0], [2], [4], [5]]
+    assert sweep(tmpdir, models, warm_start=False)._chains() == [[0], [1], [2], [3], [4], [5]]
+
+
+def test_checkpoint_keys_are_chained(tmpdir):
+    experiment = sweep(tmpdir, [spec(4), spec(8), spec(16)], checkpoint_dir=str(tmpdir.join('ckpt')))
+    checkpoints = experiment.checkpoints
+
+    keys = experiment._model_keys('split', metrics=['NDCG'])
+    assert keys[0] == checkpoints.key(experiment.models[0], 'split', metrics=['NDCG'])
+    assert keys[1] == checkpoints.key(experiment.models[1], 'split', warm_start=keys[0], metrics=['NDCG'])
+    assert keys[2] == checkpoints.key(experiment.models[2], 'split', warm_start=keys[1], metrics=['NDCG'])
+
+
+def test_resumed_steps_are_refitted_from_the_previous_steps(tmpdir):
+    models = [spec(4), spec(8), spec(16)]
+    checkpoint_dir = tmpdir.join('ckpt')
+    first = sweep(tmpdir, models, checkpoint_dir=str(checkpoint_dir))
+    first.run()
+    assert list(first.timings['status']) == ['evaluated'] * 3
+    assert list(first.timings['warm_start']) == [False, True, True]
+
+    # as a run interrupted before the last step
+    last_key = first._checkpoint_keys[2]
+    [path] = [p for p in checkpoint_dir.listdir() if last_key in p.basename]
+    path.remove()
+
+    resumed = sweep(tmpdir, models, checkpoint_dir=str(checkpoint_dir))
+    resumed.run()
+    assert list(resumed.timings['status']) == ['fitted', 'fitted', 'evaluated']
+    assert list(resumed.timings['warm_start']) == [False, True, True]
+    assert [r.metric_avg_results for r in resumed.result[2]] == \
+        [r.metric_avg_results for r in first.result[2]]
+
+
+def test_warm_started_factors_come_from_the_previous_step(tmpdir):
+    experiment = sweep(tmpdir, [spec(4), spec(8)])
+    model = experiment._model(0).fit(experiment.eval_method.train_set)
+
+    init_params = experiment._init_params(model, 8)
+    np.testing.assert_array_equal(init_params['U'][:, :4], model.u_factors)
+    np.testing.assert_array_equal(init_params['V'][:, :4], model.i_factors)
+    assert init_params['U'].shape[1] == 8
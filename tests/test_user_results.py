@@ -0,0 +1,73 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from cornac.metrics import MAE, NDCG, Recall
+
+from datasets import synthetic
+from eval_methods.stratified_evaluation import StratifiedEvaluation
+from experiment.user_results import UserResultWriter, UserResults
+
+from helpers import RandomFactors
+
+
+def evaluate(**kwargs):
+    data = synthetic.load_feedback(n_users=200, n_items=100, n_interactions=4000, seed=8)
+    eval_method = StratifiedEvaluation(data=data, n_strata=2, rating_threshold=3.0, seed=8,
+                                       propensity_estimator='popularity', **kwargs)
+    result, _ = eval_method.evaluate(RandomFactors(seed=8), [MAE(), NDCG(k=[10, -1]), Recall(k=10)],
+                                     user_based=True, show_validation=False)
+    return result
+
+
+def test_streamed_user_results_equal_the_in_memory_results(tmpdir):
+    root_dir = str(tmpdir.join('users'))
+    streamed, expected = evaluate(user_results_dir=root_dir), evaluate()
+
+    assert [r.metric_avg_results for r in streamed] == [r.metric_avg_results for r in expected]
+    for protocol, res, expected_res in zip(streamed.protocols, streamed, expected):
+        if expected_res.metric_user_results is None:
+            # Unbiased has no per-user results
+            assert res.metric_user_results is None
+            continue
+
+        # <model>/<protocol>/<group>, one group for the rating and one for the ranking metrics
+        views = res.metric_user_results
+        assert isinstance(views, UserResults)
+        assert views.path == os.path.join(root_dir, 'RandomFactors', protocol)
+        assert sorted(os.listdir(views.path)) == ['ranking', 'rating']
+        with open(os.path.join(views.path, 'ranking', 'meta.json')) as f:
+            meta = json.load(f)
+        assert sorted(meta['columns']) == ['NDCG@-1', 'NDCG@10', 'Recall@10']
+
+        assert sorted(views) == sorted(expected_res.metric_user_results)
+        for metric, user_scores in expected_res.metric_user_results.items():
+            assert dict(views[metric]) == user_scores
+        # users of the rating and the ranking metrics are joined, NaN where a group has no score
+        frame = views.to_frame()
+        assert sorted(frame.columns) == sorted(expected_res.metric_user_results)
+        assert len(frame) == len(expected_res.metric_user_results['MAE'])
+        assert frame['NDCG@10'].dropna().to_dict() == expected_res.metric_user_results['NDCG@10']
+
+        # pickled views only keep their path
+        assert dict(pickle.loads(pickle.dumps(views))['MAE']) == expected_res.metric_user_results['MAE']
+
+
+def test_writer_chunks_users(tmpdir):
+    path = str(tmpdir.join('group'))
+    writer = UserResultWriter(path, ['a', 'b'], chunk_size=4)
+    writer.append(7, [0.5, 1.5])
+    writer.extend([3, 9, 1], np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]))
+    writer.extend_dicts([{2: 7.0, 5: 9.0}, {2: 8.0, 5: 10.0}])
+    writer.close()
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        assert json.load(f) == {'columns': ['a', 'b'], 'n_chunks': 2, 'n_users': 6}
+
+    views = UserResults(str(tmpdir))
+    users, scores = views.column('b', mmap=False)
+    np.testing.assert_array_equal(users, [7, 3, 9, 1, 2, 5])
+    np.testing.assert_array_equal(scores, [1.5, 2.0, 4.0, 6.0, 8.0, 10.0])
+    assert list(views) == ['a', 'b'] and len(views) == 2 and 'c' not in views
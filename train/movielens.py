@@ -1,9 +1,8 @@
-import pickle
-
 from cornac.datasets import movielens
 from eval_methods.stratified_evaluation import StratifiedEvaluation
 from experiment.experiment import STExperiment
-from utils import get_models, get_metrics
+from experiment.result_store import ResultStore
+from utils import get_model_specs, get_metrics
 
 import sys
 sys.stdout = open('log_ml_large_1M.txt', 'w', 1)
@@ -17,15 +16,16 @@ ml = movielens.load_feedback(variant="1M")
 stra_eval_method = StratifiedEvaluation(data=ml,
                                         n_strata=2,
                                         rating_threshold=4.0,
+                                        user_results_dir='../data/user_results_ml',
                                         verbose=True)
 
 # run the experiment
 exp_stra = STExperiment(eval_method=stra_eval_method,
-                        models=get_models(variant='large', dims=dims),
+                        models=get_model_specs(variant='large', dims=dims),
                         metrics=get_metrics(variant='small'),
+                        checkpoint_dir='../data/checkpoints_ml',
                         verbose=True)
 
 exp_stra.run()
 
-with open('../data/exp_stra_ml.pkl', 'wb') as exp_file:
-    pickle.dump(exp_stra.result, exp_file)
+ResultStore.save('../data/exp_stra_ml', exp_stra.result)
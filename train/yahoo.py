@@ -1,10 +1,8 @@
-import pickle
-
 from experiment.experiment import STExperiment
+from experiment.result_store import ResultStore
 from eval_methods.stratified_evaluation import StratifiedEvaluation
 from datasets import yahoo_music, coats
-from utils import get_models, get_metrics
-from cornac.experiment.experiment import Experiment
+from utils import get_model_specs, get_metrics
 from cornac.eval_methods.base_method import BaseMethod
 
 import sys
@@ -14,27 +12,26 @@ dims = [e for e in range(10, 110, 10)]
 
 print('-------OPEN LOOP EVALUATION-------')
 
-# load the closed/open loop datasets
-ds_closed = yahoo_music.load_feedback(variant='closed_loop')
-ds_open = yahoo_music.load_feedback(variant='open_loop')
+# load the closed/open loop datasets, parsed once and cached in columnar form
+ds_closed = yahoo_music.load_feedback(variant='closed_loop', columnar=True, cache_dir='../data/cache')
+ds_open = yahoo_music.load_feedback(variant='open_loop', columnar=True, cache_dir='../data/cache')
 
 
 # train on closed-loop dataset and evaluate on open loop (random) dataset
-eval_method = BaseMethod.from_splits(train_data=ds_closed,
-                                     test_data=ds_open,
+eval_method = BaseMethod.from_splits(train_data=ds_closed.to_tuples(),
+                                     test_data=ds_open.to_tuples(),
                                      rating_threshold=4.0,
                                      verbose=True)
 
 # run the experiment
-exp_open = Experiment(eval_method=eval_method,
-                      models=get_models(variant='large', dims=dims),
-                      metrics=get_metrics(variant='large'),
-                      verbose=True)
+exp_open = STExperiment(eval_method=eval_method,
+                        models=get_model_specs(variant='large', dims=dims),
+                        metrics=get_metrics(variant='large'),
+                        verbose=True)
 
 exp_open.run()
 
-with open('../data/exp_open_yahoo.pkl', 'wb') as exp_file:
-    pickle.dump(exp_open.result, exp_file)
+ResultStore.save('../data/exp_open_yahoo', exp_open.result)
 
 print('-------STRATIFIED EVALUATION-------')
 
@@ -42,15 +39,16 @@ print('-------STRATIFIED EVALUATION-------')
 stra_eval_method = StratifiedEvaluation(data=ds_closed,
                                         n_strata=2,
                                         rating_threshold=4.0,
+                                        user_results_dir='../data/user_results_yahoo',
                                         verbose=True)
 
 # run the experiment
 exp_stra = STExperiment(eval_method=stra_eval_method,
-                        models=get_models(variant='large', dims=dims),
+                        models=get_model_specs(variant='large', dims=dims),
                         metrics=get_metrics(variant='large'),
+                        checkpoint_dir='../data/checkpoints_yahoo',
                         verbose=True)
 
 exp_stra.run()
 
-with open('../data/exp_stra_coats.pkl', 'wb') as exp_file:
-    pickle.dump(exp_stra.result, exp_file)
+ResultStore.save('../data/exp_stra_yahoo', exp_stra.result)
@@ -1,7 +1,8 @@
 import re
 import numpy as np
 import scipy.stats
-import cornac
+
+from experiment.model_spec import ModelSpec
 
 
 def atoi(text):
@@ -25,129 +26,153 @@ def mean_confidence_interval(data, confidence=0.95):
     return m, h  # m+-h
 
 
-def get_models(variant='small', dims=[32]):
+def get_model_specs(variant='small', dims=[32], families=None):
+    """Return the specs of the models of an experiment, see `get_models`.
+
+    Models are only instantiated by `ModelSpec.build`, just before they are
+    fitted, so an experiment keeps a single model alive at a time.
+
+    Parameters
+    ----------
+    variant: str, optional, default: 'small'
+        'small' (MostPop and WMF) or 'large' (all the models).
+
+    dims: list of int, optional, default: [32]
+        Numbers of latent factors of the factorization models.
+
+    families: list of str, optional, default: None
+        If set, only the models of these families (cornac class names,
+        e.g. ['MostPop', 'WMF', 'BPR']) are returned.
+
+    Returns
+    -------
+    specs: list of :obj:`experiment.model_spec.ModelSpec`
+
+    """
 
     # global average baseline
-    gavg = cornac.models.GlobalAvg(name='GA')
+    gavg = ModelSpec('cornac.models.GlobalAvg', 'GA')
 
     # the most popular baseline
-    mpop = cornac.models.MostPop(name='MPOP')
+    mpop = ModelSpec('cornac.models.MostPop', 'MPOP')
 
     # baseline only
-    bo = cornac.models.BaselineOnly(verbose=False)
+    bo = ModelSpec('cornac.models.BaselineOnly', 'BaselineOnly', verbose=False)
 
     # Matrix Factorization
     mf = []
     for k in dims:
-        mf.append(cornac.models.MF(name='MF%s' % k,
-                                   k=k,
-                                   learning_rate=0.001,
-                                   early_stop=True,
-                                   verbose=False,
-                                   use_bias=False,
-                                   seed=123))
+        mf.append(ModelSpec('cornac.models.MF', 'MF%s' % k, dim=k,
+                            k=k,
+                            learning_rate=0.001,
+                            early_stop=True,
+                            verbose=False,
+                            use_bias=False,
+                            seed=123))
 
     # Singular Value Decomposition
     svd = []
     for k in dims:
-        svd.append(cornac.models.SVD(name='SVD%s' % k,
-                                     k=k,
-                                     learning_rate=0.001,
-                                     verbose=False,
-                                     seed=123))
+        svd.append(ModelSpec('cornac.models.SVD', 'SVD%s' % k, dim=k,
+                             k=k,
+                             learning_rate=0.001,
+                             verbose=False,
+                             seed=123))
 
     # Probabilistic Matrix Factorization
     pmf = []
     for k in dims:
         # linear
-        pmf.append(cornac.models.PMF(name='PMFL%s' % k,
-                                     k=k,
-                                     verbose=False,
-                                     variant='linear',
-                                     seed=123))
+        pmf.append(ModelSpec('cornac.models.PMF', 'PMFL%s' % k, dim=k,
+                             k=k,
+                             verbose=False,
+                             variant='linear',
+                             seed=123))
 
         # nonlinear
-        pmf.append(cornac.models.PMF(name='PMFNL%s' % k,
-                                     k=k,
-                                     verbose=False,
-                                     variant='non_linear',
-                                     seed=123))
+        pmf.append(ModelSpec('cornac.models.PMF', 'PMFNL%s' % k, dim=k,
+                             k=k,
+                             verbose=False,
+                             variant='non_linear',
+                             seed=123))
 
     # Weighted Matrix Factorization
     wmf = []
     for k in dims:
-        wmf.append(cornac.models.WMF(name='WMF%s' % k,
-                                     k=k,
-                                     verbose=False,
-                                     seed=123))
-
-    # Non-negative Matrix Factorization (biased)
-    nmf = []
-    for k in dims:
-        nmf.append(cornac.models.NMF(name='NMF%s' % k,
-                                     k=k,
-                                     verbose=False,
-                                     use_bias=True,
-                                     seed=123))
+        wmf.append(ModelSpec('cornac.models.WMF', 'WMF%s' % k, dim=k,
+                             k=k,
+                             verbose=False,
+                             seed=123))
 
     # Maximum Margin Matrix Factorization
     mmmf = []
     for k in dims:
-        mmmf.append(cornac.models.MMMF(name='MMMF%s' % k,
-                                       k=k,
-                                       verbose=False,
-                                       seed=123))
+        mmmf.append(ModelSpec('cornac.models.MMMF', 'MMMF%s' % k, dim=k,
+                              k=k,
+                              verbose=False,
+                              seed=123))
 
     # Bayesian Personalized Ranking
     bpr = []
     for k in dims:
-        bpr.append(cornac.models.BPR(name='BPR%s' % k,
-                                     k=k,
-                                     verbose=False,
-                                     seed=123))
+        bpr.append(ModelSpec('cornac.models.BPR', 'BPR%s' % k, dim=k,
+                             k=k,
+                             verbose=False,
+                             seed=123))
 
         # Weighted Bayesian Personalized Ranking
-        bpr.append(cornac.models.WBPR(name='WBPR%s' % k,
-                                      k=k,
-                                      verbose=False,
-                                      seed=123))
+        bpr.append(ModelSpec('cornac.models.WBPR', 'WBPR%s' % k, dim=k,
+                             k=k,
+                             verbose=False,
+                             seed=123))
 
     # Generalized Matrix Factorization
     gmf = []
     for k in dims:
-        gmf.append(cornac.models.GMF(name='GMF%s' % k,
-                                     num_factors=k,
-                                     verbose=False,
-                                     seed=123))
+        gmf.append(ModelSpec('cornac.models.GMF', 'GMF%s' % k, dim=k,
+                             num_factors=k,
+                             verbose=False,
+                             seed=123))
 
     # Multi-Layer Perceptron
-    mlp = cornac.models.MLP(name='MLP',
-                            verbose=False,
-                            seed=123)
+    mlp = ModelSpec('cornac.models.MLP', 'MLP',
+                    verbose=False,
+                    seed=123)
 
     # Neural Collaborative Filtering
     neumf = []
     for k in dims:
-        neumf.append(cornac.models.NeuMF(name='NeuMF%s' % k,
-                                         num_factors=k,
-                                         verbose=False,
-                                         seed=123))
+        neumf.append(ModelSpec('cornac.models.NeuMF', 'NeuMF%s' % k, dim=k,
+                               num_factors=k,
+                               verbose=False,
+                               seed=123))
 
     if variant == 'small':
-        return [mpop] + wmf
+        specs = [mpop] + wmf
     else:
-        return [gavg, mpop, bo, mlp] + mf + svd + pmf + wmf + mmmf + bpr + gmf + neumf
+        specs = [gavg, mpop, bo, mlp] + mf + svd + pmf + wmf + mmmf + bpr + gmf + neumf
 
+    if families is not None:
+        specs = [spec for spec in specs if spec.family in families]
+    return specs
 
-def get_metrics(variant='small'):
 
-    mae = cornac.metrics.MAE()
-    rmse = cornac.metrics.RMSE()
-    recall = cornac.metrics.Recall(k=[5, 10, 20, 30, 100])
-    precision = cornac.metrics.Precision(k=[5, 10, 20, 30, 100])
-    ndcg = cornac.metrics.NDCG(k=[5, 10, 20, 30, 100, -1])
-    mrr = cornac.metrics.MRR()
-    auc = cornac.metrics.AUC()
+def get_models(variant='small', dims=[32], families=None):
+    """Return the models of an experiment, all instantiated, see `get_model_specs`"""
+    return [spec.build() for spec in get_model_specs(variant, dims, families)]
+
+
+def get_metrics(variant='small'):
+    # imported here, importing the utils does not load cornac
+    from cornac import metrics as cornac_metrics
+
+    mae = cornac_metrics.MAE()
+    rmse = cornac_metrics.RMSE()
+    recall = cornac_metrics.Recall(k=[5, 10, 20, 30, 100])
+    precision = cornac_metrics.Precision(k=[5, 10, 20, 30, 100])
+    ndcg = cornac_metrics.NDCG(k=[5, 10, 20, 30, 100, -1])
+    mrr = cornac_metrics.MRR()
+    auc = cornac_metrics.AUC()
 
     if variant == 'small':
         return [ndcg]